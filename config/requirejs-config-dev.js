@@ -101,6 +101,11 @@ require.config({
                  url: "/build/ajax/save.txt"
              }
          }
+     },
+     // You certainly do not want this in actual deployment. It lets
+     // the Selenium-based tests give each scenario its own database.
+     'wed/savers/localforage': {
+         test_database: true
      }
  },
  waitSeconds: 12,
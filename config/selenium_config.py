@@ -119,6 +119,22 @@ if 'builder_args' not in globals():
         'browser': os.environ.get("TEST_BROWSER", None)
     }
 
+#
+# HEADLESS determines whether local browsers run in their native
+# headless mode. When they do, the test suite does not need an X
+# display or a window manager. It has no effect on remote browsers.
+#
+# The scenarios that need a real display (because they resize the
+# window or depend on focus moving between windows) are tagged
+# ``@display`` and are skipped in headless mode.
+#
+# The default is taken from the ``headless`` user data variable
+# (``-D headless=true``).
+#
+if "HEADLESS" not in globals():
+    HEADLESS = builder_args.get('headless', "").lower() not in \
+        ("", "0", "false", "no", "off")
+
 # The 'browser' argument determines what browser we load.
 browser_env = builder_args.get('browser', None)
 if browser_env:
@@ -159,6 +175,16 @@ if browser_env:
         #
         CHROME_OPTIONS.add_argument("touch-events")
 
+        if HEADLESS:
+            CHROME_OPTIONS.add_argument("headless")
+            # Required on some platforms for headless mode to work.
+            CHROME_OPTIONS.add_argument("disable-gpu")
+    elif CONFIG.browser == "FIREFOX" and HEADLESS:
+        # Firefox has no command line option that Selenium can pass to
+        # it but it honors this variable. The ``FirefoxBinary``
+        # created when the driver is started inherits our environment.
+        os.environ["MOZ_HEADLESS"] = "1"
+
     profile = FirefoxProfile()
     # profile.set_preference("webdriver.log.file",
     #                        "/tmp/firefox_webdriver.log")
@@ -169,6 +195,11 @@ if browser_env:
     # This turns off the downloading prompt in FF.
     #
     tmp_path = "selenium_tests/tmp"
+    # Parallel workers must not share (and delete) each other's
+    # download directory.
+    worker = builder_args.get('worker', None)
+    if worker is not None:
+        tmp_path = os.path.join(tmp_path, "worker-" + worker)
     shutil.rmtree(tmp_path, True)
     os.makedirs(tmp_path)
     profile.set_preference("browser.download.folderList", 2)
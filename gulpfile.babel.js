@@ -611,6 +611,11 @@ const test_browser = {
 
 const test = sequence("test", test_node, test_browser);
 
+// The unit tests of the Python code that runs the Selenium tests.
+gulp.task("test-selenium-harness",
+          () => spawn("nosetests", ["test/selenium_test", "test/misc"],
+                      { stdio: 'inherit' }));
+
 // Features is an optional array of features to run instead of running
 // all features.
 function selenium(features) {
@@ -627,6 +632,14 @@ function selenium(features) {
     if (features)
         args = features.concat(args);
 
+    if (options.selenium_workers > 1 || options.selenium_retries > 0)
+        return spawn("python",
+                     ["misc/selenium_runner.py",
+                      "--workers", String(options.selenium_workers),
+                      "--retries", String(options.selenium_retries)]
+                     .concat(args),
+                     { stdio: 'inherit' });
+
     return spawn("behave", args, { stdio: 'inherit' });
 
 }
@@ -641,6 +654,13 @@ for (let feature of glob.sync("selenium_test/*.feature")) {
     gulp.task(feature, selenium_test.deps, () => selenium([feature]));
 }
 
+gulp.task("selenium-benchmark", selenium_test.deps,
+          () => spawn("behave",
+                      ["-D", "benchmark=true", "selenium_test/benchmark"]
+                      .concat(options.behave_params ?
+                              shell.parse(options.behave_params) : []),
+                      { stdio: 'inherit' }));
+
 const dist_notest = {
     name: "dist-notest",
     deps: ['build'],
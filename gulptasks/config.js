@@ -39,6 +39,16 @@ export const option_definitions = {
         help: "Parameters to pass to behave.",
         defaultValue: undefined
     },
+    selenium_workers: {
+        help: "Number of parallel workers to use for the Selenium tests.",
+        type: Number,
+        defaultValue: 1
+    },
+    selenium_retries: {
+        help: "Number of times a failed Selenium scenario is rerun.",
+        type: Number,
+        defaultValue: 0
+    },
     tei: {
         help: "Path to the directory containing the TEI stylesheets.",
         defaultValue: "/usr/share/xml/tei/stylesheet"
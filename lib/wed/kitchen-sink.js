@@ -5,21 +5,104 @@
  * @license MPL 2.0
  * @copyright 2014 Mangalam Research Center for Buddhist Languages
  */
-define(["wed/wed", "jquery", "urijs/URI"], function (wed, $, URI) {
+define(["wed/wed", "wed/wed_core", "wed/validator", "salve/validate",
+        "jquery", "urijs/URI"],
+       function (wed, core, validator, validate, $, URI) {
 "use strict";
 
 var uri = new URI();
-var query = uri.query(true);
-var mode = query.mode;
-var file = query.file;
-var schema = query.schema;
-var localstorage = query.localstorage;
-var options_param = query.options;
-var nodemo = query.nodemo;
-
-if (file !== undefined && localstorage !== undefined)
-    throw new Error("file and localstorage defined: use one or " +
-                    "the other");
+var query;
+var mode;
+var file;
+var schema;
+var localstorage;
+var options_param;
+var nodemo;
+var schema_cache;
+
+function setQuery(new_query) {
+    query = new_query;
+    mode = query.mode;
+    file = query.file;
+    schema = query.schema;
+    localstorage = query.localstorage;
+    options_param = query.options;
+    nodemo = query.nodemo;
+    schema_cache = query.schema_cache;
+
+    if (file !== undefined && localstorage !== undefined)
+        throw new Error("file and localstorage defined: use one or " +
+                        "the other");
+}
+
+setQuery(uri.query(true));
+
+/**
+ * When the creation of the current editor started, relative to the
+ * start of the navigation to this page.
+ */
+var start_time = 0;
+
+/**
+ * When the current editor reached some milestones. See
+ * [getTimings]{@link module:kitchen-sink~getTimings}.
+ */
+var timings = {};
+
+/**
+ * The grammars that have been built on this page, keyed by the hash
+ * of the schema they were built from.
+ */
+var grammars = Object.create(null);
+
+/**
+ * Computes a hash of a string. (This is the 32-bit FNV-1a hash.)
+ *
+ * @param {string} str The string to hash.
+ * @returns {string} The hash, combined with the length of the string.
+ */
+function hashString(str) {
+    var hash = 0x811c9dc5;
+    for (var i = 0; i < str.length; ++i) {
+        hash ^= str.charCodeAt(i);
+        // Multiply by the FNV prime, without Math.imul, which IE lacks.
+        hash += (hash << 1) + (hash << 4) + (hash << 7) + (hash << 8) +
+            (hash << 24);
+    }
+    return str.length + ":" + (hash >>> 0).toString(16);
+}
+
+/**
+ * Replaces the path to the schema in the options passed to wed with
+ * a grammar that has already been built from the same schema, if
+ * possible. Otherwise, the grammar is built and recorded for future
+ * use. Building a grammar is costly for large schemas, and this saves
+ * having to do it each time an editor is created on the same page.
+ *
+ * @param {Object} options The options to be passed to wed.
+ * @param {Function} done Called once the options have been modified.
+ */
+function useCachedGrammar(options, done) {
+    var path = options.schema || core.module_config.schema;
+    if (typeof path !== "string") {
+        done();
+        return;
+    }
+
+    // We must load the same file as the validator would.
+    $.get(validator.schemaURL(path), function (text) {
+        var key = hashString(text);
+        var grammar = grammars[key];
+        if (!grammar)
+            grammar = grammars[key] = validate.constructTree(text);
+        options.schema = grammar;
+        done();
+    }, "text").fail(function () {
+        // We leave the path as it is: the validator will load the
+        // schema itself and report the error if it fails again.
+        done();
+    });
+}
 
 function launch(text, file, options) {
     options = options || {};
@@ -93,32 +176,121 @@ function launch(text, file, options) {
                         "Your modifications will be saved in local storage.";
                 }
             }
-            window.wed_editor = new wed.Editor();
-            window.wed_editor.init(widget, options, text);
+            function create() {
+                var editor = window.wed_editor = new wed.Editor();
+                var editor_timings = timings = { start: start_time };
+                editor.whenCondition("initialized", function () {
+                    editor_timings.initialized = window.performance.now();
+                });
+                editor.whenCondition("first-validation-complete", function () {
+                    editor_timings.first_validation_complete =
+                        window.performance.now();
+                });
+                editor.init(widget, options, text);
+            }
+
+            if (schema_cache)
+                useCachedGrammar(options, create);
+            else
+                create();
         });
     });
 }
 
-if (localstorage) {
-    // Show the link...
-    var file_management_link = document.getElementById("fm-link");
-    file_management_link.style.display = "";
-    require(["localforage", "wed/savers/localforage"], function (
-        localforage, wed_localforage) {
-        wed_localforage.config();
-        localforage.getItem(localstorage).then(function (value) {
-            launch(value.data, undefined, {
-                save: {
-                    path: "wed/savers/localforage",
-                    options: {
-                        name: localstorage
+function start() {
+    if (localstorage) {
+        // Show the link...
+        var file_management_link = document.getElementById("fm-link");
+        file_management_link.style.display = "";
+        require(["localforage", "wed/savers/localforage"], function (
+            localforage, wed_localforage) {
+            wed_localforage.config();
+            localforage.getItem(localstorage).then(function (value) {
+                launch(value.data, undefined, {
+                    save: {
+                        path: "wed/savers/localforage",
+                        options: {
+                            name: localstorage
+                        }
                     }
-                }
+                });
             });
         });
-    });
+    }
+    else
+        launch(undefined, file);
+}
+
+start();
+
+/**
+ * Replaces the editor on this page with a new editor, without
+ * reloading the page. The Selenium-based tests use this to avoid
+ * paying the cost of a page load for each scenario.
+ *
+ * The reset is refused if the new parameters use a different mode or
+ * schema than the page currently uses, or if local storage is
+ * involved. The page must then be loaded anew.
+ *
+ * @param {Object} new_query The parameters that would have been in
+ * the query part of the URL of the page.
+ * @returns {boolean} ``true`` if the editor is being reset, ``false``
+ * if the reset was refused.
+ */
+function reset(new_query) {
+    if (new_query.mode !== mode || new_query.schema !== schema ||
+        new_query.localstorage !== undefined || localstorage !== undefined)
+        return false;
+
+    if (window.wed_editor) {
+        window.wed_editor.destroy();
+        delete window.wed_editor;
+    }
+
+    // Remove whatever was added to the body since it was loaded:
+    // tooltips, modal backdrops, etc.
+    var body = document.body;
+    var child = body.firstElementChild;
+    while (child) {
+        var next = child.nextElementSibling;
+        if (!child.classList.contains("container") &&
+            child.tagName !== "SCRIPT")
+            body.removeChild(child);
+        child = next;
+    }
+    body.classList.remove("modal-open");
+
+    setQuery(new_query);
+
+    // We change the URL so that reloading the page shows the same
+    // thing as the editor we are about to create.
+    uri.search(new_query);
+    window.history.replaceState(null, "", uri.toString());
+    window.scrollTo(0, 0);
+
+    start_time = window.performance.now();
+    start();
+    return true;
 }
-else
-    launch(undefined, file);
+
+/**
+ * Gets the times at which the current editor reached some
+ * milestones. The times are in milliseconds since the start of the
+ * navigation to this page, as returned by ``performance.now()``.
+ *
+ * @returns {{start: number, initialized: number,
+ * first_validation_complete: number}} The times. ``start`` is when the
+ * creation of the editor started: 0 if the editor was created when the
+ * page was loaded. A milestone that has not been reached yet is
+ * undefined.
+ */
+function getTimings() {
+    return timings;
+}
+
+return {
+    reset: reset,
+    getTimings: getTimings
+};
 
 });
@@ -117,6 +117,7 @@ function wrap(f) {
 exports.wrap = wrap;
 
 var appenders = [];
+var appender_urls = [];
 
 /**
  * This method adds an Ajax appender to the topmost logger defined by
@@ -127,9 +128,15 @@ var appenders = [];
  * @param {Object} headers An object having (key, value) pairs which
  * define header fields to set for communicating. One use for this
  * parameter would be for instance to set the X-CSRFToken field when
- * wed is being used on pages served by a Django server.
+ * wed is being used on pages served by a Django server. If an appender
+ * was already added for this URL, this function does nothing.
  */
 function addURL(url, headers) {
+    // Each editor created on a page calls this function. We do not
+    // want to send each message multiple times to the same URL.
+    if (appender_urls.indexOf(url) !== -1)
+        return;
+
     var appender = new log4javascript.AjaxAppender(url);
     appender.setThreshold(log4javascript.Level.ALL);
     var layout = new log4javascript.XmlLayout();
@@ -142,6 +149,7 @@ function addURL(url, headers) {
     ajax_logger.addAppender(appender);
     log.info("Ajax appender initialized");
     appenders.push(appender);
+    appender_urls.push(url);
 }
 
 exports.addURL = addURL;
@@ -12,13 +12,49 @@ var saver = require("../saver");
 var oop = require("../oop");
 var localforage = require("localforage");
 
+var options = module.config();
+var test_database_option = options && options.test_database;
+
+/**
+ * The name of the cookie with which the Selenium test suite gives each
+ * scenario a database of its own.
+ */
+var TEST_DATABASE_COOKIE = "wed_test_database";
+
+/**
+ * The name of the cookie with which we tell the Selenium test suite
+ * which of its databases we have used, so that it knows which
+ * scenarios need a new one.
+ */
+var TEST_DATABASE_USED_COOKIE = "wed_test_database_used";
+
+/**
+ * @returns {string|undefined} The name of the database that the test
+ * suite wants us to use, if any. The cookie is read only if the
+ * ``test_database`` option of this module is set, which a deployment
+ * must not do.
+ */
+function testDatabase() {
+    if (!test_database_option)
+        return undefined;
+
+    var match = new RegExp("(?:^|;\\s*)" + TEST_DATABASE_COOKIE +
+                           "=([^;]*)").exec(document.cookie);
+    return match ? decodeURIComponent(match[1]) : undefined;
+}
+
 /**
  * Configure localforage for usage by wed. This function must be
  * called before trying to access localforage.
  */
 function config() {
+    var test_database = testDatabase();
+    if (test_database)
+        document.cookie = TEST_DATABASE_USED_COOKIE + "=" +
+            encodeURIComponent(test_database) + "; path=/";
+
     localforage.config({
-        name: 'wed',
+        name: test_database || 'wed',
         storeName: 'files',
         // This is the version of the database created by localforage,
         // and nothing else!
@@ -197,21 +197,72 @@ function anySpecialKeyHeld(ev) {
 }
 
 /**
- * **This function is meant to be used in debugging.** It creates a
- * ``selenium_log`` object on ``window`` which is an array that
- * contains the series of ``obj`` passed to this function. Remember
- * that ultimately ``selenium_log`` is going to be serialized by
+ * The number of messages that {@link module:util~seleniumLog
+ * seleniumLog} keeps. Older messages are dropped.
+ */
+var SELENIUM_LOG_SIZE = 1000;
+
+/**
+ * The severity levels of the messages logged with {@link
+ * module:util~seleniumLogAt seleniumLogAt}, from the least to the most
+ * severe.
+ */
+var SELENIUM_LOG_LEVELS = ["debug", "info", "warn", "error"];
+
+/**
+ * **This function is meant to be used in debugging.** It records a
+ * message in the ``selenium_log`` object on ``window``, which the
+ * Selenium test suite drains at the end of each scenario. The object
+ * keeps only the last {@link module:util~SELENIUM_LOG_SIZE
+ * SELENIUM_LOG_SIZE} messages, and counts those it dropped. Remember
+ * that ultimately the messages are going to be serialized by
  * Selenium. So go easy on what you put in there and be aware that
  * Selenium may have bugs that prevent serialization of certain
  * objects.
  *
+ * @param {string} level The severity of the message. One of {@link
+ * module:util~SELENIUM_LOG_LEVELS SELENIUM_LOG_LEVELS}.
  * @param {...Object} obj Objects to log.
+ * @throws {Error} If the level is not valid.
  */
-function seleniumLog() {
-    if (!window.selenium_log)
-        window.selenium_log = [];
+function seleniumLogAt(level) {
+    if (SELENIUM_LOG_LEVELS.indexOf(level) === -1)
+        throw new Error("invalid level: " + level);
+
+    var log = window.selenium_log;
+    if (!log)
+        log = window.selenium_log = {
+            size: SELENIUM_LOG_SIZE,
+            entries: [],
+            dropped: 0
+        };
+
+    log.entries.push({
+        level: level,
+        time: Date.now(),
+        message: Array.prototype.slice.call(arguments, 1)
+    });
+
+    // We let the array grow to twice its size before we trim it, so
+    // that we do not shift the array on each message.
+    if (log.entries.length >= 2 * log.size) {
+        var excess = log.entries.length - log.size;
+        log.entries.splice(0, excess);
+        log.dropped += excess;
+    }
+}
 
-    window.selenium_log.push.apply(window.selenium_log, arguments);
+/**
+ * **This function is meant to be used in debugging.** It logs the
+ * ``obj`` passed to this function at the ``"debug"`` level. See
+ * {@link module:util~seleniumLogAt seleniumLogAt}.
+ *
+ * @param {...Object} obj Objects to log.
+ */
+function seleniumLog() {
+    var args = Array.prototype.slice.call(arguments);
+    args.unshift("debug");
+    seleniumLogAt.apply(undefined, args);
 }
 
 /**
@@ -337,6 +388,9 @@ exports.anySpecialKeyHeld = anySpecialKeyHeld;
 exports.distFromDeltas = distFromDeltas;
 exports.distFromRect = distFromRect;
 exports.distsFromRect = distsFromRect;
+exports.SELENIUM_LOG_SIZE = SELENIUM_LOG_SIZE;
+exports.SELENIUM_LOG_LEVELS = SELENIUM_LOG_LEVELS;
+exports.seleniumLogAt = seleniumLogAt;
 exports.seleniumLog = seleniumLog;
 exports.stackTrace = stackTrace;
 exports.convertPatternObj = convertPatternObj;
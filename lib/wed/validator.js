@@ -36,6 +36,17 @@ exports.WORKING = WORKING;
 exports.INVALID = INVALID;
 exports.VALID = VALID;
 
+/**
+ * @param {string} path The path of a schema, as passed to a {@link
+ * module:validator~Validator Validator}.
+ * @returns {string} The URL from which the validator loads the schema.
+ */
+function schemaURL(path) {
+    return require.toUrl(path);
+}
+
+exports.schemaURL = schemaURL;
+
 //
 // Note: the Validator class adds information to the Element nodes it
 // is working with by adding expando properties that start with
@@ -157,7 +168,7 @@ Validator.prototype.initialize = function (done) {
         done();
     }
     else {
-        $.get(require.toUrl(this.schema), function (x) {
+        $.get(schemaURL(this.schema), function (x) {
             this._tree = validate.constructTree(x);
             this._validation_walker = this._tree.newWalker();
             this._initialized = true;
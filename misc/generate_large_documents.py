@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Generates large documents to test how wed scales with the size of
+the documents it edits. The documents are valid according to the
+schemas used by wed's test suites. See ``selenium_test/documents.py``.
+
+Usage::
+
+    $ python misc/generate_large_documents.py --flavor docbook \\
+        --size 10KB --size 1MB --size 50MB --html build/benchmark
+
+This creates ``docbook_10KB.xml``, ``docbook_1MB.xml`` and
+``docbook_50MB.xml`` in ``build/benchmark``, together with their HTML
+forms, which are named like the converted test files:
+``docbook_10KB_converted.xml``, etc.
+"""
+import os
+import sys
+import argparse
+
+_dirname = os.path.dirname(os.path.abspath(__file__))
+top_dir = os.path.dirname(_dirname)
+
+# Some of the modules of the test suite are shared with this script.
+sys.path.insert(0, os.path.join(top_dir, "selenium_test"))
+
+
+def main(argv):
+    from documents import FLAVORS, parse_size, generate, convert_to_html
+
+    def size_arg(value):
+        try:
+            return (value, parse_size(value))
+        except ValueError as ex:
+            raise argparse.ArgumentTypeError(str(ex))
+
+    parser = argparse.ArgumentParser(
+        description="Generates large documents for testing wed.")
+    parser.add_argument("--flavor", choices=sorted(FLAVORS.keys()),
+                        default="tei",
+                        help="The kind of document to generate.")
+    parser.add_argument("--size", dest="sizes", type=size_arg,
+                        action="append",
+                        help="The size of a document to generate, like "
+                        "10KB or 50MB. May be repeated.")
+    parser.add_argument("--depth", type=int, default=2,
+                        help="How deeply sections are nested.")
+    parser.add_argument("--breadth", type=int, default=2,
+                        help="The number of subsections in each section.")
+    parser.add_argument("--paragraphs", type=int, default=3,
+                        help="The number of paragraphs in each section.")
+    parser.add_argument("--inline-density", type=float, default=0.1,
+                        help="The probability that a word starts an inline "
+                        "element, from 0 to 1.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="The seed of the random number generator.")
+    parser.add_argument("--html", action="store_true",
+                        help="Also convert the documents to HTML.")
+    parser.add_argument("--saxon", default="saxon",
+                        help="The command that runs saxon.")
+    parser.add_argument("dir", help="The directory in which to save the "
+                        "documents.")
+    args = parser.parse_args(argv)
+
+    if not args.sizes:
+        parser.error("at least one size is required")
+
+    for (label, size) in args.sizes:
+        path = os.path.join(args.dir,
+                            "{0}_{1}.xml".format(args.flavor, label))
+        actual = generate(args.flavor, size, path, depth=args.depth,
+                          breadth=args.breadth, paragraphs=args.paragraphs,
+                          inline_density=args.inline_density,
+                          seed=args.seed)
+        print("Generated {0} ({1} bytes)".format(path, actual))
+        if args.html:
+            print("Converted to " +
+                  convert_to_html(args.flavor, path, args.saxon))
+
+    return 0
+
+if __name__ == "__main__":
+    os.chdir(top_dir)
+    sys.exit(main(sys.argv[1:]))
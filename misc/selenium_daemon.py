@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Keeps a display, a window manager and a pool of browser sessions
+alive between runs of the Selenium-based test suite. While this
+daemon runs, each run of the suite that uses the same browser
+configuration leases one of the sessions instead of starting its own
+display, window manager and browser. This makes repeated local runs
+start much faster.
+
+Usage::
+
+    $ python misc/selenium_daemon.py --sessions 2 -D browser=...
+
+The ``-D`` arguments must be the same as those that you pass to
+behave. The daemon runs until it is interrupted or terminated.
+"""
+import os
+import sys
+import signal
+import argparse
+
+from selenic import Builder
+
+_dirname = os.path.dirname(os.path.abspath(__file__))
+top_dir = os.path.dirname(_dirname)
+
+# Some of the modules of the test suite are shared with this script.
+sys.path.insert(0, os.path.join(top_dir, "selenium_test"))
+
+conf_path = os.path.join(top_dir, "build", "config", "selenium_config.py")
+
+
+def parse_define(value):
+    name, sep, value = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected name=value")
+    return (name, value)
+
+
+def terminate(_signum, _frame):
+    raise SystemExit(0)
+
+
+def main(argv):
+    from sessions import Pool
+
+    parser = argparse.ArgumentParser(
+        description="Keeps browser sessions alive for the Selenium tests.")
+    parser.add_argument("--sessions", type=int, default=1,
+                        help="The number of sessions to keep alive.")
+    parser.add_argument("--visible", action="store_true",
+                        help="Make the display visible.")
+    parser.add_argument("-D", dest="defines", action="append",
+                        type=parse_define, default=[],
+                        help="Define a user data variable, as with behave.")
+    args = parser.parse_args(argv)
+
+    builder = Builder(conf_path, dict(args.defines))
+    if builder.remote:
+        parser.error("the daemon can only be used with local browsers")
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    pool = Pool(builder, args.sessions, args.visible)
+    try:
+        pool.start()
+        print("Daemon ready with {0} session(s).".format(args.sessions))
+        while True:
+            signal.pause()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+    return 0
+
+if __name__ == "__main__":
+    os.chdir(top_dir)
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,631 @@
+#!/usr/bin/env python
+"""
+Runs the Selenium-based test suite in parallel. The scenarios are
+split into shards, each shard is run by its own ``behave`` process,
+and the results of all the processes are merged into a single report.
+
+Each worker is an ordinary behave run. ``environment.py`` takes care
+of giving each of them its own display, window manager, server and
+driver. The only thing a worker learns from this script is its
+number and the directory in which it must store its output, through
+the ``worker`` and ``worker_dir`` userdata variables.
+
+Usage::
+
+    $ python misc/selenium_runner.py --workers 4 -D browser=...
+
+Any argument that this script does not recognize is passed to
+``behave`` as-is. Arguments that are feature files, or directories in
+the ``selenium_test`` tree, are used to determine which features to
+split among the workers. (If no such arguments are given,
+``selenium_test`` is used.)
+
+By default, the work is balanced among the workers on the basis of
+the durations that previous runs recorded in the timing database. See
+``selenium_test/timings.py``.
+
+With ``--headless``, the workers run their browsers in headless mode,
+without a display. The scenarios tagged ``@display`` cannot run in
+headless mode, so they are given to additional workers that have a
+display (see ``--display-workers``).
+
+With ``--shared-server``, this script starts one server (see
+``selenium_test/server.py``) which all the workers use instead of
+starting their own. Each worker keeps its state on the server in a
+namespace of its own.
+
+With ``--retries``, the scenarios that fail are rerun by the worker
+that ran them, up to the number of times given. ``--retry-budget``
+limits the number of reruns over the whole run, so that a broken build
+does not rerun the whole suite. The outcome of each scenario is
+recorded in the flake database (see ``selenium_test/flakes.py``). With
+``--quarantine``, the failures of the scenarios that the database
+considers chronic flakers do not fail the run.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import datetime
+import threading
+import traceback
+import subprocess
+
+from behave.parser import parse_file
+
+_dirname = os.path.dirname(os.path.abspath(__file__))
+top_dir = os.path.dirname(_dirname)
+
+# Some of the modules of the test suite are shared with this script.
+sys.path.insert(0, os.path.join(top_dir, "selenium_test"))
+
+parallel_dir_path = os.path.join("test_logs", "parallel")
+
+# The tree of the features.
+features_dir_path = os.path.join(top_dir, "selenium_test")
+
+feature_path_re = re.compile(r"\.feature(?::\d+)?$")
+
+# The tag of the scenarios that need a display.
+DISPLAY_TAG = "display"
+
+
+def is_feature_path(arg):
+    """
+    A directory designates features only if it is in the tree of the
+    features. Otherwise, the values of options that name directories,
+    like ``-o test_logs``, would be taken for features.
+
+    :param arg: A command line argument.
+    :type arg: :class:`str`
+    :returns: Whether the argument designates features to run.
+    :rtype: :class:`bool`
+    """
+    if feature_path_re.search(arg) is not None:
+        return True
+
+    if arg.startswith("-") or not os.path.isdir(arg):
+        return False
+
+    path = os.path.abspath(arg)
+    return path == features_dir_path or \
+        path.startswith(features_dir_path + os.sep)
+
+
+def collect_feature_files(paths):
+    """
+    Find all the feature files designated by a list of paths.
+
+    :param paths: The paths to examine. These may be directories,
+                  feature files or feature files with a line number.
+    :type paths: :class:`list` of :class:`str`
+    :returns: A list of ``(filename, line)`` pairs, where ``line`` is
+              ``None`` if the whole file is to be run.
+    :rtype: :class:`list`
+    """
+    ret = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(".feature"):
+                        ret.append((os.path.join(dirpath, filename), None))
+        else:
+            filename, _, line = path.partition(":")
+            ret.append((filename, int(line) if line else None))
+    return ret
+
+
+class Unit(object):
+    """
+    A unit of work that can be assigned to a worker. A unit is either
+    a whole feature file or a single scenario (or scenario outline).
+
+    :param location: The location to pass to behave to run the unit.
+    :type location: :class:`str`
+    :param scenarios: The scenarios that the unit contains.
+    :type scenarios: :class:`list` of :class:`behave.model.Scenario`
+    :param estimate: A function that estimates the cost of running a
+                     scenario.
+    :type estimate: A callable.
+    """
+
+    def __init__(self, location, scenarios, estimate):
+        self.location = location
+        self.scenarios = scenarios
+        # The relative cost of running this unit.
+        self.weight = sum(estimate(scenario) for scenario in scenarios)
+        # Whether the unit must be run by a worker with a display.
+        self.needs_display = any(DISPLAY_TAG in scenario.effective_tags
+                                 for scenario in scenarios)
+
+
+def expand_scenario(scenario):
+    # Outlines are run once per example.
+    if hasattr(scenario, "scenarios"):
+        return scenario.scenarios
+    return [scenario]
+
+
+def count_estimate(_scenario):
+    return 1
+
+
+def make_duration_estimate(db_path):
+    """
+    :param db_path: The path of the timing database to use, or
+                    ``None`` to use the default database.
+    :type db_path: :class:`str`
+    :returns: A function that estimates the duration of scenarios on
+              the basis of the timing database.
+    :rtype: :class:`timings.Estimator`
+    """
+    from timings import TimingDB, Estimator
+    db = TimingDB(db_path) if db_path else TimingDB()
+    try:
+        return Estimator(db)
+    finally:
+        db.close()
+
+
+def make_units(paths, split, estimate=count_estimate):
+    """
+    Make the units of work for a list of paths.
+
+    :param paths: The paths of the features to run.
+    :type paths: :class:`list` of :class:`str`
+    :param split: How to split the work. Either ``"feature"`` or
+                  ``"scenario"``.
+    :type split: :class:`str`
+    :param estimate: A function that estimates the cost of running a
+                     scenario. The default counts each scenario as 1.
+    :type estimate: A callable.
+    :returns: The units.
+    :rtype: :class:`list` of :class:`Unit`
+    """
+    units = []
+    for filename, line in collect_feature_files(paths):
+        feature = parse_file(filename)
+        if feature is None:
+            continue
+
+        scenarios = [scenario for scenario in feature.scenarios
+                     if line is None or scenario.line == line]
+
+        if split == "feature" and line is None:
+            units.append(Unit(filename,
+                              sum((expand_scenario(scenario)
+                                   for scenario in scenarios), []),
+                              estimate))
+        else:
+            units.extend(Unit("{0}:{1}".format(filename, scenario.line),
+                              expand_scenario(scenario), estimate)
+                         for scenario in scenarios)
+    return units
+
+
+def assign(units, workers):
+    """
+    Assign units of work to workers. The heaviest units are assigned
+    first, each to the worker that has the least work at the time of
+    assignment. (This is the "longest processing time first" rule.)
+
+    :param units: The units to assign.
+    :type units: :class:`list` of :class:`Unit`
+    :param workers: The number of workers.
+    :type workers: :class:`int`
+    :returns: A list of lists of units. There is one list per worker.
+    :rtype: :class:`list`
+    """
+    shards = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for unit in sorted(units, key=lambda unit: -unit.weight):
+        index = loads.index(min(loads))
+        shards[index].append(unit)
+        loads[index] += unit.weight
+    return shards
+
+
+class Worker(object):
+    """
+    A ``behave`` process that runs one shard.
+
+    :param number: The number of this worker.
+    :type number: :class:`int`
+    :param run_dir: The directory in which the results of the whole
+                    run are stored.
+    :type run_dir: :class:`str`
+    :param units: The units of work assigned to this worker.
+    :type units: :class:`list` of :class:`Unit`
+    :param behave_args: Additional arguments to pass to ``behave``.
+    :type behave_args: :class:`list` of :class:`str`
+    """
+
+    def __init__(self, number, run_dir, units, behave_args):
+        self.number = number
+        self.units = units
+        self.behave_args = behave_args
+        self.dir = os.path.join(run_dir, "worker-{0}".format(number))
+        self.report_path = None
+        self.log_path = None
+        self.process = None
+        self._log = None
+        # These are set once the worker is done with its shard.
+        self.crashed = False
+        self.features = []
+        # The traceback of the exception that stopped the worker, if
+        # any.
+        self.error = None
+
+    def start(self, attempt=0, locations=None):
+        """
+        Start ``behave``.
+
+        :param attempt: The number of the attempt. The first run of the
+                        shard is attempt 0 and reruns are numbered from
+                        1.
+        :type attempt: :class:`int`
+        :param locations: The locations of the scenarios to run. The
+                          default is the whole shard.
+        :type locations: :class:`list` of :class:`str`
+        """
+        attempt_dir = self.dir if not attempt else \
+            os.path.join(self.dir, "retry-{0}".format(attempt))
+        os.makedirs(attempt_dir)
+        self.report_path = os.path.join(attempt_dir, "report.json")
+        self.log_path = os.path.join(attempt_dir, "behave.log")
+        if locations is None:
+            locations = [unit.location for unit in self.units]
+        args = ["behave"] + self.behave_args + [
+            "-D", "worker={0}".format(self.number),
+            "-D", "worker_dir={0}".format(attempt_dir),
+            "-f", "json", "-o", self.report_path,
+            "-f", "plain", "-o", self.log_path] + locations
+
+        self._log = open(os.path.join(attempt_dir, "output.log"), 'w')
+        self.process = subprocess.Popen(args, stdout=self._log,
+                                        stderr=subprocess.STDOUT)
+
+    def wait(self):
+        ret = self.process.wait()
+        self._log.close()
+        return ret
+
+    def read_report(self):
+        """
+        :returns: The features reported by behave. If behave did not
+                  produce a report, this is an empty list.
+        :rtype: :class:`list`
+        """
+        try:
+            with open(self.report_path) as report:
+                return json.load(report)
+        except (IOError, ValueError):
+            return []
+
+
+def scenarios_of(features):
+    """
+    :param features: The features of a report.
+    :type features: :class:`list`
+    :returns: The scenarios of the report.
+    :rtype: :class:`list` of :class:`dict`
+    """
+    return [element for feature in features
+            for element in feature.get("elements", [])
+            if element.get("type") != "background"]
+
+
+def failed_locations(features):
+    """
+    :param features: The features of a report.
+    :type features: :class:`list`
+    :returns: The locations of the scenarios that failed.
+    :rtype: :class:`list` of :class:`str`
+    """
+    return [element["location"] for element in scenarios_of(features)
+            if element.get("status") == "failed"]
+
+
+def merge_rerun(features, rerun_features, attempt):
+    """
+    Replace the scenarios of a report with the results of a rerun.
+
+    :param features: The features of the report. They are modified.
+    :type features: :class:`list`
+    :param rerun_features: The features of the report of the rerun.
+    :type rerun_features: :class:`list`
+    :param attempt: The number of the attempt that was the rerun.
+    :type attempt: :class:`int`
+    """
+    rerun = dict((element["location"], element)
+                 for element in scenarios_of(rerun_features))
+    for feature in features:
+        elements = feature.get("elements", [])
+        for (index, element) in enumerate(elements):
+            replacement = rerun.get(element.get("location"))
+            if replacement is not None:
+                replacement["attempts"] = attempt + 1
+                elements[index] = replacement
+
+
+class RetryBudget(object):
+    """
+    The number of reruns that the workers may still perform. It is
+    shared by all the workers.
+
+    :param remaining: The number of reruns allowed.
+    :type remaining: :class:`int`
+    """
+
+    def __init__(self, remaining):
+        self.remaining = remaining
+        self._lock = threading.Lock()
+
+    def take(self, wanted):
+        """
+        :param wanted: The number of reruns wanted.
+        :type wanted: :class:`int`
+        :returns: The number of reruns granted.
+        :rtype: :class:`int`
+        """
+        with self._lock:
+            granted = min(wanted, self.remaining)
+            self.remaining -= granted
+            return granted
+
+
+def run_worker(worker, retries, budget):
+    """
+    Wait for a worker to finish its shard and rerun the scenarios that
+    failed.
+
+    :param worker: The worker, which must have been started.
+    :type worker: :class:`Worker`
+    :param retries: How many times a failed scenario may be rerun.
+    :type retries: :class:`int`
+    :param budget: The budget of reruns.
+    :type budget: :class:`RetryBudget`
+    """
+    features = []
+    try:
+        ret = worker.wait()
+        features = worker.read_report()
+        # If behave failed without producing a report, we have no way
+        # to know what went wrong with which scenario.
+        worker.crashed = ret != 0 and not features
+        for attempt in range(1, retries + 1):
+            failed = failed_locations(features)
+            failed = failed[:budget.take(len(failed))]
+            if not failed:
+                break
+            worker.start(attempt, failed)
+            worker.wait()
+            merge_rerun(features, worker.read_report(), attempt)
+    except Exception:  # pylint: disable=broad-except
+        # An exception would otherwise end only the thread, and the run
+        # could pass without the results of this worker.
+        worker.error = traceback.format_exc()
+    worker.features = features
+
+
+def record_outcomes(features, db_path, quarantine):
+    """
+    Record the outcome of each scenario in the flake database, and mark
+    as quarantined the failed scenarios that are chronic flakers.
+
+    :param features: The features of the merged report. The scenarios
+                     that are quarantined are modified.
+    :type features: :class:`list`
+    :param db_path: The path of the flake database to use, or ``None``
+                    to use the default database.
+    :type db_path: :class:`str`
+    :param quarantine: Whether to quarantine the chronic flakers.
+    :type quarantine: :class:`bool`
+    """
+    from flakes import FlakeDB, report_key, PASSED, FLAKY, FAILED
+    db = FlakeDB(db_path) if db_path else FlakeDB()
+    try:
+        # We determine the chronic flakers before recording this run,
+        # so that a scenario is not quarantined on the basis of the
+        # failure we are considering.
+        chronic = db.chronic() if quarantine else set()
+        for element in scenarios_of(features):
+            status = element.get("status")
+            attempts = element.get("attempts", 1)
+            if status == "passed":
+                outcome = FLAKY if attempts > 1 else PASSED
+            elif status == "failed":
+                outcome = FAILED
+            else:
+                continue
+            key = report_key(element)
+            db.record(key, outcome, attempts)
+            if outcome == FAILED and key in chronic:
+                element["quarantined"] = True
+    finally:
+        db.close()
+
+
+def summarize(features):
+    """
+    Print a summary of a merged report.
+
+    :param features: The features of the report.
+    :type features: :class:`list`
+    :returns: The locations of the scenarios that failed, excluding
+              those that are quarantined.
+    :rtype: :class:`list` of :class:`str`
+    """
+    counts = {}
+    failed = []
+    flaky = []
+    quarantined = []
+    for element in scenarios_of(features):
+        status = element.get("status", "untested")
+        counts[status] = counts.get(status, 0) + 1
+        location = element.get("location")
+        if status == "failed":
+            (quarantined if element.get("quarantined") else
+             failed).append(location)
+        elif status == "passed" and element.get("attempts", 1) > 1:
+            flaky.append(location)
+
+    print("Scenarios: " + ", ".join("{0} {1}".format(count, status)
+                                    for (status, count)
+                                    in sorted(counts.items())))
+    for (title, locations) in (("Scenarios that passed on a rerun", flaky),
+                               ("Quarantined failures", quarantined),
+                               ("Failed scenarios", failed)):
+        if locations:
+            print(title + ":")
+            for location in locations:
+                print("  " + location)
+    return failed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Runs the Selenium test suite with parallel workers.")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="The number of workers to run.")
+    parser.add_argument("--split", choices=["feature", "scenario"],
+                        default="scenario",
+                        help="Whether to split the suite by feature or "
+                        "by scenario.")
+    parser.add_argument("--schedule", choices=["duration", "count"],
+                        default="duration",
+                        help="Whether to balance the workers according to "
+                        "the recorded durations of the scenarios or "
+                        "according to the number of scenarios.")
+    parser.add_argument("--timings-db", default=None,
+                        help="The timing database to use.")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the browsers in headless mode. The "
+                        "scenarios that need a display are run by the "
+                        "display workers.")
+    parser.add_argument("--display-workers", type=int, default=1,
+                        help="The number of workers with a display to run "
+                        "when --headless is used.")
+    parser.add_argument("--retries", type=int, default=0,
+                        help="How many times a failed scenario is rerun.")
+    parser.add_argument("--retry-budget", type=int, default=10,
+                        help="The maximum number of reruns over the whole "
+                        "run.")
+    parser.add_argument("--flakes-db", default=None,
+                        help="The flake database to use.")
+    parser.add_argument("--quarantine", action="store_true",
+                        help="Do not fail the run because of the failures "
+                        "of chronically flaky scenarios.")
+    parser.add_argument("--shared-server", action="store_true",
+                        help="Start one server for all the workers, rather "
+                        "than one per worker. This works only with local "
+                        "browsers.")
+    args, rest = parser.parse_known_args(argv)
+
+    if args.workers < 1:
+        parser.error("there must be at least one worker")
+
+    if args.headless and args.display_workers < 1:
+        parser.error("there must be at least one display worker")
+
+    paths = [arg for arg in rest if is_feature_path(arg)]
+    behave_args = [arg for arg in rest if not is_feature_path(arg)]
+    if not paths:
+        paths = ["selenium_test"]
+
+    estimate = make_duration_estimate(args.timings_db) \
+        if args.schedule == "duration" else count_estimate
+
+    if args.timings_db:
+        behave_args += ["-D", "timings_db=" + args.timings_db]
+
+    units = make_units(paths, args.split, estimate)
+    if args.headless:
+        groups = [
+            ([unit for unit in units if not unit.needs_display],
+             args.workers, ["-D", "headless=true"]),
+            ([unit for unit in units if unit.needs_display],
+             args.display_workers, ["-D", "headless=false"])
+        ]
+    else:
+        groups = [(units, args.workers, [])]
+
+    # Each shard is paired with the arguments specific to its worker.
+    shards = [(shard, extra_args)
+              for (group_units, count, extra_args) in groups
+              for shard in assign(group_units, count) if shard]
+
+    now = datetime.datetime.now().replace(microsecond=0)
+    run_dir = os.path.join(parallel_dir_path, now.isoformat())
+    os.makedirs(run_dir)
+    latest = os.path.join(parallel_dir_path, "LATEST")
+    try:
+        os.unlink(latest)
+    except OSError as ex:
+        if ex.errno != 2:
+            raise
+    os.symlink(os.path.basename(run_dir), latest)
+
+    server = None
+    if args.shared_server:
+        from server import Server
+        server = Server(("localhost", 0), top_dir)
+        server.start()
+        behave_args += ["-D", "shared_server=http://localhost:{0}"
+                        .format(server.server_address[1])]
+
+    status = 0
+    features = []
+    # If creating a worker fails, we must still be able to go through
+    # the workers, and raise the actual error.
+    workers = []
+    try:
+        workers = [Worker(number, run_dir, shard,
+                          behave_args + extra_args)
+                   for (number, (shard, extra_args)) in enumerate(shards)]
+        for worker in workers:
+            worker.start()
+
+        print("Started {0} workers; results in {1}".format(len(workers),
+                                                           run_dir))
+
+        budget = RetryBudget(args.retry_budget)
+        threads = [threading.Thread(target=run_worker,
+                                    args=(worker, args.retries, budget),
+                                    name="Worker {0}".format(worker.number))
+                   for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if server:
+            server.stop()
+
+    for worker in workers:
+        print("Worker {0} {1} (log: {2})".format(
+            worker.number,
+            "crashed" if worker.crashed or worker.error else
+            "failed" if failed_locations(worker.features) else "passed",
+            worker.log_path))
+        if worker.error:
+            print(worker.error.rstrip("\n"))
+        if worker.crashed or worker.error:
+            status = 1
+        features.extend(worker.features)
+
+    record_outcomes(features, args.flakes_db, args.quarantine)
+
+    with open(os.path.join(run_dir, "report.json"), 'w') as report:
+        json.dump(features, report, indent=2)
+
+    if summarize(features):
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    os.chdir(top_dir)
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,37 @@
+@benchmark
+Feature: editor performance
+
+Scenario Outline: loading a document
+  Given the benchmark document "<document>" enlarged <factor> times
+  When the user loads the benchmark document
+
+Examples:
+  | document                           | factor |
+  | sketch_for_a_medical_education.xml | 1      |
+  | sketch_for_a_medical_education.xml | 10     |
+  | sketch_for_a_medical_education.xml | 100    |
+  | docbook_book.xml                   | 1      |
+  | docbook_book.xml                   | 100    |
+  | docbook_book.xml                   | 1000   |
+
+Scenario Outline: typing in a document
+  Given the benchmark document "<document>" enlarged <factor> times
+  When the user loads the benchmark document
+  And the user types 50 characters in the benchmark document
+
+Examples:
+  | document                           | factor |
+  | sketch_for_a_medical_education.xml | 1      |
+  | sketch_for_a_medical_education.xml | 100    |
+  | docbook_book.xml                   | 1000   |
+
+Scenario Outline: opening the context menu
+  Given the benchmark document "<document>" enlarged <factor> times
+  When the user loads the benchmark document
+  And the user opens the context menu 10 times in the benchmark document
+
+Examples:
+  | document                           | factor |
+  | sketch_for_a_medical_education.xml | 1      |
+  | sketch_for_a_medical_education.xml | 100    |
+  | docbook_book.xml                   | 1000   |
@@ -0,0 +1,19 @@
+@benchmark
+Feature: keystroke latency
+
+Scenario Outline: typing in documents of different sizes
+  Given a generated <flavor> document of <size>
+  When the user loads the benchmark document
+  And the user types 200 characters in the benchmark document
+  And the user types ENTER 20 times in the benchmark document
+  And the user types BACKSPACE 50 times in the benchmark document
+  And the user types DELETE 50 times in the benchmark document
+
+Examples:
+  | flavor  | size  |
+  | tei     | 10KB  |
+  | tei     | 100KB |
+  | tei     | 1MB   |
+  | docbook | 10KB  |
+  | docbook | 100KB |
+  | docbook | 1MB   |
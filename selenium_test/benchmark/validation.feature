@@ -0,0 +1,17 @@
+@benchmark
+Feature: validation throughput
+
+Scenario Outline: validating a generated document
+  Given a generated <flavor> document of <size>
+  When the user loads the benchmark document while sampling the validation progress
+
+Examples:
+  | flavor  | size  |
+  | tei     | 10KB  |
+  | tei     | 100KB |
+  | tei     | 1MB   |
+  | tei     | 5MB   |
+  | docbook | 10KB  |
+  | docbook | 100KB |
+  | docbook | 1MB   |
+  | docbook | 5MB   |
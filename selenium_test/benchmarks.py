@@ -0,0 +1,447 @@
+"""
+Support for the benchmarks of the editor's performance. The
+benchmarks are the scenarios tagged ``@benchmark``. They are skipped
+unless the suite is run with ``-D benchmark=true``.
+
+The results of a run are saved in
+``test_logs/benchmarks/<build>/<timestamp>.json``, where ``<build>``
+is the output of ``git describe`` for the build tested. Keeping the
+results of each build separate makes it easy to compare builds.
+"""
+import os
+import re
+import json
+import math
+import time
+import datetime
+
+from util import wait_in_page
+from documents import FLAVORS, parse_size, generate
+
+benchmarks_dir_path = os.path.join("test_logs", "benchmarks")
+
+# Where we put the documents that we generate for the benchmarks. This
+# must be served by the server that serves wed.
+documents_dir_path = os.path.join("build", "benchmark")
+
+samples_dir_path = os.path.join("build", "samples")
+
+DOCBOOK_NS = "http://docbook.org/ns/docbook"
+
+# The working states of wed's validator. See lib/wed/validator.js.
+WORKING = 2
+INVALID = 3
+VALID = 4
+
+# How often we sample the progress of the validator, in seconds.
+SAMPLE_INTERVAL = 0.1
+
+
+def percentile(values, fraction):
+    """
+    Compute a percentile with the nearest-rank method.
+
+    :param values: The values.
+    :type values: :class:`list` of numbers
+    :param fraction: The percentile, as a fraction of 1.
+    :type fraction: :class:`float`
+    :returns: The percentile, or ``None`` if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(fraction * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def summarize(values):
+    """
+    :param values: Measurements.
+    :type values: :class:`list` of numbers
+    :returns: A summary of the measurements.
+    :rtype: :class:`dict`
+    """
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / float(len(values)),
+        "min": min(values),
+        "max": max(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+    }
+
+
+def is_docbook(text):
+    return DOCBOOK_NS in text
+
+
+# The parts of documents that can be repeated without making the
+# document invalid.
+tei_body_re = re.compile(r"(<body(?:\s[^>]*)?>)(.*)(</body>)", re.DOTALL)
+docbook_chapters_re = re.compile(r"(<chapter[\s>].*</chapter>)", re.DOTALL)
+
+
+def enlarge_document(text, factor):
+    """
+    Enlarge a document by repeating its contents.
+
+    For TEI, each copy of the contents of ``body`` is wrapped in a
+    ``div``. For DocBook, the chapters are repeated.
+
+    :param text: The document.
+    :type text: :class:`str`
+    :param factor: How many copies of the contents to make.
+    :type factor: :class:`int`
+    :returns: The enlarged document.
+    :rtype: :class:`str`
+    """
+    if is_docbook(text):
+        match = docbook_chapters_re.search(text)
+        if not match:
+            raise ValueError("cannot find the chapters of the document")
+        return text[:match.start()] + match.group(1) * factor + \
+            text[match.end():]
+
+    match = tei_body_re.search(text)
+    if not match:
+        raise ValueError("cannot find the body of the document")
+    return text[:match.start(2)] + \
+        ("<div>" + match.group(2) + "</div>") * factor + \
+        text[match.end(2):]
+
+
+def prepare_document(name, factor=1):
+    """
+    Prepare a sample document for a benchmark.
+
+    :param name: The name of a sample document.
+    :type name: :class:`str`
+    :param factor: How many times to enlarge the document. See
+                   :func:`enlarge_document`.
+    :type factor: :class:`int`
+    :returns: A description of the document: its ``name``, the
+              ``path`` from which the server serves it, the ``schema``
+              to use to edit it and its ``size`` in bytes.
+    :rtype: :class:`dict`
+    """
+    src = os.path.join(samples_dir_path, name)
+    with open(src) as src_file:
+        text = src_file.read()
+
+    if factor == 1:
+        path = src
+    else:
+        text = enlarge_document(text, factor)
+        if not os.path.exists(documents_dir_path):
+            os.makedirs(documents_dir_path)
+        base, ext = os.path.splitext(name)
+        path = os.path.join(documents_dir_path,
+                            "{0}_x{1}{2}".format(base, factor, ext))
+        with open(path, 'w') as dest:
+            dest.write(text)
+
+    return {
+        "name": name if factor == 1 else "{0} x{1}".format(name, factor),
+        "path": "/" + path,
+        "schema": "@docbook" if is_docbook(text) else None,
+        "size": len(text)
+    }
+
+
+def prepare_generated_document(flavor, size):
+    """
+    Prepare a generated document for a benchmark. Documents are
+    generated only once: subsequent runs reuse them.
+
+    :param flavor: The flavor of the document. See
+                   :data:`documents.FLAVORS`.
+    :type flavor: :class:`str`
+    :param size: The size of the document, like ``10KB`` or ``5MB``.
+    :type size: :class:`str`
+    :returns: A description of the document, like
+              :func:`prepare_document` returns.
+    :rtype: :class:`dict`
+    """
+    name = "{0}_{1}.xml".format(flavor, size)
+    path = os.path.join(documents_dir_path, name)
+    if os.path.exists(path):
+        actual = os.path.getsize(path)
+    else:
+        actual = generate(flavor, parse_size(size), path)
+
+    return {
+        "name": name,
+        "path": "/" + path,
+        "schema": FLAVORS[flavor].kitchen_sink_schema,
+        "size": actual
+    }
+
+
+class LatencyProbe(object):
+    """
+    Measures in the page the time between an event and the next paint
+    that follows it. If a selector is given, the time is measured to
+    the first paint after an element matching the selector appears.
+
+    The time of the paint is approximated by a timeout set from an
+    animation frame: the timeout runs once the frame has been painted.
+
+    :param driver: The driver.
+    :param event: The name of the event that starts a measurement.
+    :type event: :class:`str`
+    :param selector: A CSS selector.
+    :type selector: :class:`str`
+    """
+
+    def __init__(self, driver, event, selector=None):
+        self.driver = driver
+        self.event = event
+        self.selector = selector
+
+    def install(self):
+        self.driver.execute_script("""
+        var event = arguments[0];
+        var selector = arguments[1];
+        var probes = window.__benchmark_probes =
+            window.__benchmark_probes || {};
+        var old = probes[event];
+        if (old)
+            document.removeEventListener(event, old.listener, true);
+
+        var probe = probes[event] = { samples: [] };
+        probe.listener = function () {
+            var start = window.performance.now();
+            function check() {
+                if (selector && !document.querySelector(selector)) {
+                    window.requestAnimationFrame(check);
+                    return;
+                }
+                setTimeout(function () {
+                    probe.samples.push(window.performance.now() - start);
+                }, 0);
+            }
+            window.requestAnimationFrame(check);
+        };
+        document.addEventListener(event, probe.listener, true);
+        """, self.event, self.selector)
+
+    def wait_for_sample(self, util, number):
+        """
+        Wait until the probe has a sample, and return it. Only this
+        sample is sent back, so that the time spent transferring
+        samples does not grow as a measurement goes on.
+
+        :param util: Selenic's util object.
+        :type util: :class:`selenic.util.Util`
+        :param number: The index of the sample to wait for.
+        :type number: :class:`int`
+        :returns: The sample, in milliseconds.
+        :rtype: :class:`float`
+        """
+        # The sample is wrapped in an array because a sample of 0 would
+        # not be a true value.
+        sample, = wait_in_page(util, """
+        var probe = window.__benchmark_probes[arguments[0]];
+        return probe.samples.length > arguments[1] ?
+            [probe.samples[arguments[1]]] : null;
+        """, self.event, number)
+        return sample
+
+    def uninstall(self):
+        self.driver.execute_script("""
+        var probes = window.__benchmark_probes;
+        var probe = probes && probes[arguments[0]];
+        if (probe) {
+            document.removeEventListener(arguments[0], probe.listener, true);
+            delete probes[arguments[0]];
+        }
+        """, self.event)
+
+
+def sample_validation(driver, timeout, interval=SAMPLE_INTERVAL):
+    """
+    Sample the progress of the validator of the editor in the page
+    until the validation is complete.
+
+    :param driver: The driver.
+    :param timeout: How long to sample before giving up, in seconds.
+    :type timeout: :class:`float`
+    :param interval: The time between samples, in seconds.
+    :type interval: :class:`float`
+    :returns: The samples. Each sample is a list of the time in
+              milliseconds as returned by ``performance.now()``, the
+              working state of the validator and the fraction of the
+              document validated. The state is ``None`` if the
+              validator did not exist yet.
+    :rtype: :class:`list`
+    :raises Exception: If the validation is not complete before the
+                       timeout.
+    """
+    samples = []
+    give_up = time.time() + timeout
+    while time.time() < give_up:
+        sample = driver.execute_script("""
+        var now = window.performance.now();
+        var editor = window.wed_editor;
+        if (!editor || !editor.validator)
+            return [now, null, 0];
+        var state = editor.validator.getWorkingState();
+        return [now, state.state, state.part_done];
+        """)
+        samples.append(sample)
+        if sample[1] in (VALID, INVALID):
+            return samples
+        time.sleep(interval)
+
+    raise Exception("the validation did not complete in time")
+
+
+def validation_throughput(samples, elements):
+    """
+    Compute the rate at which the validator worked.
+
+    :param samples: Samples returned by :func:`sample_validation`.
+    :type samples: :class:`list`
+    :param elements: The number of elements in the document.
+    :type elements: :class:`int`
+    :returns: The number of elements validated per second, from the
+              first sample in which the validator was working to the
+              sample in which it was done. ``None`` if the validator
+              was never seen working.
+    :rtype: :class:`float`
+    """
+    working = [sample for sample in samples if sample[1] == WORKING]
+    if not working:
+        return None
+    start = working[0]
+    end = samples[-1]
+    elapsed = (end[0] - start[0]) / 1000.0
+    if elapsed <= 0:
+        return None
+    return elements * (end[2] - start[2]) / elapsed
+
+
+def wait_for_editor_timings(util):
+    """
+    Wait until the editor has completed its first validation.
+
+    :param util: Selenic's util object.
+    :type util: :class:`selenic.util.Util`
+    :returns: The times at which the editor reached milestones, as
+              recorded by the kitchen sink.
+    :rtype: :class:`dict`
+    """
+    return wait_in_page(util, """
+    var timings = require("wed/kitchen-sink").getTimings();
+    return timings.first_validation_complete !== undefined ? timings : null;
+    """)
+
+
+class Results(object):
+    """
+    The results of the benchmarks of one run.
+
+    :param build: A description of the build tested.
+    :type build: :class:`str`
+    :param browser: A description of the browser used.
+    :type browser: :class:`str`
+    """
+
+    def __init__(self, build, browser):
+        self.build = build
+        self.browser = browser
+        self.entries = []
+
+    def add(self, benchmark, document, values, unit="ms", **extra):
+        """
+        Add the measurements of a benchmark.
+
+        :param benchmark: The name of the benchmark.
+        :type benchmark: :class:`str`
+        :param document: The document on which the benchmark was run,
+                         as returned by :func:`prepare_document`.
+        :type document: :class:`dict`
+        :param values: The measurements.
+        :type values: :class:`list` of numbers
+        :param unit: The unit of the measurements.
+        :type unit: :class:`str`
+        :param extra: Additional information to record.
+        """
+        entry = {
+            "benchmark": benchmark,
+            "document": document["name"],
+            "size": document["size"],
+            "unit": unit,
+            "values": values,
+            "summary": summarize(values)
+        }
+        entry.update(extra)
+        self.entries.append(entry)
+
+    def write(self, dir_path=benchmarks_dir_path):
+        """
+        Write the results.
+
+        :param dir_path: The directory under which to save the results.
+        :type dir_path: :class:`str`
+        :returns: The path of the file written.
+        :rtype: :class:`str`
+        """
+        build_dir = os.path.join(dir_path,
+                                 re.sub(r"[^\w.-]", "_", self.build))
+        if not os.path.exists(build_dir):
+            os.makedirs(build_dir)
+
+        now = datetime.datetime.now().replace(microsecond=0)
+        path = os.path.join(build_dir, now.isoformat() + ".json")
+        with open(path, 'w') as results:
+            json.dump({
+                "build": self.build,
+                "browser": self.browser,
+                "date": now.isoformat(),
+                "results": self.entries,
+                "scaling": self.scaling()
+            }, results, indent=2)
+        return path
+
+    def report(self):
+        """
+        Print the percentiles of the results.
+        """
+        print("Benchmark results for {0} ({1}):".format(
+            self.build, self.browser))
+        for entry in self.entries:
+            summary = entry["summary"]
+            if not summary["count"]:
+                continue
+            label = entry["benchmark"]
+            if entry.get("key"):
+                label += " (" + entry["key"] + ")"
+            print("  {0}, {1} ({2} bytes): p50={3:.1f} p95={4:.1f} "
+                  "p99={5:.1f} {6} (n={7})".format(
+                      label, entry["document"], entry["size"],
+                      summary["p50"], summary["p95"], summary["p99"],
+                      entry["unit"], summary["count"]))
+
+    def scaling(self):
+        """
+        :returns: For each benchmark, the median of its measurements on
+                  each document, ordered by the size of the
+                  documents. This shows how the performance scales
+                  with the size of documents.
+        :rtype: :class:`dict` mapping benchmark names to lists of
+                ``[size, median]`` pairs.
+        """
+        ret = {}
+        for entry in self.entries:
+            name = entry["benchmark"]
+            if entry.get("key"):
+                name += " (" + entry["key"] + ")"
+            ret.setdefault(name, []).append(
+                [entry["size"], entry["summary"].get("p50")])
+        for points in ret.values():
+            points.sort()
+        return ret
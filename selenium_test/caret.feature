@@ -30,6 +30,7 @@ Scenario: Selecting text backwards with the keyboard.
   When the user selects text backwards with the keyboard
   Then the text is selected
 
+@display
 Scenario: Clicking in the editor's scrollbar.
   When the user resizes the window so that the editor pane will be offscreen
   And the user scrolls the window down so that the editor's top is at the top of the window
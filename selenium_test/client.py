@@ -0,0 +1,98 @@
+"""
+The client with which the test suite talks to the test server. It
+keeps its connections to the server alive between requests, so that
+the steps that poll the server do not pay for a new connection on each
+poll.
+"""
+from urlparse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+CONTROL_PATH = "/build/ajax/control"
+JOURNAL_PATH = "/build/ajax/save_journal"
+
+# The timeout of a request, in seconds: how long we wait for a
+# connection and how long we wait for a response. Long polls wait for
+# a response longer than this.
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+# How many times we retry a request that failed to connect. Requests
+# that reached the server are not retried, as the server may have
+# acted on them.
+CONNECT_RETRIES = 3
+
+
+class ServerClient(object):
+    """
+    A client of the test server.
+
+    :param server: The address of the server.
+    :type server: :class:`str`
+    :param namespace: The namespace of our state on the server. See
+                      ``server.py``.
+    :type namespace: :class:`str`
+    """
+
+    def __init__(self, server, namespace=""):
+        self.server = server
+        self.namespace = namespace
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            max_retries=Retry(total=CONNECT_RETRIES,
+                              connect=CONNECT_RETRIES, read=0, status=0,
+                              backoff_factor=0.1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _params(self, params):
+        if self.namespace:
+            params = dict(params, namespace=self.namespace)
+        return params
+
+    def control(self, command, errmsg, value=None):
+        """
+        Send a command to the control endpoint of the server.
+
+        :param command: The command.
+        :type command: :class:`str`
+        :param errmsg: The message of the assertion that fails if the
+                       command fails.
+        :type errmsg: :class:`str`
+        :param value: The value of the command, for commands that set a
+                      flag.
+        """
+        params = {"command": command}
+        if value is not None:
+            params["value"] = value
+        resp = self.session.post(urljoin(self.server, CONTROL_PATH),
+                                 self._params(params),
+                                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        assert resp.status_code == 200 and resp.json() == {}, errmsg
+
+    def reset(self):
+        self.control("reset", "failed to reset")
+
+    def wait_for_saves(self, after, timeout):
+        """
+        Get the records of the server's save journal that come after a
+        sequence number, waiting up to ``timeout`` seconds for one if
+        there are none yet.
+
+        :returns: The records, and the sequence number of the last
+                  record made.
+        :rtype: :class:`tuple`
+        """
+        resp = self.session.get(
+            urljoin(self.server, JOURNAL_PATH),
+            params=self._params({"after": after, "timeout": timeout}),
+            # Give the server time to answer once the timeout has
+            # expired.
+            timeout=(CONNECT_TIMEOUT, timeout + READ_TIMEOUT))
+        journal = resp.json()
+        return journal["saves"], journal["last"]
+
+    def close(self):
+        self.session.close()
@@ -79,12 +79,14 @@ Scenario: clicking an option of the context menu makes it disappear.
   When the user clicks the first context menu option
   Then a context menu is not visible
 
+@display
 Scenario: bringing up the context menu with the mouse when the main editor pane is scrolled off screen
   When the user resizes the window so that the editor pane has a vertical scrollbar
   And the user scrolls the window down by 20
   And the user uses the mouse to bring up the context menu on a placeholder
   Then a context menu is visible close to where the user invoked it
 
+@display
 Scenario: bringing up the context menu with the keyboard when the main editor pane is scrolled off screen
   When the user resizes the window so that the editor pane has a vertical scrollbar
   And the user clicks on a placeholder that will serve to bring up a context menu
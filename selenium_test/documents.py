@@ -0,0 +1,279 @@
+"""
+Generation of large documents for the tests and benchmarks that
+measure how wed scales with the size of documents. The documents are
+valid according to the schemas that wed's test suites use:
+``schemas/myTEI.rng`` and ``schemas/tei-math.rng`` for TEI, and
+``schemas/docbook.rng`` for DocBook.
+
+``misc/generate_large_documents.py`` is the command line interface to
+this module.
+"""
+import os
+import random
+import subprocess
+from xml.sax.saxutils import escape
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do "
+         "eiusmod tempor incididunt ut labore et dolore magna aliqua enim "
+         "ad minim veniam quis nostrud exercitation ullamco laboris nisi "
+         "aliquip ex ea commodo consequat duis aute irure in reprehenderit "
+         "voluptate velit esse cillum eu fugiat nulla pariatur").split()
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+DOCBOOK_NS = "http://docbook.org/ns/docbook"
+
+
+class Flavor(object):
+    """
+    The markup of a kind of document.
+
+    :param name: The name of the flavor.
+    :type name: :class:`str`
+    :param schema: The schema that the documents must satisfy.
+    :type schema: :class:`str`
+    :param kitchen_sink_schema: The value of the ``schema`` parameter
+                                of the kitchen sink for editing
+                                documents of this flavor, or ``None``
+                                for the default schema.
+    :type kitchen_sink_schema: :class:`str`
+    :param html_xsl: The stylesheet that converts documents of this
+                     flavor to the HTML that wed edits.
+    :type html_xsl: :class:`str`
+    """
+
+    def __init__(self, name, schema, kitchen_sink_schema, html_xsl):
+        self.name = name
+        self.schema = schema
+        self.kitchen_sink_schema = kitchen_sink_schema
+        self.html_xsl = html_xsl
+
+
+class TEIFlavor(Flavor):
+    top_section = "div"
+    section = "div"
+    paragraph = "p"
+    inlines = ("hi", "term", "emph", "foreign")
+
+    def start(self):
+        return ('<TEI xmlns="{0}">\n'
+                '<teiHeader><fileDesc>'
+                '<titleStmt><title>Generated document</title></titleStmt>'
+                '<publicationStmt><p>Generated for testing.</p>'
+                '</publicationStmt>'
+                '<sourceDesc><p>Generated.</p></sourceDesc>'
+                '</fileDesc></teiHeader>\n'
+                '<text><body>\n').format(TEI_NS)
+
+    def end(self):
+        return '</body></text>\n</TEI>\n'
+
+    def heading(self, text):
+        return "<head>" + text + "</head>"
+
+
+class DocBookFlavor(Flavor):
+    top_section = "chapter"
+    section = "section"
+    paragraph = "para"
+    inlines = ("emphasis", "literal", "phrase", "code")
+
+    def start(self):
+        return ('<book xmlns="{0}" version="5.0">\n'
+                '<title>Generated document</title>\n').format(DOCBOOK_NS)
+
+    def end(self):
+        return '</book>\n'
+
+    def heading(self, text):
+        return "<title>" + text + "</title>"
+
+
+FLAVORS = {
+    "tei": TEIFlavor("tei", "schemas/myTEI.rng", None,
+                     "test/xml-to-html-tei.xsl"),
+    "tei-math": TEIFlavor("tei-math", "schemas/tei-math.rng", "@math",
+                          "test/xml-to-html-tei.xsl"),
+    "docbook": DocBookFlavor("docbook", "schemas/docbook.rng", "@docbook",
+                             "lib/wed/xml-to-html.xsl"),
+}
+
+SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 * 1024}
+
+
+def parse_size(text):
+    """
+    Parse a size like ``10KB`` or ``50MB``.
+
+    :param text: The size.
+    :type text: :class:`str`
+    :returns: The size in bytes.
+    :rtype: :class:`int`
+    :raises ValueError: If the size cannot be parsed.
+    """
+    text = text.strip().upper()
+    number = text.rstrip("KMB")
+    unit = text[len(number):]
+    if unit not in SIZE_UNITS:
+        raise ValueError("unknown unit: " + unit)
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+class Generator(object):
+    """
+    Generates documents of a given flavor.
+
+    :param flavor: The flavor of the documents.
+    :type flavor: :class:`Flavor`
+    :param depth: How deeply sections are nested. A depth of 1 means
+                  that there are only top-level sections.
+    :type depth: :class:`int`
+    :param breadth: The number of subsections of each section that is
+                    not at the maximum depth.
+    :type breadth: :class:`int`
+    :param paragraphs: The number of paragraphs in each section.
+    :type paragraphs: :class:`int`
+    :param words: The number of words in each paragraph.
+    :type words: :class:`int`
+    :param inline_density: The probability that a word starts an
+                           inline element, from 0 to 1.
+    :type inline_density: :class:`float`
+    :param seed: The seed of the random number generator. The same
+                 parameters and seed produce the same document.
+    :type seed: :class:`int`
+    """
+
+    def __init__(self, flavor, depth=2, breadth=2, paragraphs=3, words=60,
+                 inline_density=0.1, seed=0):
+        if depth < 1:
+            raise ValueError("the depth must be at least 1")
+        if not 0 <= inline_density <= 1:
+            raise ValueError("the inline density must be between 0 and 1")
+        self.flavor = flavor
+        self.depth = depth
+        self.breadth = breadth
+        self.paragraphs = paragraphs
+        self.words = words
+        self.inline_density = inline_density
+        self.random = random.Random(seed)
+
+    def text(self, count):
+        return " ".join(self.random.choice(WORDS) for _ in range(count))
+
+    def paragraph(self):
+        flavor = self.flavor
+        parts = []
+        remaining = self.words
+        while remaining > 0:
+            if self.random.random() < self.inline_density:
+                count = min(remaining, self.random.randint(1, 3))
+                name = self.random.choice(flavor.inlines)
+                parts.append("<{0}>{1}</{0}>".format(
+                    name, escape(self.text(count))))
+            else:
+                count = 1
+                parts.append(escape(self.random.choice(WORDS)))
+            remaining -= count
+        return "<{0}>{1}</{0}>".format(flavor.paragraph, " ".join(parts))
+
+    def section(self, level, name=None):
+        """
+        :param level: The level of the section. Top-level sections are
+                      at level 1.
+        :type level: :class:`int`
+        :param name: The name of the element, if it is not the flavor's
+                     usual section element.
+        :type name: :class:`str`
+        :returns: The section, serialized.
+        :rtype: :class:`str`
+        """
+        flavor = self.flavor
+        name = name or flavor.section
+        parts = ["<" + name + ">",
+                 flavor.heading(escape(self.text(4).capitalize()))]
+        parts.extend(self.paragraph() for _ in range(self.paragraphs))
+        if level < self.depth:
+            parts.extend(self.section(level + 1)
+                         for _ in range(self.breadth))
+        parts.append("</" + name + ">\n")
+        return "".join(parts)
+
+    def write(self, out, size):
+        """
+        Write a document. Top-level sections are added until the
+        document reaches the requested size, so the document is larger
+        than requested by at most one top-level section.
+
+        :param out: Where to write the document.
+        :type out: A file-like object.
+        :param size: The minimum size of the document, in bytes.
+        :type size: :class:`int`
+        :returns: The actual size of the document, in bytes.
+        :rtype: :class:`int`
+        """
+        flavor = self.flavor
+        start = flavor.start()
+        end = flavor.end()
+        out.write(start)
+        written = len(start) + len(end)
+        # A document must have at least one section.
+        while True:
+            section = self.section(1, flavor.top_section)
+            out.write(section)
+            written += len(section)
+            if written >= size:
+                break
+        out.write(end)
+        return written
+
+
+def generate(flavor_name, size, path, **kwargs):
+    """
+    Generate a document in a file.
+
+    :param flavor_name: The name of the flavor of the document. See
+                        :data:`FLAVORS`.
+    :type flavor_name: :class:`str`
+    :param size: The minimum size of the document, in bytes.
+    :type size: :class:`int`
+    :param path: The path of the file.
+    :type path: :class:`str`
+    :param kwargs: Passed to :class:`Generator`.
+    :returns: The actual size of the document, in bytes.
+    :rtype: :class:`int`
+    """
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+    generator = Generator(FLAVORS[flavor_name], **kwargs)
+    with open(path, 'w') as out:
+        return generator.write(out, size)
+
+
+def html_path(path):
+    """
+    :returns: The path of the HTML form of the document at ``path``. We
+              use the same naming convention as the converted test
+              files.
+    :rtype: :class:`str`
+    """
+    return os.path.splitext(path)[0] + "_converted.xml"
+
+
+def convert_to_html(flavor_name, path, saxon="saxon"):
+    """
+    Convert a document to the HTML that wed edits, in the same way the
+    build converts the test files.
+
+    :param flavor_name: The name of the flavor of the document.
+    :type flavor_name: :class:`str`
+    :param path: The path of the document.
+    :type path: :class:`str`
+    :param saxon: The command that runs saxon.
+    :type saxon: :class:`str`
+    :returns: The path of the HTML form.
+    :rtype: :class:`str`
+    """
+    dest = html_path(path)
+    subprocess.check_call([saxon, "-s:" + path, "-o:" + dest,
+                           "-xsl:" + FLAVORS[flavor_name].html_xsl])
+    return dest
@@ -10,9 +10,6 @@ import datetime
 import httplib
 
 from slugify import slugify
-import requests
-from requests.exceptions import ConnectionError
-from pyvirtualdisplay import Display
 
 # pylint: disable=E0611
 from nose.tools import assert_true, assert_false
@@ -21,12 +18,44 @@ from behave.tag_matcher import ActiveTagMatcher
 from selenic import Builder, outil
 import selenic.util
 
+from .timings import TimingDB
+from .screenshots import ScreenshotWriter, Timeline, prune_runs
+from .profiling import Profiler, profiles_dir_path
+from .benchmarks import Results
+from .js_logs import JSLog, parse_level
+from .storage import Databases, DATABASE_COOKIE, DATABASE_USED_COOKIE
+from .tracking import StateTracker, WINDOW, TABS, STORAGE, PAGE
+from .client import ServerClient
+from .server import Server, start_node_server, NAMESPACE_COOKIE
+from .sessions import start_display, start_window_manager, lease_session, \
+    is_headless
+from .util import set_script_timeout, SCRIPT_TIMEOUT_MARGIN
+
 _dirname = os.path.dirname(__file__)
 
 conf_path = os.path.join(os.path.dirname(_dirname),
                          "build", "config", "selenium_config.py")
 
 
+def userdata_flag(context, name, default=False):
+    """
+    Interpret a user data variable as a boolean flag.
+
+    :param context: The behave context.
+    :param name: The name of the variable.
+    :type name: :class:`str`
+    :param default: The value to use if the variable is not set.
+    :type default: :class:`bool`
+    :returns: The value of the flag.
+    :rtype: :class:`bool`
+    """
+    value = context.config.userdata.get(name)
+    if value is None:
+        return default
+
+    return value.lower() not in ("", "0", "false", "no", "off")
+
+
 def dump_config(builder):
     print("***")
     print(builder.config)
@@ -41,7 +70,12 @@ def cleanup(context, failed):
     actually_quit = not ((selenium_quit in ("never", "on-enter")) or
                          (context.failed and selenium_quit ==
                           "on-success"))
-    if driver:
+    if context.lease:
+        # The browser belongs to the daemon. We just give it back.
+        context.lease.release()
+        context.lease = None
+        context.driver = None
+    elif driver:
         try:
             builder.set_test_status(
                 driver.session_id, not (failed or context.failed))
@@ -85,62 +119,152 @@ def cleanup(context, failed):
         context.server.send_signal(signal.SIGTERM)
         context.server = None
 
+    if context.server_client:
+        context.server_client.close()
+        context.server_client = None
+
+    if context.python_server:
+        context.python_server.stop()
+        context.python_server = None
+        context.server_state = None
+
+    if context.timings:
+        context.timings.close()
+        context.timings = None
+
+    if context.screenshot_writer:
+        context.screenshot_writer.close()
+        if context.screenshot_writer.dropped:
+            print("Dropped {0} screenshot(s) because the writer could not "
+                  "keep up".format(context.screenshot_writer.dropped))
+        if context.screenshot_writer.failed:
+            print("Could not write {0} screenshot(s); see the index for "
+                  "the errors".format(context.screenshot_writer.failed))
+        if context.screenshot_writer.error:
+            print("The screenshot writer stopped: {0}".format(
+                context.screenshot_writer.error))
+        context.screenshot_writer = None
+
     if context.builder and context.builder.post_execution:
         context.builder.post_execution()
 
 
+# How long we give the server to be ready, in seconds.
+SERVER_READY_TIMEOUT = 30
+
+# How long we give the browser to delete the storage databases of the
+# run, in seconds.
+DELETE_DATABASES_TIMEOUT = 60
+
+
 def start_server(context):
     builder = context.builder
-    port = outil.get_unused_port() if not builder.remote else \
-        outil.get_unused_sauce_port()
+    shared_server = context.config.userdata.get("shared_server")
+    if shared_server:
+        # The runner started a server for all its workers. We do not
+        # start one.
+        thread = threading.Thread(target=use_server,
+                                  args=(context, shared_server),
+                                  name="Server Start Thread")
+        thread.start()
+        return thread
 
-    if port is None:
-        raise Exception("unable to find a port for the server")
+    if not builder.remote:
+        # The server picks a free port itself. This way, workers
+        # running in parallel cannot race for the same port.
+        port = 0
+    else:
+        port = outil.get_unused_sauce_port()
+        if port is None:
+            raise Exception("unable to find a port for the server")
 
-    port = str(port)
-    context.server_port = port
+    context.server_port = str(port)
 
     def start():
-        # Start a server just for our tests...
-        context.server = subprocess.Popen(["node", "./server.js",
-                                           "server", "localhost:" + port])
-        # This is the address at which we can control the server
-        # locally.
-        local_server = "http://localhost:" + port + builder.WED_ROOT
-        ssh_tunnel = builder.WED_SSH_TUNNEL
-        if builder.remote and ssh_tunnel:
-            builder.WED_SERVER = "{0}:{1}{2}".format(
-                ssh_tunnel["server"],
-                ssh_tunnel["server_port"],
-                builder.WED_ROOT)
-        else:
-            builder.WED_SERVER = local_server
-
-        context.local_server = local_server
-
-        # Try pinging the server util we get a positive response or we've
-        # tried enough times to declare failure
-        tries = 0
-        success = False
-        while not success and tries < 10:
-            try:
-                control(local_server, 'ping', 'failed to ping')
-                success = True
-            except ConnectionError:
-                time.sleep(0.5)
-                tries += 1
+        try:
+            _start()
+        except Exception as ex:
+            # before_all raises it once it has joined this thread.
+            context.server_error = ex
+            raise
 
-        if not success:
-            raise Exception("cannot contact server")
+    def _start():
+        # Start a server just for our tests. Both kinds of server are
+        # ready to accept connections once we get their port.
+        if context.node_server:
+            context.server, port = start_node_server("localhost",
+                                                     context.server_port,
+                                                     SERVER_READY_TIMEOUT)
+        else:
+            context.python_server = Server(("localhost",
+                                            int(context.server_port)), ".")
+            context.python_server.start()
+            port = context.python_server.server_address[1]
+            # The steps inspect the state of the server directly.
+            context.server_state = context.python_server.state_for(
+                context.server_namespace)
+        context.server_port = port = str(port)
+        use_server(context, "http://localhost:" + port)
 
     thread = threading.Thread(target=start, name="Server Start Thread")
     thread.start()
     return thread
 
+
+def use_server(context, address):
+    """
+    Set up the context to use a server.
+
+    :param address: The address at which the server can be reached
+                    locally, without a path.
+    :type address: :class:`str`
+    """
+    builder = context.builder
+    # This is the address at which we can control the server
+    # locally.
+    local_server = address + builder.WED_ROOT
+    ssh_tunnel = builder.WED_SSH_TUNNEL
+    if builder.remote and ssh_tunnel:
+        builder.WED_SERVER = "{0}:{1}{2}".format(
+            ssh_tunnel["server"],
+            ssh_tunnel["server_port"],
+            builder.WED_ROOT)
+    else:
+        builder.WED_SERVER = local_server
+
+    context.local_server = local_server
+    # All our traffic to the server goes through this client.
+    context.server_client = ServerClient(local_server,
+                                         context.server_namespace)
+
+
+def set_namespace_cookie(context):
+    """
+    Set the cookie that tells the server to which namespace the
+    requests of the browser belong.
+    """
+    driver = context.driver
+    # We must be on the server's domain to set a cookie for it.
+    driver.get(urljoin(context.builder.WED_SERVER, "/blank"))
+    driver.add_cookie({"name": NAMESPACE_COOKIE,
+                       "value": context.server_namespace,
+                       "path": "/"})
+
 screenshots_dir_path = os.path.join("test_logs", "screenshots")
 
 
 def setup_screenshots(context):
+    worker_dir = context.config.userdata.get("worker_dir")
+    if worker_dir:
+        # We are one of many workers. The runner manages the directory
+        # for the whole run, so we just use a subdirectory of our own.
+        this_screenshots_dir_path = os.path.join(worker_dir, "screenshots")
+        os.makedirs(this_screenshots_dir_path)
+        context.screenshots_dir_path = this_screenshots_dir_path
+        context.screenshot_writer = \
+            ScreenshotWriter(this_screenshots_dir_path)
+        return
+
     now = datetime.datetime.now().replace(microsecond=0)
     this_screenshots_dir_path = os.path.join(screenshots_dir_path,
                                              now.isoformat())
@@ -156,6 +280,8 @@ def setup_screenshots(context):
     os.symlink(os.path.basename(this_screenshots_dir_path),
                os.path.join(screenshots_dir_path, "LATEST"))
     context.screenshots_dir_path = this_screenshots_dir_path
+    context.screenshot_writer = ScreenshotWriter(this_screenshots_dir_path)
+    prune_runs(screenshots_dir_path)
 
 
 def before_all(context):
@@ -165,11 +291,24 @@ def before_all(context):
     # through without error. It assumes that these fields exist.
     context.builder = None
     context.driver = None
+    context.lease = None
     context.wm = None
     context.display = None
     context.server = None
+    context.python_server = None
+    context.server_state = None
+    context.server_error = None
+    context.server_client = None
     context.tunnel = None
     context.sc_tunnel_tempdir = None
+    context.timings = None
+    context.profiler = None
+    context.benchmark_results = None
+    context.screenshot_writer = None
+    context.timeline = None
+    context.js_log = None
+    context.databases = None
+    context.state_tracker = None
 
     context.selenium_quit = os.environ.get("SELENIUM_QUIT")
     userdata = context.config.userdata
@@ -205,14 +344,28 @@ def before_all(context):
 
     context.active_tag_matcher = ActiveTagMatcher(values)
 
+    # Whether we use server.js rather than our own in-process server.
+    context.node_server = userdata_flag(context, "node_server")
+    # The namespace of our state on the server. Parallel workers each
+    # have their own so that they can share a server.
+    worker = userdata.get("worker")
+    context.server_namespace = "worker-" + worker if worker is not None \
+        else ""
     server_thread = start_server(context)
 
+    # Headless browsers need neither a display nor a window manager.
+    context.headless = is_headless(builder)
+
     if not builder.remote:
-        visible = context.selenium_quit in ("never", "on-success")
-        context.display = Display(visible=visible, size=(1024, 768))
-        context.display.start()
-        builder.update_ff_binary_env('DISPLAY')
-        context.wm = subprocess.Popen(["openbox", "--sm-disable"])
+        # If a daemon is keeping browsers around for us, we use one of
+        # them. The daemon also provides the display and window
+        # manager.
+        context.lease = lease_session(builder)
+        if not context.lease and not context.headless:
+            visible = context.selenium_quit in ("never", "on-success")
+            context.display = start_display(visible)
+            builder.update_ff_binary_env('DISPLAY')
+            context.wm = start_window_manager()
     else:
         context.display = None
         context.wm = None
@@ -233,11 +386,21 @@ def before_all(context):
                      "-R", str(ssh_tunnel["ssh_port"]) + ":localhost:" +
                      context.server_port, "-N"])
 
-    driver = builder.get_driver(desired_capabilities)
+    driver = context.lease.driver if context.lease else \
+        builder.get_driver(desired_capabilities)
     context.driver = driver
     context.util = selenic.util.Util(driver,
                                      # Give more time if we are remote.
                                      4 if builder.remote else 2)
+    # Once for the whole session, so that wait_in_page does not have to
+    # set it on every call.
+    set_script_timeout(context.util,
+                       context.util.timeout + SCRIPT_TIMEOUT_MARGIN)
+    context.profiler = Profiler()
+    context.profiler.instrument(driver, context.util)
+    # We reset between scenarios only what the scenarios change.
+    context.state_tracker = StateTracker()
+    context.state_tracker.instrument(driver)
     # Without this, window sizes vary depending on the actual browser
     # used.
     context.initial_window_size = {"width": 1020, "height": 700}
@@ -257,9 +420,44 @@ def before_all(context):
 
     context.behave_captions = os.environ.get("BEHAVE_CAPTIONS")
 
-    context.selenium_logs = os.environ.get("SELENIUM_LOGS", False)
+    # SELENIUM_LOGS may name the minimum level of the messages to
+    # collect.
+    js_log_level = parse_level(os.environ.get("SELENIUM_LOGS"))
+    if js_log_level:
+        context.js_log = JSLog(
+            os.path.join(context.screenshots_dir_path, "js_logs"),
+            js_log_level)
+
+    # Whether we reset the editor in place rather than reload the
+    # page, when possible.
+    context.fast_reset = userdata_flag(context, "fast_reset", True)
+
+    # The number of captures to keep in the timeline of each scenario.
+    # The timeline is written only when a step fails.
+    timeline = int(userdata.get("timeline", 0))
+    if timeline:
+        context.timeline = Timeline(timeline)
+
+    # Whether the kitchen sink reuses the grammars it has already built.
+    context.schema_cache = userdata_flag(context, "schema_cache")
+
+    # The benchmarks run only if they are requested.
+    if userdata_flag(context, "benchmark"):
+        config = builder.config
+        context.benchmark_results = Results(
+            builder.describe.strip(),
+            "{0} {1} on {2}".format(config.browser, config.version,
+                                    config.platform))
 
     server_thread.join()
+    if context.server_error:
+        raise context.server_error
+
+    if context.server_namespace:
+        set_namespace_cookie(context)
+
+    # Each scenario gets a storage database of its own.
+    context.databases = Databases()
 
     # IE 10 has a problem with self-signed certificates. Selenium
     # cannot tell IE 10 to ignore these problems. Here we work around
@@ -273,145 +471,195 @@ def before_all(context):
             "javascript:((link = document.getElementById("
             "'overridelink')) && link.click())")
 
-    context.start_time = time.time()
-
-
-def control(server, command, errmsg):
-    params = {"command": command}
-    resp = requests.post(urljoin(server, '/build/ajax/control'), params)
-    assert resp.json() == {}, errmsg
+    timings_db = userdata.get("timings_db")
+    context.timings = TimingDB(timings_db) if timings_db else TimingDB()
 
-
-def reset(server):
-    control(server, 'reset', 'failed to reset')
+    context.start_time = time.time()
 
 
 def before_scenario(context, scenario):
     driver = context.driver
+    context.profiler.start_scenario(scenario)
+    if context.timeline:
+        context.timeline.clear()
 
     if context.active_tag_matcher.should_exclude_with(scenario.effective_tags):
         scenario.skip(reason="Disabled by an active tag")
         return
 
+    if "benchmark" in scenario.effective_tags and \
+       not context.benchmark_results:
+        scenario.skip(reason="Benchmarks are not requested")
+        return
+
+    if "display" in scenario.effective_tags and context.headless:
+        scenario.skip(reason="Requires a display; the browser is headless")
+        return
+
     if context.behave_captions:
         # We send a comment as a "script" so that we get something
         # in the record of Selenium commands.
         driver.execute_script("// SCENARIO: " + scenario.name + "\n")
-    driver.set_window_size(context.initial_window_size["width"],
-                           context.initial_window_size["height"])
-    driver.set_window_position(0, 0)
-    reset(context.local_server)
+
+    # We reset only what the previous scenario changed.
+    tracker = context.state_tracker
+    blank = urljoin(context.builder.WED_SERVER, "/blank")
+    if tracker.needs_reset(PAGE):
+        # This also makes the next editor load a fresh page rather than
+        # reset the editor in place.
+        driver.get(blank)
+    if tracker.needs_reset(WINDOW):
+        driver.set_window_size(context.initial_window_size["width"],
+                               context.initial_window_size["height"])
+        driver.set_window_position(0, 0)
+    if context.server_state:
+        # The state is in our process, and knows whether it changed.
+        if context.server_state.dirty:
+            context.server_state.reset()
+    else:
+        context.server_client.reset()
+    if tracker.needs_reset(STORAGE):
+        context.databases.next(driver, blank)
+    tracker.clear()
+    context.scenario_start_time = time.time()
 
 
-def after_scenario(context, _scenario):
+def after_scenario(context, scenario):
     driver = context.driver
 
+    # We get the messages first, so that we have them even if the
+    # scenario ended in a fatal error.
+    if context.js_log:
+        context.js_log.drain(driver)
+        path = context.js_log.write(scenario)
+        if path:
+            print("JavaScript log:", path)
+
     #
-    # Make sure we did not trip a fatal error.
+    # Make sure we did not trip a fatal error, and find whether the
+    # scenario used its storage database. We do not need to clear the
+    # storage: the next scenario gets a database of its own if needed.
     #
-    terminating = context.driver.execute_async_script("""
-    var done = arguments[0];
-
+    status = context.driver.execute_script("""
+    var database_cookie = arguments[0];
+    var used_cookie = arguments[1];
     window.onbeforeunload = function () {};
 
-    if (typeof require === "undefined" || !require.defined) {
-        done(false);
-        return;
+    // If we are not on a page of the server, we cannot see its
+    // cookies, and cannot tell whether the database was used.
+    var used = null;
+    var cookies = {};
+    try {
+        document.cookie.split(/;\\s*/).forEach(function (cookie) {
+            var parts = cookie.split("=");
+            cookies[parts[0]] = decodeURIComponent(parts[1]);
+        });
     }
+    catch (ex) {} // Some pages do not let us read cookies at all.
+    if (cookies.hasOwnProperty(database_cookie))
+        used = cookies[used_cookie] || "";
 
-    var onerror_defined = require.defined("wed/onerror");
-
-    define("undefined", function () { return undefined; });
-
-    var deps = [];
-    deps.push(onerror_defined ? "wed/onerror" : "undefined");
-
-    deps = deps.concat(require.defined("wed/savers/localforage") ?
-      ["wed/savers/localforage", "localforage"] : ["undefined", "undefined"]);
-
-    require(deps, function (onerror, saver, lf) {
-      var terminating = onerror && onerror.is_terminating();
-      // This clears localforage on pages where it has been loaded
-      // and configured by Wed code. We detect this by checking whether the
-      // saver has been loaded.
-      if (saver) {
-        saver.config();
-        lf.clear().then(function () {
-            // This rigmarole is required to work around a bug in IndexedDB.
-            //
-            // See https://github.com/mozilla/localForage/issues/154
-            //
-            // We're basically polling until the length of the database is 0.
-            //
-            function check() {
-                lf.length(function (length) {
-                    if (length)
-                        setTimeout(check, 100);
-                    else {
-                        done(terminating);
-                        return;
-                    }
-                });
-            }
-            check();
-        });
-      }
-      else {
-          done(terminating);
-          return;
-      }
-    });
-    """)
-    assert_false(terminating, "should not have experienced a fatal error")
+    var terminating = typeof require !== "undefined" && require.defined &&
+        require.defined("wed/onerror") &&
+        require("wed/onerror").is_terminating();
+
+    return { terminating: !!terminating, used: used };
+    """, DATABASE_COOKIE, DATABASE_USED_COOKIE)
+
+    tracker = context.state_tracker
+    # If we cannot tell, we assume the database was used. A page that
+    # has configured localforage keeps using the same database, so it
+    # must be reloaded too.
+    if status["used"] is None or status["used"] == context.databases.current:
+        tracker.mark(STORAGE, PAGE)
+
+    # After a failure, we cannot tell what state the scenario left
+    # behind.
+    if scenario.status == "failed" or status["terminating"]:
+        tracker.mark()
+
+    assert_false(status["terminating"],
+                 "should not have experienced a fatal error")
 
     # Close all extra tabs.
-    handles = driver.window_handles
-    if handles:
-        for handle in handles:
+    if tracker.needs_reset(TABS):
+        for handle in driver.window_handles:
             if handle != context.initial_window_handle:
                 driver.switch_to_window(handle)
                 driver.close()
         driver.switch_to_window(context.initial_window_handle)
 
+    # We record only successful runs. A failure may have cut a
+    # scenario short, or made it wait for a timeout.
+    if scenario.status == "passed":
+        context.timings.record(scenario,
+                               time.time() - context.scenario_start_time)
+
+    context.profiler.end_scenario(scenario)
+
 
 def before_step(context, step):
+    context.profiler.start_step(step)
     if context.behave_captions:
         # We send a comment as a "script" so that we get something
         # in the record of Selenium commands.
         context.driver.execute_script("// STEP: " + step.keyword + " " +
                                       step.name + "\n")
     if context.behave_wait:
-        time.sleep(context.behave_wait)
+        with context.profiler.measure("wait"):
+            time.sleep(context.behave_wait)
 
 
 def after_step(context, step):
     driver = context.driver
+    png = None
+    if context.timeline:
+        png = driver.get_screenshot_as_png()
+        context.timeline.add(step.keyword + " " + step.name, png)
+
     if step.status == "failed":
-        name = os.path.join(context.screenshots_dir_path,
-                            slugify(context.scenario.name + "_" +
-                                    step.name) + ".png")
-        driver.save_screenshot(name)
+        name = slugify(context.scenario.name + "_" + step.name)
+        # The writer writes the capture in the background.
+        path = context.screenshot_writer.submit(
+            name,
+            png or driver.get_screenshot_as_png(),
+            scenario=context.scenario.name,
+            step=step.keyword + " " + step.name)
         print("")
-        print("Captured screenshot:", name)
+        if path is None:
+            path = "(writer stopped)" if context.screenshot_writer.error \
+                else "(dropped)"
+        print("Captured screenshot:", path)
+        if context.timeline:
+            print("Timeline:", context.timeline.flush(
+                context.screenshot_writer, name + "-timeline"))
+        # The page may not survive the failure, so we get its messages
+        # now. They are written at the end of the scenario.
+        if context.js_log:
+            context.js_log.drain(driver)
         print("")
 
-    # Perform this query only if SELENIUM_LOGS is on.
-    if context.selenium_logs:
-        logs = driver.execute_script("""
-        return window.selenium_log;
-        """)
-        if logs:
-            print("")
-            print("JavaScript log:")
-            print("\n".join(repr(x) for x in logs))
-            print("")
-            driver.execute_script("""
-            window.selenium_log = [];
-            """)
+    context.profiler.end_step(step)
 
 
 def after_all(context):
     print("Elapsed between before_all and after_all:",
           str(datetime.timedelta(seconds=time.time() - context.start_time)))
+    worker_dir = context.config.userdata.get("worker_dir")
+    path = context.profiler.write(worker_dir or profiles_dir_path,
+                                  context.builder.describe.strip())
+    print("Timing profile: " + path)
+    if userdata_flag(context, "command_summary"):
+        context.profiler.summarize()
+    if context.benchmark_results:
+        context.benchmark_results.report()
+        print("Benchmark results: " + context.benchmark_results.write())
+    if context.databases and context.databases.names:
+        # Deleting many databases takes longer than the usual scripts.
+        set_script_timeout(context.util, DELETE_DATABASES_TIMEOUT)
+        failed = context.databases.delete(
+            context.driver, urljoin(context.builder.WED_SERVER, "/blank"))
+        if failed:
+            print("Could not delete {0} storage database(s)".format(failed))
     cleanup(context, False)
     dump_config(context.builder)
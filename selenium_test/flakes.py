@@ -0,0 +1,119 @@
+"""
+Persistent record of the scenarios that fail intermittently.
+``misc/selenium_runner.py`` reruns the scenarios that fail and records
+the outcome of each scenario here: whether it passed, whether it
+passed only after being rerun (i.e. it is flaky) or whether it failed
+every time. Scenarios that are flaky often enough are considered
+chronic flakers, and the runner can quarantine them.
+"""
+import os
+import time
+import sqlite3
+
+default_db_path = os.path.join("test_logs", "flakes.db")
+
+# The outcomes we record.
+PASSED = "passed"
+FLAKY = "flaky"
+FAILED = "failed"
+
+# The number of outcomes we keep for each scenario.
+HISTORY = 20
+
+# A scenario is a chronic flaker if it was flaky at least this many
+# times in its last HISTORY outcomes.
+CHRONIC_THRESHOLD = 3
+
+
+def report_key(element):
+    """
+    :param element: A scenario in a report produced by behave's JSON
+                    formatter.
+    :type element: :class:`dict`
+    :returns: The key under which the outcomes of the scenario are
+              recorded. It is the same key as the one used by
+              ``timings.py``.
+    :rtype: :class:`str`
+    """
+    filename = element["location"].rsplit(":", 1)[0]
+    return os.path.relpath(filename) + ":" + element["name"]
+
+
+class FlakeDB(object):
+    """
+    A database of scenario outcomes. It is safe for multiple processes
+    to use the same database at the same time.
+
+    :param path: The path of the database.
+    :type path: :class:`str`
+    """
+
+    def __init__(self, path=default_db_path):
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        self.connection = sqlite3.connect(path, timeout=30)
+        with self.connection:
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS outcomes (
+                scenario TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                recorded REAL NOT NULL)
+            """)
+            self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS outcomes_scenario
+            ON outcomes (scenario)
+            """)
+
+    def record(self, key, outcome, attempts):
+        """
+        Record an outcome. Only the last :data:`HISTORY` outcomes of a
+        scenario are kept.
+
+        :param key: The key of the scenario.
+        :type key: :class:`str`
+        :param outcome: The outcome: :data:`PASSED`, :data:`FLAKY` or
+                        :data:`FAILED`.
+        :type outcome: :class:`str`
+        :param attempts: How many times the scenario was run.
+        :type attempts: :class:`int`
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO outcomes VALUES (?, ?, ?, ?)",
+                (key, outcome, attempts, time.time()))
+            self.connection.execute("""
+            DELETE FROM outcomes WHERE scenario = ? AND rowid NOT IN
+            (SELECT rowid FROM outcomes WHERE scenario = ?
+             ORDER BY recorded DESC LIMIT ?)
+            """, (key, key, HISTORY))
+
+    def statistics(self):
+        """
+        :returns: For each scenario that has been flaky at least once,
+                  how many times it was run and how many times it was
+                  flaky, over its recorded history.
+        :rtype: :class:`dict` mapping keys to ``(runs, flaky)`` pairs.
+        """
+        return dict(
+            (key, (runs, flaky)) for (key, runs, flaky)
+            in self.connection.execute("""
+            SELECT scenario, COUNT(*),
+                   SUM(CASE WHEN outcome = ? THEN 1 ELSE 0 END)
+            FROM outcomes GROUP BY scenario
+            """, (FLAKY, )) if flaky)
+
+    def chronic(self, threshold=CHRONIC_THRESHOLD):
+        """
+        :param threshold: How many flaky outcomes make a chronic
+                          flaker.
+        :type threshold: :class:`int`
+        :returns: The keys of the chronic flakers.
+        :rtype: :class:`set` of :class:`str`
+        """
+        return set(key for (key, (_, flaky)) in self.statistics().items()
+                   if flaky >= threshold)
+
+    def close(self):
+        self.connection.close()
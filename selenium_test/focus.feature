@@ -1,3 +1,4 @@
+@display
 Feature: focus
  Users want the editor's focus to be managed.
 
@@ -0,0 +1,128 @@
+"""
+Collection of the messages that wed's code logs with ``seleniumLog``
+(see ``lib/wed/util.js``). The page keeps the messages in a bounded
+buffer, which the test suite drains only at the end of a scenario,
+when a step fails, or before the harness leaves the page, rather than
+after every step. The messages of each
+scenario are written to a JSON file of their own.
+"""
+import os
+import json
+import time
+
+from slugify import slugify
+
+# The severity levels, from the least to the most severe. They are the
+# same as those of ``lib/wed/util.js``.
+LEVELS = ("debug", "info", "warn", "error")
+
+# Returns the messages that are at least as severe as the level passed
+# as argument, and empties the buffer. The messages that were pushed
+# out of the buffer before it was drained are only counted.
+DRAIN_SCRIPT = """
+var min = arguments[0];
+var log = window.selenium_log;
+if (!log || !log.entries)
+    return null;
+var levels = ["debug", "info", "warn", "error"];
+var entries = log.entries;
+var excess = Math.max(0, entries.length - log.size);
+var ret = {
+    dropped: log.dropped + excess,
+    entries: entries.slice(excess).filter(function (entry) {
+        return levels.indexOf(entry.level) >= levels.indexOf(min);
+    })
+};
+log.entries = [];
+log.dropped = 0;
+return ret;
+"""
+
+
+def parse_level(value):
+    """
+    Interpret the value of the ``SELENIUM_LOGS`` environment variable.
+
+    :param value: The value.
+    :type value: :class:`str`
+    :returns: The minimum level of the messages to collect, or
+              ``None`` if the messages are not collected. A value which
+              is not the name of a level turns on the collection of all
+              messages.
+    :rtype: :class:`str`
+    """
+    if not value:
+        return None
+
+    value = value.lower()
+    return value if value in LEVELS else LEVELS[0]
+
+
+class JSLog(object):
+    """
+    The messages logged by the page during the current scenario.
+
+    :param dir_path: The directory in which to write the messages.
+    :type dir_path: :class:`str`
+    :param level: The minimum level of the messages to collect.
+    :type level: :class:`str`
+    """
+
+    def __init__(self, dir_path, level):
+        self.dir_path = dir_path
+        self.level = level
+        self.entries = []
+        self.dropped = 0
+
+    def drain(self, driver):
+        """
+        Move the messages buffered in the page into this object.
+
+        :param driver: The driver of the browser.
+        :returns: The number of messages drained.
+        :rtype: :class:`int`
+        """
+        log = driver.execute_script(DRAIN_SCRIPT, self.level)
+        if not log:
+            return 0
+
+        self.entries += log["entries"]
+        self.dropped += log["dropped"]
+        return len(log["entries"])
+
+    def write(self, scenario):
+        """
+        Write the messages of a scenario, and forget them. Nothing is
+        written if there are no messages.
+
+        :param scenario: The scenario.
+        :type scenario: :class:`behave.model.Scenario`
+        :returns: The path of the file written, or ``None``.
+        :rtype: :class:`str`
+        """
+        entries, dropped = self.entries, self.dropped
+        self.entries = []
+        self.dropped = 0
+        if not entries and not dropped:
+            return None
+
+        if not os.path.exists(self.dir_path):
+            os.makedirs(self.dir_path)
+        path = os.path.join(self.dir_path, slugify(scenario.name) + ".json")
+        count = 1
+        while os.path.exists(path):
+            count += 1
+            path = os.path.join(self.dir_path, "{0}-{1}.json".format(
+                slugify(scenario.name), count))
+
+        with open(path, 'w') as out:
+            json.dump({
+                "scenario": scenario.name,
+                "location": str(scenario.location),
+                "status": scenario.status,
+                "level": self.level,
+                "written": time.time(),
+                "dropped": dropped,
+                "entries": entries
+            }, out, indent=2)
+        return path
@@ -0,0 +1,321 @@
+"""
+Instrumentation that records where the test suite spends its time.
+The time of each step and each scenario is broken down into:
+
+``driver``
+  Round trips to the browser, i.e. every command sent through the
+  WebDriver protocol.
+
+``page_load``
+  Commands that load a page.
+
+``wait_for_editor``
+  Waiting for the editor to be ready.
+
+``wait``
+  Waiting for conditions to become true, and explicit sleeps.
+
+The categories overlap: a page load is also a driver round trip, and
+waiting for a condition usually involves round trips.
+
+The driver round trips are also counted by type of command, with a
+histogram of their latencies, so that we can find which steps would
+benefit most from fewer round trips. The report is written as JSON at
+the end of the run.
+"""
+import os
+import json
+import time
+import bisect
+import datetime
+import contextlib
+
+from selenium.webdriver.remote.command import Command
+
+# Python 2 does not have a monotonic clock. We use it if it is
+# available.
+clock = getattr(time, "monotonic", time.time)
+
+CATEGORIES = ("driver", "page_load", "wait_for_editor", "wait")
+
+PAGE_LOAD_COMMANDS = frozenset([Command.GET, Command.REFRESH,
+                                Command.GO_BACK, Command.GO_FORWARD])
+
+profiles_dir_path = os.path.join("test_logs", "profiles")
+
+# The upper bounds of the buckets of the latency histograms, in
+# milliseconds. There is an additional bucket for latencies above the
+# last bound.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# The number of commands listed in summaries.
+TOP_COMMANDS = 5
+
+
+class CommandStats(object):
+    """
+    Statistics about one type of WebDriver command.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.histogram[bisect.bisect_left(BUCKETS, duration * 1000)] += 1
+
+    def as_dict(self):
+        labels = ["<={0}ms".format(bound) for bound in BUCKETS] + \
+            [">{0}ms".format(BUCKETS[-1])]
+        return {
+            "count": self.count,
+            "total": self.total,
+            "histogram": dict((label, count) for (label, count)
+                              in zip(labels, self.histogram) if count)
+        }
+
+
+def top_commands(commands, limit=TOP_COMMANDS):
+    """
+    :param commands: Statistics about commands.
+    :type commands: :class:`dict` mapping command names to
+                    :class:`CommandStats`.
+    :param limit: The maximum number of commands to return.
+    :type limit: :class:`int`
+    :returns: The names of the commands that took the most time, in
+              decreasing order.
+    :rtype: :class:`list` of :class:`str`
+    """
+    return sorted(commands, key=lambda name: -commands[name].total)[:limit]
+
+
+def add_command(commands, command, duration):
+    stats = commands.get(command)
+    if stats is None:
+        stats = commands[command] = CommandStats()
+    stats.add(duration)
+
+
+class Totals(object):
+    """
+    The time spent in each category by a step or a scenario.
+    """
+
+    def __init__(self):
+        self.start = clock()
+        self.duration = None
+        self.times = dict((category, 0.0) for category in CATEGORIES)
+        self.driver_commands = 0
+        self.commands = {}
+
+    def stop(self):
+        self.duration = clock() - self.start
+
+    def as_dict(self):
+        ret = {
+            "duration": self.duration,
+            "driver_commands": self.driver_commands,
+            "commands": dict((name, stats.as_dict()) for (name, stats)
+                             in self.commands.items()),
+            "top_commands": top_commands(self.commands),
+        }
+        ret.update(self.times)
+        return ret
+
+
+class Profiler(object):
+    """
+    Records the timings of a run of the test suite.
+    """
+
+    def __init__(self):
+        self.scenarios = []
+        self._scenario = None
+        self._step = None
+        self._depths = dict((category, 0) for category in CATEGORIES)
+        # The commands of the whole run, including those performed
+        # outside scenarios.
+        self.commands = {}
+
+    def _current_totals(self):
+        return [current["totals"] for current in (self._scenario, self._step)
+                if current is not None]
+
+    def _add(self, category, duration):
+        for totals in self._current_totals():
+            totals.times[category] += duration
+
+    @contextlib.contextmanager
+    def measure(self, category):
+        """
+        Measure the time spent in a block of code.
+
+        :param category: The category to which the time is attributed.
+        :type category: :class:`str`
+        """
+        # Only the outermost measurement of a category counts, so that
+        # nested measurements are not counted twice.
+        depth = self._depths[category]
+        self._depths[category] = depth + 1
+        start = clock()
+        try:
+            yield
+        finally:
+            self._depths[category] = depth
+            if depth == 0:
+                self._add(category, clock() - start)
+
+    def instrument(self, driver, util):
+        """
+        Instrument a driver and selenic's util object so that the time
+        they spend is recorded.
+        """
+        original_execute = driver.execute
+
+        def execute(command, params=None):
+            start = clock()
+            try:
+                with self.measure("driver"):
+                    if command in PAGE_LOAD_COMMANDS:
+                        with self.measure("page_load"):
+                            return original_execute(command, params)
+                    return original_execute(command, params)
+            finally:
+                duration = clock() - start
+                add_command(self.commands, command, duration)
+                for totals in self._current_totals():
+                    totals.driver_commands += 1
+                    add_command(totals.commands, command, duration)
+
+        driver.execute = execute
+
+        original_wait = util.wait
+
+        def wait(condition):
+            with self.measure("wait"):
+                return original_wait(condition)
+
+        util.wait = wait
+        util.profiler = self
+
+    def start_scenario(self, scenario):
+        self._scenario = {
+            "feature": scenario.feature.name,
+            "scenario": scenario.name,
+            "location": "{0}:{1}".format(os.path.relpath(scenario.filename),
+                                         scenario.line),
+            "totals": Totals(),
+            "steps": []
+        }
+
+    def end_scenario(self, scenario):
+        current = self._scenario
+        if current is None:
+            return
+        current["totals"].stop()
+        current["status"] = scenario.status
+        self.scenarios.append(current)
+        self._scenario = None
+
+    def start_step(self, step):
+        self._step = {
+            "step": step.keyword + " " + step.name,
+            "location": "{0}:{1}".format(os.path.relpath(step.filename),
+                                         step.line),
+            "totals": Totals()
+        }
+
+    def end_step(self, step):
+        current = self._step
+        if current is None:
+            return
+        current["totals"].stop()
+        current["status"] = step.status
+        if self._scenario:
+            self._scenario["steps"].append(current)
+        self._step = None
+
+    def report(self):
+        """
+        :returns: The report, in a form that can be serialized to JSON.
+        :rtype: :class:`list` of :class:`dict`
+        """
+        ret = []
+        for scenario in self.scenarios:
+            entry = dict(scenario)
+            entry.update(entry.pop("totals").as_dict())
+            steps = []
+            for step in scenario["steps"]:
+                step_entry = dict(step)
+                step_entry.update(step_entry.pop("totals").as_dict())
+                steps.append(step_entry)
+            entry["steps"] = steps
+            ret.append(entry)
+        return ret
+
+    def write(self, dir_path, build):
+        """
+        Write the report to a file.
+
+        :param dir_path: The directory in which to write the report.
+        :type dir_path: :class:`str`
+        :param build: A description of the build that was tested.
+        :type build: :class:`str`
+        :returns: The path of the report.
+        :rtype: :class:`str`
+        """
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+
+        now = datetime.datetime.now().replace(microsecond=0)
+        path = os.path.join(dir_path, now.isoformat() + ".json")
+        with open(path, 'w') as report:
+            json.dump({
+                "build": build,
+                "date": now.isoformat(),
+                "commands": dict((name, stats.as_dict()) for (name, stats)
+                                 in self.commands.items()),
+                "scenarios": self.report()
+            }, report, indent=2)
+        return path
+
+    def summarize(self):
+        """
+        Print the commands that took the most time over the whole run,
+        and for each scenario.
+        """
+        def describe(commands):
+            return ", ".join(
+                "{0} x{1} ({2:.2f}s)".format(name, commands[name].count,
+                                             commands[name].total)
+                for name in top_commands(commands))
+
+        print("Top WebDriver commands: " + describe(self.commands))
+        for scenario in self.scenarios:
+            print("  {0}: {1}".format(scenario["location"],
+                                      describe(scenario["totals"].commands)))
+
+
+def measured(util, category):
+    """
+    Measure the time spent in a block of code, if the util object has
+    been instrumented by a :class:`Profiler`.
+
+    :param util: Selenic's util object.
+    :type util: :class:`selenic.util.Util`
+    :param category: The category to which the time is attributed.
+    :type category: :class:`str`
+    :returns: A context manager.
+    """
+    profiler = getattr(util, "profiler", None)
+    if profiler is None:
+        return _null_measure()
+    return profiler.measure(category)
+
+
+@contextlib.contextmanager
+def _null_measure():
+    yield
@@ -0,0 +1,269 @@
+"""
+Writing of the screenshots that the test suite captures. The
+screenshots are written by a background thread so that the test suite
+does not wait for the disk. A capture that is identical to the
+previous one is not written again: the index of the directory points
+to the file that was already written.
+
+If `Pillow <https://python-pillow.org/>`_ is installed, captures which
+are *perceptually* identical to the previous one (their difference
+hashes are equal) are also skipped, and the PNGs are recompressed
+before being written.
+
+A :class:`Timeline` keeps the last captures of a scenario in memory,
+so that they can be written if the scenario fails.
+"""
+import os
+import json
+import time
+import Queue
+import collections
+import shutil
+import hashlib
+import threading
+from io import BytesIO
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# The number of captures that may wait to be written. When the queue is
+# full, new captures are dropped rather than slow down the test suite.
+QUEUE_SIZE = 16
+
+# The name of the index file of a directory of screenshots. It has one
+# JSON object per line.
+INDEX_NAME = "index.jsonl"
+
+# The number of runs whose screenshots we keep.
+KEEP_RUNS = 10
+
+# The size of the image from which the difference hash is computed.
+# It is large enough that small changes, like a caret that moved, make
+# a difference.
+HASH_SIZE = 64
+
+
+def difference_hash(image):
+    """
+    Compute the difference hash of an image: each bit says whether a
+    pixel of a small grayscale version of the image is brighter than
+    its right neighbor. Images that look the same have the same hash.
+
+    :param image: The image.
+    :type image: :class:`PIL.Image.Image`
+    :returns: The hash.
+    :rtype: :class:`int`
+    """
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE))
+    pixels = list(small.getdata())
+    ret = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + col
+            ret = (ret << 1) | (pixels[offset] > pixels[offset + 1])
+    return ret
+
+
+class ScreenshotWriter(object):
+    """
+    Writes screenshots in a background thread.
+
+    :param dir_path: The directory in which to write the screenshots.
+    :type dir_path: :class:`str`
+    :param queue_size: How many captures may wait to be written.
+    :type queue_size: :class:`int`
+    """
+
+    def __init__(self, dir_path, queue_size=QUEUE_SIZE):
+        self.dir_path = dir_path
+        # The captures dropped because the queue was full.
+        self.dropped = 0
+        # The captures that could not be written. Their entries in the
+        # index have an ``error`` field.
+        self.failed = 0
+        # The error that stopped the thread, if it stopped.
+        self.error = None
+        self._queue = Queue.Queue(queue_size)
+        self._names = set()
+        # The digest, perceptual hash and file of the last capture.
+        self._last = (None, None, None)
+        self._thread = threading.Thread(target=self._run,
+                                        name="Screenshot Writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, name, png, block=False, **info):
+        """
+        Queue a capture to be written.
+
+        :param name: The name of the file, without extension. It may
+                     include subdirectories.
+        :type name: :class:`str`
+        :param png: The capture, as a PNG.
+        :type png: :class:`str`
+        :param block: Whether to wait for room in the queue rather than
+                      drop the capture if the queue is full.
+        :type block: :class:`bool`
+        :param info: Additional information to record in the index.
+        :returns: The path at which the capture will be written, or
+                  ``None`` if it was dropped or the writer has stopped.
+        :rtype: :class:`str`
+        """
+        # Names are made unique here, so that the path we return is
+        # the one that will be used.
+        filename = name + ".png"
+        count = 1
+        while filename in self._names:
+            count += 1
+            filename = "{0}-{1}.png".format(name, count)
+
+        if not self._put((filename, png, info, time.time()), block):
+            return None
+
+        self._names.add(filename)
+        return os.path.join(self.dir_path, filename)
+
+    def _put(self, item, block):
+        """
+        Queue an item for the thread.
+
+        :returns: Whether the item was queued. It is not if the queue is
+                  full and ``block`` is false, or if the thread has
+                  stopped: we never wait on a thread that is gone.
+        :rtype: :class:`bool`
+        """
+        while self._thread.is_alive():
+            try:
+                # We wake up regularly to check that the thread is
+                # still there to empty the queue.
+                self._queue.put(item, block, 1)
+                return True
+            except Queue.Full:
+                if not block:
+                    self.dropped += 1
+                    return False
+        return False
+
+    def _run(self):
+        try:
+            self._write_all()
+        except Exception as ex:  # pylint: disable=broad-except
+            # The suite reports it once it closes the writer.
+            self.error = ex
+
+    def _write_all(self):
+        with open(os.path.join(self.dir_path, INDEX_NAME), 'a') as index:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                try:
+                    entry = self._write(*item)
+                except Exception as ex:  # pylint: disable=broad-except
+                    # A capture that cannot be written, because it is
+                    # corrupt or the disk is full, must not stop the
+                    # captures that follow.
+                    filename, _, info, captured = item
+                    entry = dict(info, captured=captured, file=filename,
+                                 error=str(ex))
+                    self.failed += 1
+                index.write(json.dumps(entry) + "\n")
+                index.flush()
+
+    def _write(self, filename, png, info, captured):
+        digest = hashlib.sha1(png).hexdigest()
+        image = Image.open(BytesIO(png)) if Image is not None else None
+        dhash = difference_hash(image) if image is not None else None
+
+        entry = dict(info, captured=captured, file=filename)
+        last_digest, last_dhash, last_file = self._last
+        if digest == last_digest or \
+           (dhash is not None and dhash == last_dhash):
+            entry["duplicate_of"] = last_file
+            return entry
+
+        path = os.path.join(self.dir_path, filename)
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        if image is not None:
+            image.save(path, "PNG", optimize=True)
+        else:
+            with open(path, 'wb') as out:
+                out.write(png)
+        self._last = (digest, dhash, filename)
+        return entry
+
+    def close(self):
+        """
+        Write the captures that are still queued and stop the thread.
+        """
+        self._put(None, True)
+        self._thread.join()
+
+
+class Timeline(object):
+    """
+    The last captures of a scenario, kept in memory. Older captures are
+    discarded as new ones come in, so the memory used is bounded.
+
+    :param size: The number of captures to keep.
+    :type size: :class:`int`
+    """
+
+    def __init__(self, size):
+        self.frames = collections.deque(maxlen=size)
+
+    def clear(self):
+        self.frames.clear()
+
+    def add(self, label, png):
+        """
+        Add a capture.
+
+        :param label: A description of the moment of the capture.
+        :type label: :class:`str`
+        :param png: The capture, as a PNG.
+        :type png: :class:`str`
+        """
+        self.frames.append((time.time(), label, png))
+
+    def flush(self, writer, name):
+        """
+        Queue all the captures to be written in a directory of their
+        own, and forget them.
+
+        :param writer: The writer to use.
+        :type writer: :class:`ScreenshotWriter`
+        :param name: The name of the directory.
+        :type name: :class:`str`
+        :returns: The path of the directory.
+        :rtype: :class:`str`
+        """
+        for (number, (captured, label, png)) in enumerate(self.frames):
+            # A failure is rare enough that we can afford to wait for
+            # the writer rather than lose part of the timeline.
+            writer.submit(os.path.join(name, "{0:03d}".format(number)), png,
+                          block=True, label=label, frame_time=captured)
+        self.frames.clear()
+        return os.path.join(writer.dir_path, name)
+
+
+def prune_runs(dir_path, keep=KEEP_RUNS):
+    """
+    Remove the oldest runs from a directory of screenshots, so that it
+    does not grow without bound.
+
+    :param dir_path: The directory which contains one subdirectory per
+                     run.
+    :type dir_path: :class:`str`
+    :param keep: How many runs to keep.
+    :type keep: :class:`int`
+    """
+    runs = sorted(name for name in os.listdir(dir_path)
+                  if not os.path.islink(os.path.join(dir_path, name)) and
+                  os.path.isdir(os.path.join(dir_path, name)))
+    for name in runs[:-keep] if keep else runs:
+        shutil.rmtree(os.path.join(dir_path, name), True)
@@ -0,0 +1,527 @@
+"""
+An in-process replacement for ``server.js server``. It serves the
+same hierarchies of static files and implements the same ``/build/ajax``
+endpoints, but it keeps the data saved and logged in memory rather
+than in files. Steps can therefore inspect the data saved directly,
+without going through HTTP and parsing the file that ``server.js``
+produces.
+
+The server runs in a thread of the test suite's process and serves
+each request in a thread of its own.
+
+The state of the server (the flags set through the control endpoint
+and the data saved and logged) is kept in namespaces, so that parallel
+workers can share a server. A request belongs to the namespace named
+by its ``namespace`` parameter or, failing that, by the
+:data:`NAMESPACE_COOKIE` cookie, which the test suite sets in the
+browser. Requests that specify neither use the default namespace.
+
+This module also starts ``server.js`` for the runs that use it, and
+waits for it to announce that it is ready.
+"""
+import os
+import sys
+import json
+import time
+import Queue
+import subprocess
+import base64
+import hashlib
+import posixpath
+import threading
+import email.utils
+import SocketServer
+import BaseHTTPServer
+import SimpleHTTPServer
+from Cookie import SimpleCookie
+from urllib import unquote
+from urlparse import urlparse, parse_qs
+
+# The files served under this prefix "never" expire. (In fact they
+# expire 10 years from now, which for the purpose of a test is
+# "never".)
+FOREVER_PREFIX = "/forever"
+
+TEN_YEARS = 315360000  # 10 years, in seconds
+
+LOG_PATH = "/build/ajax/log.txt"
+SAVE_PATH = "/build/ajax/save.txt"
+CONTROL_PATH = "/build/ajax/control"
+JOURNAL_PATH = "/build/ajax/save_journal"
+BLANK_PATH = "/blank"
+
+# The flags that the control endpoint can set. They are all reset by
+# the ``reset`` command.
+FLAGS = ("fail_on_save", "fail_on_recover", "precondition_fail_on_save",
+         "too_old_on_save", "no_response_on_save", "no_response_on_recover")
+
+# The cookie and the parameter that name the namespace of a request.
+NAMESPACE_COOKIE = "wed_test_namespace"
+NAMESPACE_PARAM = "namespace"
+
+# The separator that ``server.js`` writes between the objects it dumps.
+DUMP_SEPARATOR = "\n***\n"
+
+
+def decode_form(body):
+    """
+    Decode a form in the same way ``querystring.parse`` does: a field
+    that appears once has a string for value, and a field that appears
+    more than once has a list of strings.
+    """
+    ret = {}
+    for (name, values) in parse_qs(body, keep_blank_values=True).items():
+        values = [value.decode("utf-8") for value in values]
+        ret[name.decode("utf-8")] = values[0] if len(values) == 1 \
+            else values
+    return ret
+
+
+class State(object):
+    """
+    The state of the server that the tests can control and inspect.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Notified whenever a save is recorded.
+        self.saved = threading.Condition(self.lock)
+        # The journal of the saves. Each record is a dictionary with the
+        # keys ``seq`` (the sequence number of the record) and ``save``
+        # (the decoded body of the request).
+        self.saves = []
+        # Sequence numbers keep increasing across resets so that a
+        # client never confuses an old record with a new one.
+        self.seq = 0
+        self.logs = []
+        self.flags = {}
+        # Whether the state has changed since the last reset.
+        self.dirty = True
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.saves = []
+            self.logs = []
+            self.flags = dict((flag, False) for flag in FLAGS)
+            self.dirty = False
+
+    def control(self, command, value=None):
+        """
+        Perform a control command.
+
+        :param command: The command.
+        :type command: :class:`str`
+        :param value: The value of the command, for commands that set a
+                      flag.
+        :returns: Whether the command is valid.
+        :rtype: :class:`bool`
+        """
+        if command == "reset":
+            self.reset()
+        elif command in FLAGS:
+            with self.lock:
+                self.flags[command] = value
+                self.dirty = True
+        elif command != "ping":
+            return False
+        return True
+
+    def save(self, decoded):
+        """
+        Record a request made to the save endpoint and determine the
+        response.
+
+        :param decoded: The decoded body of the request.
+        :type decoded: :class:`dict`
+        :returns: The status, the messages and the ETag of the
+                  response. The ETag is ``None`` if there is none.
+        :rtype: :class:`tuple`
+        """
+        with self.lock:
+            self.seq += 1
+            self.saves.append({"seq": self.seq, "save": decoded})
+            self.dirty = True
+            self.saved.notify_all()
+            flags = dict(self.flags)
+
+        messages = []
+        status = 200
+        etag = None
+
+        def success():
+            messages.append({"type": "save_successful"})
+            return base64.b64encode(hashlib.md5(
+                decoded.get("data", u"").encode("utf-8")).digest())
+
+        command = decoded.get("command")
+        if command == "check":
+            pass
+        elif command in ("save", "autosave"):
+            if not flags["no_response_on_save"]:
+                if flags["too_old_on_save"]:
+                    messages.append({"type": "version_too_old_error"})
+
+                if flags["precondition_fail_on_save"]:
+                    status = 412
+                elif flags["fail_on_save"]:
+                    status = 400
+                else:
+                    etag = success()
+        elif command == "recover":
+            if not flags["no_response_on_recover"]:
+                if not flags["fail_on_recover"]:
+                    etag = success()
+                else:
+                    status = 400
+        else:
+            status = 400
+
+        return status, messages, etag
+
+    def log(self, decoded):
+        with self.lock:
+            self.logs.append(decoded)
+            self.dirty = True
+
+    @property
+    def last_save(self):
+        """
+        The decoded body of the last request made to the save
+        endpoint, or ``None`` if there was none.
+        """
+        with self.lock:
+            return self.saves[-1]["save"] if self.saves else None
+
+    def _saves_after(self, after):
+        return [record for record in self.saves if record["seq"] > after]
+
+    def wait_for_saves(self, after, timeout):
+        """
+        Get the records of the journal that come after a sequence
+        number, waiting for one to be recorded if there are none yet.
+
+        :param after: The sequence number after which to get records.
+        :type after: :class:`int`
+        :param timeout: How long to wait for a record, in seconds.
+        :type timeout: :class:`float`
+        :returns: The records, which may be empty if the timeout
+                  expired, and the sequence number of the last record
+                  made.
+        :rtype: :class:`tuple`
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            while True:
+                ret = self._saves_after(after)
+                remaining = deadline - time.time()
+                if ret or remaining <= 0:
+                    return ret, self.seq
+                self.saved.wait(remaining)
+
+    def dump(self, path):
+        """
+        :returns: The data recorded for ``path`` in the same format as
+                  the file that ``server.js`` writes, or ``None`` if
+                  ``path`` is not one for which data is recorded.
+        :rtype: :class:`str`
+        """
+        with self.lock:
+            entries = {
+                LOG_PATH: self.logs,
+                SAVE_PATH: [record["save"] for record in self.saves]
+            }.get(path)
+            if entries is None:
+                return None
+            return "".join(DUMP_SEPARATOR + json.dumps(entry)
+                           for entry in entries)
+
+
+class RequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    # Keeping connections alive saves the browser a connection per
+    # file loaded.
+    protocol_version = "HTTP/1.1"
+
+    extensions_map = dict(SimpleHTTPServer.SimpleHTTPRequestHandler
+                          .extensions_map)
+    extensions_map.update({
+        ".js": "application/javascript",
+        ".json": "application/json",
+        ".xml": "application/xml",
+        ".rng": "application/xml",
+        ".xsl": "application/xml",
+    })
+
+    def split_path(self, path=None):
+        """
+        :param path: The path to split. Defaults to the path of the
+                     request.
+        :type path: :class:`str`
+        :returns: Whether the path is under :data:`FOREVER_PREFIX`, and
+                  the path without the prefix.
+        :rtype: :class:`tuple`
+        """
+        path = unquote(urlparse(path or self.path).path)
+        if path == FOREVER_PREFIX or path.startswith(FOREVER_PREFIX + "/"):
+            return True, path[len(FOREVER_PREFIX):] or "/"
+        return False, path
+
+    def translate_path(self, path):
+        _, path = self.split_path(path)
+        path = posixpath.normpath(path)
+        ret = self.server.root
+        for part in path.split("/"):
+            if part and part not in (os.curdir, os.pardir):
+                ret = os.path.join(ret, part)
+        return ret
+
+    def send_head(self):
+        # Directory listings and redirections have no Content-Length,
+        # so the client can only tell where they end when we close the
+        # connection.
+        if os.path.isdir(self.translate_path(self.path)):
+            self.close_connection = 1
+        return SimpleHTTPServer.SimpleHTTPRequestHandler.send_head(self)
+
+    def end_headers(self):
+        if getattr(self, "_forever", False):
+            self.send_header("Cache-Control",
+                             "private, max-age={0}".format(TEN_YEARS))
+            self.send_header("Expires", self.server.expiration)
+        SimpleHTTPServer.SimpleHTTPRequestHandler.end_headers(self)
+
+    def send_body(self, status, body, content_type="application/json",
+                  headers=None):
+        self._forever = False
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def namespace(self, params=None):
+        """
+        :param params: The parameters of the request.
+        :type params: :class:`dict`
+        :returns: The namespace of the request.
+        :rtype: :class:`str`
+        """
+        ret = (params or {}).get(NAMESPACE_PARAM)
+        if ret:
+            return ret
+
+        cookie = SimpleCookie(self.headers.getheader("Cookie") or "")
+        morsel = cookie.get(NAMESPACE_COOKIE)
+        return morsel.value if morsel else ""
+
+    def do_GET(self):
+        forever, path = self.split_path()
+        query = dict((name, values[0]) for (name, values)
+                     in parse_qs(urlparse(self.path).query).items())
+        state = self.server.state_for(self.namespace(query))
+        if path == BLANK_PATH:
+            self.send_body(200, "", "text/html")
+            return
+
+        if path == JOURNAL_PATH:
+            after = int(query.get("after", "0"))
+            timeout = float(query.get("timeout", "0"))
+            saves, last = state.wait_for_saves(after, timeout)
+            self.send_body(200, json.dumps({"saves": saves, "last": last}))
+            return
+
+        dump = state.dump(path)
+        if dump is not None:
+            self.send_body(200, dump, "text/plain")
+            return
+
+        self._forever = forever
+        SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
+
+    def do_HEAD(self):
+        self._forever = self.split_path()[0]
+        SimpleHTTPServer.SimpleHTTPRequestHandler.do_HEAD(self)
+
+    def read_body(self):
+        length = int(self.headers.getheader("Content-Length") or 0)
+        body = self.rfile.read(length)
+        content_type = (self.headers.getheader("Content-Type") or "") \
+            .split(";")[0].strip()
+        if content_type == "application/x-www-form-urlencoded":
+            return decode_form(body)
+        elif content_type.endswith("json"):
+            return json.loads(body)
+        raise ValueError("cannot handle content-type: " + content_type)
+
+    def do_POST(self):
+        _, path = self.split_path()
+        try:
+            decoded = self.read_body()
+        except ValueError as ex:
+            self.send_body(400, json.dumps({"error": str(ex)}))
+            return
+
+        state = self.server.state_for(self.namespace(decoded))
+
+        if path == LOG_PATH:
+            state.log(decoded)
+            self.send_body(200, "{}")
+        elif path == SAVE_PATH:
+            status, messages, etag = state.save(decoded)
+            self.send_body(status, json.dumps({"messages": messages}),
+                           headers={"ETag": etag} if etag else None)
+        elif path == CONTROL_PATH:
+            valid = state.control(decoded.get("command"),
+                                  decoded.get("value"))
+            self.send_body(200 if valid else 400, "{}")
+        else:
+            self.send_body(404, "{}")
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            SimpleHTTPServer.SimpleHTTPRequestHandler.log_message(self,
+                                                                  *args)
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A server for the test suite.
+
+    :param address: The host and port on which to listen.
+    :type address: :class:`tuple`
+    :param root: The directory from which to serve files.
+    :type root: :class:`str`
+    :param verbose: Whether to log requests.
+    :type verbose: :class:`bool`
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, root, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, RequestHandler)
+        self.root = os.path.abspath(root)
+        self.verbose = verbose
+        self._states_lock = threading.Lock()
+        self._states = {}
+        self.expiration = email.utils.formatdate(time.time() + TEN_YEARS,
+                                                 usegmt=True)
+        self._thread = None
+
+    def state_for(self, namespace):
+        """
+        :param namespace: The name of a namespace.
+        :type namespace: :class:`str`
+        :returns: The state of the namespace, which is created if it
+                  does not exist yet.
+        :rtype: :class:`State`
+        """
+        with self._states_lock:
+            state = self._states.get(namespace)
+            if state is None:
+                state = self._states[namespace] = State()
+            return state
+
+    @property
+    def state(self):
+        """
+        The state of the default namespace.
+        """
+        return self.state_for("")
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        name="Test Server")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+        self._thread = None
+
+
+# The prefix of the line with which ``server.js`` announces that it is
+# ready.
+READY_PREFIX = "Server listening on "
+
+
+def _read_output(stream, lines):
+    """
+    Read the output of ``server.js``. The lines up to the one that
+    announces that the server is ready are put in ``lines``, followed
+    by ``None`` if the output ends before. The lines after it are
+    copied to our output, so that the server never blocks on a full
+    pipe.
+    """
+    ready = False
+    for line in iter(stream.readline, ""):
+        if ready:
+            sys.stdout.write(line)
+        else:
+            lines.put(line)
+            ready = line.startswith(READY_PREFIX)
+    if not ready:
+        lines.put(None)
+    stream.close()
+
+
+def start_node_server(host, port, timeout=30):
+    """
+    Start ``server.js`` and wait until it accepts connections.
+
+    :param host: The host on which the server listens.
+    :type host: :class:`str`
+    :param port: The port on which the server listens. If 0, the
+                 system picks a free port.
+    :type port: :class:`int`
+    :param timeout: How long to wait for the server to be ready, in
+                    seconds.
+    :type timeout: :class:`float`
+    :returns: The server's process and the port on which it listens.
+    :rtype: :class:`tuple`
+    :raises Exception: If the server exits or is not ready in time.
+    """
+    process = subprocess.Popen(["node", "./server.js", "server",
+                                "{0}:{1}".format(host, port)],
+                               stdout=subprocess.PIPE)
+    # A thread reads the output, so that we can wait for the ready line
+    # with a timeout. Waiting on the pipe itself with select would miss
+    # lines already buffered by the file object.
+    lines = Queue.Queue()
+    thread = threading.Thread(target=_read_output,
+                              args=(process.stdout, lines),
+                              name="server.js Output")
+    thread.daemon = True
+    thread.start()
+
+    deadline = time.time() + timeout
+    try:
+        while True:
+            remaining = deadline - time.time()
+            try:
+                if remaining <= 0:
+                    raise Queue.Empty
+                line = lines.get(timeout=remaining)
+            except Queue.Empty:
+                raise Exception("server.js was not ready after {0}s"
+                                .format(timeout))
+            if line is None:
+                raise Exception("server.js exited with status {0}"
+                                .format(process.wait()))
+            if line.startswith(READY_PREFIX):
+                port = int(line.strip().rsplit(":", 1)[1])
+                break
+            sys.stdout.write(line)
+    except:
+        if process.poll() is None:
+            process.kill()
+        raise
+
+    return process, port
@@ -0,0 +1,291 @@
+"""
+Management of the local resources needed to run a browser: the X
+display, the window manager and the browser sessions themselves.
+
+``misc/selenium_daemon.py`` uses this module to keep a pool of browser
+sessions alive between runs of the test suite. ``environment.py`` uses
+it to lease one of these sessions instead of starting a new browser.
+"""
+import os
+import json
+import errno
+import fcntl
+import signal
+import subprocess
+
+from pyvirtualdisplay import Display
+from selenium.webdriver.remote.webdriver import WebDriver as Remote
+from selenium.common.exceptions import WebDriverException
+import selenic.builder
+
+daemon_dir_path = os.path.join("test_logs", "selenium_daemon")
+state_path = os.path.join(daemon_dir_path, "state.json")
+
+display_lock_path = "/tmp/wed-selenium-display.lock"
+
+# Not all versions of selenic patch ActionChains for chromedriver.
+center_patch_flag = getattr(selenic.builder,
+                            "CHROMEDRIVER_ELEMENT_CENTER_PATCH_FLAG", None)
+
+
+def start_display(visible):
+    """
+    Start an X display.
+
+    :param visible: Whether the display should be visible.
+    :type visible: :class:`bool`
+    :returns: The display.
+    :rtype: :class:`pyvirtualdisplay.Display`
+    """
+    # When workers run in parallel, they could all pick the same display
+    # number if they started their displays at the same time. So we
+    # serialize the search for a free display and the start of the
+    # display server.
+    with open(display_lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            display = Display(visible=visible, size=(1024, 768))
+            display.start()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return display
+
+
+def start_window_manager():
+    """
+    Start a window manager on the current display.
+
+    :returns: The window manager's process.
+    :rtype: :class:`subprocess.Popen`
+    """
+    return subprocess.Popen(["openbox", "--sm-disable"])
+
+
+def is_headless(builder):
+    """
+    :param builder: The builder for the current run.
+    :type builder: :class:`selenic.Builder`
+    :returns: Whether the browser runs in headless mode. Remote
+              browsers are never considered to be headless.
+    :rtype: :class:`bool`
+    """
+    return not builder.remote and \
+        bool(builder.local_conf.get("HEADLESS", False))
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as ex:
+        return ex.errno == errno.EPERM
+    return True
+
+
+class AttachedDriver(Remote):
+    """
+    A driver that attaches to a session that already exists rather
+    than create a new one.
+
+    :param session: The description of the session, as recorded by
+                    :class:`Pool`.
+    :type session: :class:`dict`
+    """
+
+    def __init__(self, session):
+        self._session = session
+        super(AttachedDriver, self).__init__(
+            command_executor=str(session["executor"]),
+            desired_capabilities=session["capabilities"])
+
+    def start_session(self, desired_capabilities, browser_profile=None):
+        self.session_id = self._session["session_id"]
+        self.capabilities = self._session["capabilities"]
+        self.w3c = "specificationLevel" in self.capabilities
+
+
+class Lease(object):
+    """
+    A lease on a session of the pool. The session is reserved until
+    the lease is released, or the process holding the lease ends.
+
+    :param session: The description of the session.
+    :type session: :class:`dict`
+    :param lock: The open lock file that reserves the session.
+    :type lock: :class:`file`
+    """
+
+    def __init__(self, session, lock):
+        self.session = session
+        self._lock = lock
+        self.driver = AttachedDriver(session)
+
+        # Selenic patches ActionChains when it creates a driver for
+        # some versions of chromedriver. We are not creating the
+        # driver through selenic, so we have to do it ourselves.
+        if session.get("center_patch"):
+            selenic.builder.chromedriver_element_center_patch()
+            setattr(self.driver, center_patch_flag, True)
+
+    def release(self):
+        """
+        Put the session back in a pristine state and release it so that
+        another run can use it.
+        """
+        driver = self.driver
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to_window(handle)
+                driver.close()
+            driver.switch_to_window(handles[0])
+            driver.get("about:blank")
+            driver.delete_all_cookies()
+        except WebDriverException:
+            # If we cannot clean the session, then the next run will
+            # get a dirty browser. There's nothing we can do about it
+            # here.
+            pass
+        fcntl.flock(self._lock, fcntl.LOCK_UN)
+        self._lock.close()
+
+
+def read_state():
+    """
+    :returns: The state of the daemon, or ``None`` if no daemon is
+              running.
+    :rtype: :class:`dict`
+    """
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except (IOError, ValueError):
+        return None
+
+    return state if process_exists(state["pid"]) else None
+
+
+def lease_session(builder):
+    """
+    Lease a session from the pool kept by the daemon.
+
+    :param builder: The builder for the current run. We only lease a
+                    session that was started with the same
+                    configuration.
+    :type builder: :class:`selenic.Builder`
+    :returns: The lease, or ``None`` if there is no session
+              available.
+    :rtype: :class:`Lease`
+    """
+    state = read_state()
+    if state is None or state["config"] != str(builder.config) or \
+       state.get("headless", False) != is_headless(builder):
+        return None
+
+    for session in state["sessions"]:
+        lock = open(session["lock"], 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            # Someone else has it.
+            lock.close()
+            continue
+
+        try:
+            lease = Lease(session, lock)
+            # Make sure the session is still usable.
+            _ = lease.driver.current_window_handle
+        except (WebDriverException, IOError):
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+            continue
+
+        return lease
+
+    return None
+
+
+class Pool(object):
+    """
+    A pool of browser sessions running in a display of their own, or
+    without a display if the browser is headless. The pool records its
+    state in a file so that runs of the test suite can find the
+    sessions.
+
+    :param builder: The builder with which to create the sessions.
+    :type builder: :class:`selenic.Builder`
+    :param size: The number of sessions to create.
+    :type size: :class:`int`
+    :param visible: Whether the display should be visible.
+    :type visible: :class:`bool`
+    """
+
+    def __init__(self, builder, size, visible=False):
+        self.builder = builder
+        self.size = size
+        self.visible = visible
+        self.display = None
+        self.wm = None
+        self.drivers = []
+
+    def start(self):
+        builder = self.builder
+        if not os.path.exists(daemon_dir_path):
+            os.makedirs(daemon_dir_path)
+
+        headless = is_headless(builder)
+        if not headless:
+            self.display = start_display(self.visible)
+            builder.update_ff_binary_env('DISPLAY')
+            self.wm = start_window_manager()
+
+        sessions = []
+        for number in range(self.size):
+            driver = builder.get_driver()
+            self.drivers.append(driver)
+            sessions.append({
+                "executor": driver.command_executor._url,
+                "session_id": driver.session_id,
+                "capabilities": driver.capabilities,
+                "center_patch": center_patch_flag is not None and
+                getattr(driver, center_patch_flag, False),
+                "lock": os.path.abspath(
+                    os.path.join(daemon_dir_path,
+                                 "session-{0}.lock".format(number)))
+            })
+
+        state = {
+            "pid": os.getpid(),
+            "config": str(builder.config),
+            "headless": headless,
+            "display": os.environ.get("DISPLAY"),
+            "sessions": sessions
+        }
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w') as state_file:
+            json.dump(state, state_file)
+        # The rename ensures that no one reads a partial state.
+        os.rename(tmp_path, state_path)
+
+    def stop(self):
+        try:
+            os.unlink(state_path)
+        except OSError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
+
+        for driver in self.drivers:
+            # There is not much we can do if the driver refuses to
+            # stop.
+            try:
+                driver.quit()
+            except:  # pylint: disable=bare-except
+                pass
+        self.drivers = []
+
+        if self.wm:
+            self.wm.send_signal(signal.SIGTERM)
+            self.wm = None
+
+        if self.display:
+            self.display.stop()
+            self.display = None
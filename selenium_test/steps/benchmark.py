@@ -0,0 +1,179 @@
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.keys import Keys
+
+import wedutil
+
+from ..util import load_editor, load_and_wait_for_editor, wait_for_editor
+from ..benchmarks import prepare_document, prepare_generated_document, \
+    LatencyProbe, wait_for_editor_timings, sample_validation, \
+    validation_throughput
+
+step_matcher("re")
+
+# How long we give large documents to load and be validated.
+LOAD_TIMEOUT = 120
+
+# The elements in which the benchmarks type.
+PARAGRAPH_SELECTOR = ".body ._real.p, ._real.para"
+
+
+@given(ur'the benchmark document "(?P<name>.*?)"'
+       ur'(?: enlarged (?P<factor>\d+) times)?')
+def step_impl(context, name, factor=None):
+    context.benchmark_document = \
+        prepare_document(name, int(factor) if factor else 1)
+
+
+@given(ur"a generated (?P<flavor>tei|tei-math|docbook) document of "
+       ur"(?P<size>\d+(?:KB|MB))")
+def step_impl(context, flavor, size):
+    context.benchmark_document = prepare_generated_document(flavor, size)
+
+
+@when(ur"the user loads the benchmark document")
+def step_impl(context):
+    util = context.util
+    document = context.benchmark_document
+
+    with util.local_timeout(LOAD_TIMEOUT):
+        load_and_wait_for_editor(context, text=document["path"],
+                                 schema=document["schema"],
+                                 force_reload=True)
+        timings = wait_for_editor_timings(util)
+
+    results = context.benchmark_results
+    results.add("first render", document,
+                [timings["initialized"] - timings["start"]])
+    results.add("first validation complete", document,
+                [timings["first_validation_complete"] - timings["start"]])
+
+
+@when(ur"the user loads the benchmark document while sampling the "
+      ur"validation progress")
+def step_impl(context):
+    driver = context.driver
+    util = context.util
+    document = context.benchmark_document
+
+    load_editor(context, text=document["path"], schema=document["schema"],
+                force_reload=True)
+    samples = sample_validation(driver, LOAD_TIMEOUT)
+
+    with util.local_timeout(LOAD_TIMEOUT):
+        wait_for_editor(context)
+        timings = wait_for_editor_timings(util)
+
+    elements = driver.execute_script("""
+    return wed_editor.data_root.getElementsByTagName("*").length + 1;
+    """)
+
+    start = timings["start"]
+    context.benchmark_results.add(
+        "validation", document,
+        [timings["first_validation_complete"] - start],
+        elements=elements,
+        elements_per_second=validation_throughput(samples, elements),
+        # The progress of the validation over time.
+        curve=[[sample[0] - start, sample[2]] for sample in samples])
+
+
+def get_paragraph(context):
+    paragraph = context.driver.execute_script(
+        "return jQuery(arguments[0])[0] || null;", PARAGRAPH_SELECTOR)
+    assert paragraph is not None, "the document must have a paragraph"
+    return paragraph
+
+
+# The text typed by the benchmarks. It cycles through letters and
+# spaces so that wed has words to lay out.
+TYPED_TEXT = "lorem ipsum dolor sit amet "
+
+KEYS = {
+    "ENTER": Keys.ENTER,
+    "BACKSPACE": Keys.BACKSPACE,
+    "DELETE": Keys.DELETE,
+}
+
+
+def measure_keystrokes(context, keys):
+    """
+    Type keys in the middle of a paragraph of the benchmark document and
+    measure the latency of each key.
+
+    :param keys: The keys to type.
+    :type keys: :class:`list` of :class:`str`
+    :returns: The latency of each key, in milliseconds.
+    :rtype: :class:`list` of :class:`float`
+    """
+    driver = context.driver
+    util = context.util
+
+    paragraph = get_paragraph(context)
+    ActionChains(driver) \
+        .click(paragraph) \
+        .perform()
+
+    probe = LatencyProbe(driver, "keydown")
+    probe.install()
+    samples = []
+    try:
+        # We send the keys one by one so that each key is measured on
+        # its own rather than queued behind the previous ones.
+        for number, key in enumerate(keys):
+            ActionChains(driver) \
+                .send_keys(key) \
+                .perform()
+            samples.append(probe.wait_for_sample(util, number))
+    finally:
+        probe.uninstall()
+
+    return samples
+
+
+@when(ur"the user types (?P<count>\d+) characters in the benchmark document")
+def step_impl(context, count):
+    count = int(count)
+    keys = [TYPED_TEXT[index % len(TYPED_TEXT)] for index in range(count)]
+    context.benchmark_results.add("keystroke to paint",
+                                  context.benchmark_document,
+                                  measure_keystrokes(context, keys),
+                                  key="text")
+
+
+@when(ur"the user types (?P<key>ENTER|BACKSPACE|DELETE) (?P<count>\d+) "
+      ur"times in the benchmark document")
+def step_impl(context, key, count):
+    keys = [KEYS[key]] * int(count)
+    context.benchmark_results.add("keystroke to paint",
+                                  context.benchmark_document,
+                                  measure_keystrokes(context, keys),
+                                  key=key)
+
+
+@when(ur"the user opens the context menu (?P<count>\d+) times in the "
+      ur"benchmark document")
+def step_impl(context, count):
+    driver = context.driver
+    util = context.util
+    count = int(count)
+
+    paragraph = get_paragraph(context)
+
+    probe = LatencyProbe(driver, "contextmenu", ".wed-context-menu")
+    probe.install()
+    samples = []
+    try:
+        for number in range(count):
+            ActionChains(driver) \
+                .context_click(paragraph) \
+                .perform()
+            samples.append(probe.wait_for_sample(util, number))
+            ActionChains(driver) \
+                .send_keys(Keys.ESCAPE) \
+                .perform()
+            wedutil.wait_until_a_context_menu_is_not_visible(util)
+    finally:
+        probe.uninstall()
+
+    context.benchmark_results.add("context menu open",
+                                  context.benchmark_document, samples)
@@ -6,6 +6,8 @@ from selenic.util import Condition, Result
 # pylint: disable=no-name-in-module
 from nose.tools import assert_true, assert_equal
 
+from ..util import wait_in_page
+
 step_matcher("re")
 
 
@@ -29,16 +31,10 @@ def step_impl(context):
 
 @then(ur"(?P<count>\d+) errors appear in the error panel")
 def step_impl(context, count):
-    driver = context.driver
-    util = context.util
-
-    def cond(*_):
-        return driver.execute_script("""
-        var count = arguments[0];
-        return jQuery("#sb-errorlist").children().length === count;
-        """, int(count))
-
-    util.wait(cond)
+    wait_in_page(context.util, """
+    var count = arguments[0];
+    return jQuery("#sb-errorlist").children().length === count;
+    """, int(count))
 
 
 @when(ur"the user clicks the (?P<which>first|last) error in the error "
@@ -8,7 +8,7 @@ from selenium.common.exceptions import NoAlertPresentException
 from nose.tools import assert_true, assert_equal, assert_is_none
 from selenic.util import Result, Condition
 
-from ..util import wait_for_editor
+from ..util import wait_for_editor, wait_in_page, drain_js_log
 
 step_matcher('re')
 
@@ -20,6 +20,7 @@ def step_impl(context, already=None, empty=None):
     util = context.util
     builder = context.builder
 
+    drain_js_log(context)
     driver.get(builder.WED_SERVER + "/files.html")
 
     if already:
@@ -227,8 +228,10 @@ def step_impl(context, name):
 def step_impl(context, name):
     driver = context.driver
     util = context.util
-    field = util.wait(EC.visibility_of_element_located(
-        (By.CSS_SELECTOR, ".bootbox .bootbox-input")))
+    field = wait_in_page(util, """
+    var $field = jQuery(".bootbox .bootbox-input");
+    return $field.is(":visible") ? $field[0] : null;
+    """)
     field.send_keys(name)
     driver.find_element_by_css_selector(
         ".bootbox .btn.btn-primary").click()
@@ -10,41 +10,16 @@ from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import NoAlertPresentException
 
 import wedutil
-from ..util import get_element_parent_and_parent_text, wait_for_editor
+from ..util import get_element_parent_and_parent_text, wait_for_editor, \
+    load_and_wait_for_editor, drain_js_log
 
 # Don't complain about redefined functions
 # pylint: disable=E0102
 
 
-def load_and_wait_for_editor(context, text=None, options=None,
-                             tooltips=False, schema=None):
-    driver = context.driver
-    builder = context.builder
-    server = builder.WED_SERVER + "/kitchen-sink.html?"
-
-    query = {
-        "mode": "test",
-        "nodemo": "1"
-    }
-
-    if text is not None:
-        query["file"] = text
-
-    if options is not None:
-        query["options"] = options
-
-    if schema is not None:
-        query["schema"] = schema
-
-    server += urllib.urlencode(query)
-
-    driver.get(server)
-    wait_for_editor(context, tooltips)
-
-
 @when("the user loads the page")
 def user_load(context):
-    load_and_wait_for_editor(context)
+    load_and_wait_for_editor(context, force_reload=True)
 
 
 @when("waits for the editor")
@@ -148,30 +123,37 @@ def step_impl(context):
     util = context.util
     driver = context.driver
 
-    label = util.find_element((By.CSS_SELECTOR,
-                               ".__end_label._titleStmt_label"))
+    label_selector = ".__end_label._titleStmt_label"
+
+    # Each check of the label's position is a single round trip. The
+    # label may be momentarily absent while the editor redecorates.
+    def label_pos(*_):
+        return driver.execute_script("""
+        var el = jQuery(arguments[0])[0];
+        if (!el)
+            return null;
+        var rect = el.getBoundingClientRect();
+        return { left: rect.left, top: rect.top };
+        """, label_selector)
+
     title = util.find_element((By.CSS_SELECTOR, ".titleStmt>.title"))
     ActionChains(driver)\
         .click(title)\
         .perform()
 
-    initial_pos = util.element_screen_position(label)
+    initial_pos = util.wait(label_pos)
     pos = initial_pos
     while pos["top"] == initial_pos["top"]:
         ActionChains(driver)\
             .send_keys("AAAAAA")\
             .perform()
-        label = util.find_element((By.CSS_SELECTOR,
-                                   ".__end_label._titleStmt_label"))
-        pos = util.element_screen_position(label)
+        pos = util.wait(label_pos)
 
     while pos["top"] != initial_pos["top"]:
         ActionChains(driver)\
             .send_keys(Keys.BACKSPACE)\
             .perform()
-        label = util.find_element((By.CSS_SELECTOR,
-                                   ".__end_label._titleStmt_label"))
-        pos = util.element_screen_position(label)
+        pos = util.wait(label_pos)
 
 
 @when('the user resizes the window so that the editor pane has a vertical '
@@ -229,7 +211,8 @@ def step_impl(context):
 @when(u"wait {x} seconds")
 def step_impl(context, x):
     import time
-    time.sleep(float(x))
+    with context.profiler.measure("wait"):
+        time.sleep(float(x))
 
 
 step_matcher("re")
@@ -440,6 +423,7 @@ def step_impl(context):
 @given("the platform variation page is loaded")
 def step_impl(context):
     config = context.builder.config
+    drain_js_log(context)
     context.driver.get(context.builder.WED_SERVER +
                        "/platform_test.html?platform=" +
                        urllib.quote(config.platform) +
@@ -557,6 +541,7 @@ return [window.test_platform, window.test_browser, window.test_version];
 
 @when(ur'the user reloads')
 def step_impl(context):
+    drain_js_log(context)
     context.driver.refresh()
 
 
@@ -1,14 +1,9 @@
-from urlparse import urljoin
-import json
+import time
 import re
 
-import requests
-
 from nose.tools import assert_equal  # pylint: disable=E0611
 from behave import step_matcher
 
-from selenic.util import Result, Condition
-
 
 step_matcher("re")
 
@@ -18,11 +13,30 @@ def step_impl(context):
     util = context.util
     util.ctrl_equivalent_x('S')
 
-last_obj_re = re.compile('.*}{')
-
 flip_rend_style_re = re.compile(ur'(style=".*?") (rend=".*?")')
 flip_xmlns_re = re.compile(ur'(xmlns:math=".*?") (xmlns=".*?")')
 
+
+def wait_for_saves(context, after, timeout):
+    """
+    Get the records of the server's save journal that come after a
+    sequence number. If there are none yet, wait until one is recorded
+    or the timeout expires.
+
+    :param after: The sequence number after which to get records.
+    :type after: :class:`int`
+    :param timeout: How long to wait, in seconds.
+    :type timeout: :class:`float`
+    :returns: The records, and the sequence number of the last record
+              made. Each record is a dictionary with the keys ``seq``
+              and ``save``, the decoded body of the request.
+    :rtype: :class:`tuple`
+    """
+    if context.server_state:
+        return context.server_state.wait_for_saves(after, timeout)
+
+    return context.server_client.wait_for_saves(after, timeout)
+
 _SCENARIO_TO_EXPECTED_DATA = {
     "serializes namespaces properly":
     u"""\
@@ -68,14 +82,10 @@ def step_impl(context):
         u'data': _SCENARIO_TO_EXPECTED_DATA[context.scenario.name]
     }
 
-    def cond(_driver):
-        resp = requests.get(urljoin(context.local_server,
-                                    "/build/ajax/save.txt"))
-        text = resp.text.replace('\n***\n', '').strip()
-        text = last_obj_re.sub('{', text)
-        actual = json.loads(text)
+    def normalize(actual):
         # We don't care about the version here.
-        del actual["version"]
+        actual = dict(actual)
+        actual.pop("version", None)
         if util.ie and u"data" in actual:
             actual[u"data"] =  \
                 flip_rend_style_re.sub(ur'\2 \1',
@@ -83,13 +93,24 @@ def step_impl(context):
             actual[u"data"] = \
                 flip_xmlns_re.sub(ur'\2 \1',
                                   actual[u"data"])
-        return Result(actual == expected, [actual, expected])
-
-    result = Condition(util, cond).wait()
+        return actual
+
+    # We only look at the saves that have been recorded since the last
+    # time we looked, and wait on the server for new ones.
+    deadline = time.time() + util.timeout
+    after = 0
+    actual = None
+    while actual != expected:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        saves, _ = wait_for_saves(context, after, remaining)
+        if saves:
+            after = saves[-1]["seq"]
+            actual = normalize(saves[-1]["save"])
 
     assert_equal.__self__.maxDiff = None
-    if not result:
-        assert_equal(result.payload[0], result.payload[1])
+    assert_equal(actual, expected)
 
 
 @then(ur'the modification status shows the document is unmodified')
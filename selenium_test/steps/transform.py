@@ -2,7 +2,7 @@
 from nose.tools import assert_equal, assert_is_not_none
 from selenium.webdriver.support.wait import TimeoutException
 
-from ..util import get_real_siblings
+from ..util import get_real_siblings, wait_in_page
 
 step_matcher("re")
 
@@ -55,106 +55,71 @@ def step_impl(context):
 
 @then(ur"a new (?P<what>.*?) is created inside the element")
 def step_impl(context, what):
-    util = context.util
-    driver = context.driver
     for_element = context.context_menu_for
 
     info = context.context_menu_pre_transformation_info
 
-    def cond(*_):
-        children = driver.execute_script("""
-        return jQuery(arguments[0]).children("._real").toArray();
-        """, for_element)
-        return len(info["children"]) + 1 == len(children)
-
-    util.wait(cond)
+    wait_in_page(context.util, """
+    return jQuery(arguments[0]).children("._real").length === arguments[1];
+    """, for_element, len(info["children"]) + 1)
 
 
 @then(ur"the teiHeader has been filled as much as possible")
 def step_impl(context):
-    util = context.util
-    driver = context.driver
-
-    def cond(*_):
-        test, _ = driver.execute_script("""
-        var $children = jQuery("._real.teiHeader>._real");
-        if (!($children.length === 1 && $children.eq(0).is(".fileDesc")))
-            return [false, "teiHeader contents"];
-
-        $children = jQuery("._real.fileDesc>._real");
-        if (!($children.length === 3 && $children.eq(0).is(".titleStmt") &&
-              $children.eq(1).is(".publicationStmt") &&
-              $children.eq(2).is(".sourceDesc")))
-            return [false, "fileDesc contents"];
-
-
-        $children = jQuery("._real.titleStmt>._real");
-        if (!($children.length === 1 && $children.eq(0).is(".title")))
-            return [false, "titleStmt contents"];
+    wait_in_page(context.util, """
+    var $children = jQuery("._real.teiHeader>._real");
+    if (!($children.length === 1 && $children.eq(0).is(".fileDesc")))
+        return false;
 
+    $children = jQuery("._real.fileDesc>._real");
+    if (!($children.length === 3 && $children.eq(0).is(".titleStmt") &&
+          $children.eq(1).is(".publicationStmt") &&
+          $children.eq(2).is(".sourceDesc")))
+        return false;
 
-        $children = jQuery("._real.title>._real, " +
-                           "._real.publicationStmt>._real, " +
-                           "._real.sourceDesc>._real");
-        if ($children.length !== 0)
-            return [false, "contents of end elements"];
+    $children = jQuery("._real.titleStmt>._real");
+    if (!($children.length === 1 && $children.eq(0).is(".title")))
+        return false;
 
-        return [true, ""];
-        """)
-        return test
-
-    util.wait(cond)
+    $children = jQuery("._real.title>._real, " +
+                       "._real.publicationStmt>._real, " +
+                       "._real.sourceDesc>._real");
+    return $children.length === 0;
+    """)
 
 
 @then(ur"the teiHeader has not been filled")
 def step_impl(context):
-    util = context.util
-    driver = context.driver
-
-    def cond(*_):
-        test, _ = driver.execute_script("""
-        var $children = jQuery("._real.teiHeader>._real");
-        if ($children.length !== 0)
-            return [false, "contents of teiHeader"];
-
-        return [true, ""];
-        """)
-        return test
-
-    util.wait(cond)
+    wait_in_page(context.util, """
+    return jQuery("._real.teiHeader>._real").length === 0;
+    """)
 
 
 @then(ur"the editor pane contains only a placeholder")
 def step_impl(context):
-    def check(driver):
-        return driver.execute_script("""
-        if (wed_editor.gui_root.children.length !== 1)
-            return false;
+    wait_in_page(context.util, """
+    if (wed_editor.gui_root.children.length !== 1)
+        return false;
 
-        var node = wed_editor.gui_root.firstElementChild;
+    var node = wed_editor.gui_root.firstElementChild;
 
-        if (!node)
-            return false;
+    if (!node)
+        return false;
 
-        return node.classList.contains("_placeholder");
-        """)
-
-    context.util.wait(check)
+    return node.classList.contains("_placeholder");
+    """)
 
 
 @then(ur"the document contains only a book element")
 def step_impl(context):
-    def check(driver):
-        return driver.execute_script("""
-        if (wed_editor.data_root.childNodes.length !== 1)
-            return false;
-
-        var node = wed_editor.data_root.firstElementChild;
+    wait_in_page(context.util, """
+    if (wed_editor.data_root.childNodes.length !== 1)
+        return false;
 
-        if (!node)
-            return false;
+    var node = wed_editor.data_root.firstElementChild;
 
-        return node.tagName === "book";
-        """)
+    if (!node)
+        return false;
 
-    context.util.wait(check)
+    return node.tagName === "book";
+    """)
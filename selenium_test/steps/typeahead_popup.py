@@ -3,6 +3,8 @@ from selenium.webdriver.common.by import By
 from nose.tools import assert_equal, assert_true
 from selenic.util import Result, Condition
 
+from ..util import wait_in_page
+
 step_matcher("re")
 
 
@@ -61,11 +63,10 @@ def step_impl(context, step, where=None):
 
 @then("the typeahead popup is not visible")
 def step_impl(context):
-    util = context.util
-
-    util.wait(
-        lambda driver:
-        len(driver.find_elements_by_class_name("wed-typeahead-popup")) == 0)
+    wait_in_page(context.util, """
+    return document.getElementsByClassName("wed-typeahead-popup")
+        .length === 0;
+    """)
 
 
 @then("the typeahead popup's action (?P<is_>is|is not) performed")
@@ -0,0 +1,138 @@
+"""
+Isolation of the browser storage used by the scenarios. Each scenario
+gets a localforage database of its own: the test suite names it in a
+cookie, which ``config()`` in ``lib/wed/savers/localforage.js`` reads.
+A scenario thus starts with empty storage, without our having to clear
+the storage of the previous scenario. The page records in another
+cookie which database it used, so a new database is needed only after
+a scenario that used storage. The databases are deleted all at once
+at the end of the run.
+"""
+import os
+
+from selenium.common.exceptions import WebDriverException
+
+# The name of the cookie which holds the name of the database, and of
+# the cookie in which the page records that it used the database. They
+# must be the same as in ``lib/wed/savers/localforage.js``.
+DATABASE_COOKIE = "wed_test_database"
+DATABASE_USED_COOKIE = "wed_test_database_used"
+
+# The store that wed uses in its databases.
+STORE_NAME = "files"
+
+# Deletes the databases whose names are passed as arguments. The
+# localforage drivers store data either in IndexedDB or, failing that,
+# in localStorage, under keys prefixed with the names of the database
+# and the store. Returns the number of databases that could not be
+# deleted.
+DELETE_SCRIPT = """
+var names = arguments[0];
+var store = arguments[1];
+var done = arguments[2];
+
+if (window.localStorage) {
+    var prefixes = names.map(function (name) {
+        return name + "/" + store + "/";
+    });
+    for (var i = localStorage.length - 1; i >= 0; --i) {
+        var key = localStorage.key(i);
+        if (prefixes.some(function (prefix) {
+            return key.lastIndexOf(prefix, 0) === 0;
+        }))
+            localStorage.removeItem(key);
+    }
+}
+
+if (!window.indexedDB) {
+    done(0);
+    return;
+}
+
+var pending = names.length;
+var failed = 0;
+if (!pending) {
+    done(0);
+    return;
+}
+
+function settled() {
+    if (--pending === 0)
+        done(failed);
+}
+
+names.forEach(function (name) {
+    var request = indexedDB.deleteDatabase(name);
+    request.onsuccess = settled;
+    request.onerror = request.onblocked = function () {
+        failed++;
+        settled();
+    };
+});
+"""
+
+
+class Databases(object):
+    """
+    The databases given to the scenarios of a run.
+
+    :param prefix: The prefix of the names of the databases. It must be
+                   unique to the run, so that runs which use the same
+                   browser do not share databases.
+    :type prefix: :class:`str`
+    """
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix or "wed-test-{0}".format(os.getpid())
+        self.names = []
+
+    @property
+    def current(self):
+        """
+        The name of the database given to the last scenario, or
+        ``None``.
+        """
+        return self.names[-1] if self.names else None
+
+    def next(self, driver, blank_url):
+        """
+        Give a new database to the scenario that is about to start.
+
+        :param driver: The driver of the browser.
+        :param blank_url: The URL of a blank page on the server, which
+                          we load if the browser is on a page on which
+                          we cannot set the cookie.
+        :type blank_url: :class:`str`
+        :returns: The name of the database.
+        :rtype: :class:`str`
+        """
+        name = "{0}-{1}".format(self.prefix, len(self.names))
+        cookie = {"name": DATABASE_COOKIE, "value": name, "path": "/"}
+        try:
+            driver.add_cookie(cookie)
+        except WebDriverException:
+            driver.get(blank_url)
+            driver.add_cookie(cookie)
+        self.names.append(name)
+        return name
+
+    def delete(self, driver, blank_url):
+        """
+        Delete all the databases given so far. Pages which use them
+        must not be open, as they would prevent their deletion.
+
+        :param driver: The driver of the browser.
+        :param blank_url: The URL of a blank page on the server. It is
+                          loaded to close the pages that use the
+                          databases.
+        :type blank_url: :class:`str`
+        :returns: The number of databases which could not be deleted.
+        :rtype: :class:`int`
+        """
+        driver.get(blank_url)
+        driver.delete_cookie(DATABASE_COOKIE)
+        driver.delete_cookie(DATABASE_USED_COOKIE)
+        failed = driver.execute_async_script(DELETE_SCRIPT, self.names,
+                                             STORE_NAME)
+        self.names = []
+        return failed
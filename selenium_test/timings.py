@@ -0,0 +1,122 @@
+"""
+Persistent record of how long scenarios take to run. The test suite
+records the duration of each scenario that passes, and
+``misc/selenium_runner.py`` uses the records to balance the work among
+its workers.
+"""
+import os
+import time
+import sqlite3
+
+default_db_path = os.path.join("test_logs", "timings.db")
+
+# The number of durations we keep for each scenario.
+HISTORY = 5
+
+# The estimate to use when we know nothing at all, in seconds.
+DEFAULT_ESTIMATE = 10.0
+
+
+def scenario_key(scenario):
+    """
+    :param scenario: A scenario.
+    :type scenario: :class:`behave.model.Scenario`
+    :returns: The key under which the timings of the scenario are
+              recorded. We do not use line numbers because they change
+              whenever a feature file is edited.
+    :rtype: :class:`str`
+    """
+    return os.path.relpath(scenario.filename) + ":" + scenario.name
+
+
+class TimingDB(object):
+    """
+    A database of scenario durations. It is safe for multiple
+    processes to use the same database at the same time.
+
+    :param path: The path of the database.
+    :type path: :class:`str`
+    """
+
+    def __init__(self, path=default_db_path):
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        # The timeout is how long we wait for other workers to release
+        # their locks.
+        self.connection = sqlite3.connect(path, timeout=30)
+        with self.connection:
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS durations (
+                scenario TEXT NOT NULL,
+                duration REAL NOT NULL,
+                recorded REAL NOT NULL)
+            """)
+            self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS durations_scenario
+            ON durations (scenario)
+            """)
+
+    def record(self, scenario, duration):
+        """
+        Record a duration. Only the last :data:`HISTORY` durations of a
+        scenario are kept.
+
+        :param scenario: The scenario.
+        :type scenario: :class:`behave.model.Scenario`
+        :param duration: The duration in seconds.
+        :type duration: :class:`float`
+        """
+        key = scenario_key(scenario)
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO durations VALUES (?, ?, ?)",
+                (key, duration, time.time()))
+            self.connection.execute("""
+            DELETE FROM durations WHERE scenario = ? AND rowid NOT IN
+            (SELECT rowid FROM durations WHERE scenario = ?
+             ORDER BY recorded DESC LIMIT ?)
+            """, (key, key, HISTORY))
+
+    def estimates(self):
+        """
+        :returns: The mean duration of each scenario we know about.
+        :rtype: :class:`dict` mapping keys to durations in seconds.
+        """
+        totals = {}
+        for key, duration in self.connection.execute(
+                "SELECT scenario, duration FROM durations"):
+            total, count = totals.get(key, (0.0, 0))
+            totals[key] = (total + duration, count + 1)
+
+        return dict((key, total / count)
+                    for (key, (total, count)) in totals.items())
+
+    def close(self):
+        self.connection.close()
+
+
+class Estimator(object):
+    """
+    Estimates how long scenarios take on the basis of a
+    :class:`TimingDB`. Scenarios for which there are no records are
+    estimated to take the median of the known durations.
+
+    :param db: The database to use.
+    :type db: :class:`TimingDB`
+    """
+
+    def __init__(self, db):
+        self.known = db.estimates()
+        durations = sorted(self.known.values())
+        self.fallback = durations[len(durations) // 2] if durations \
+            else DEFAULT_ESTIMATE
+
+    def __call__(self, scenario):
+        """
+        :param scenario: The scenario.
+        :type scenario: :class:`behave.model.Scenario`
+        :returns: The estimated duration in seconds.
+        :rtype: :class:`float`
+        """
+        return self.known.get(scenario_key(scenario), self.fallback)
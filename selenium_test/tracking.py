@@ -0,0 +1,87 @@
+"""
+Tracking of the state that the scenarios change. The test suite resets
+between scenarios only the parts of the state that the previous
+scenario changed, rather than reset everything each time.
+
+The commands sent to the browser tell us whether a scenario changed
+the geometry of the window or worked with tabs. Other parts of the
+state are marked as changed by the test suite itself. The state of the
+test server is tracked by the server: see ``server.py``.
+"""
+from selenium.webdriver.remote.command import Command
+
+# The parts of the state that we track.
+WINDOW = "window"
+TABS = "tabs"
+STORAGE = "storage"
+PAGE = "page"
+
+ALL = frozenset((WINDOW, TABS, STORAGE, PAGE))
+
+
+def _commands(*names):
+    # Not all versions of Selenium have all the commands.
+    return frozenset(getattr(Command, name) for name in names
+                     if hasattr(Command, name))
+
+
+# The commands which change the geometry of the window.
+WINDOW_COMMANDS = _commands("SET_WINDOW_SIZE", "W3C_SET_WINDOW_SIZE",
+                            "SET_WINDOW_POSITION", "SET_WINDOW_RECT",
+                            "MAXIMIZE_WINDOW", "W3C_MAXIMIZE_WINDOW",
+                            "MINIMIZE_WINDOW", "FULLSCREEN_WINDOW")
+
+# The commands which are used when working with tabs. A step that opens
+# a tab must look at the window handles to find it, so we do not miss
+# tabs opened by clicking on links.
+TAB_COMMANDS = _commands("GET_WINDOW_HANDLES", "W3C_GET_WINDOW_HANDLES",
+                         "SWITCH_TO_WINDOW", "CLOSE", "NEW_WINDOW")
+
+
+class StateTracker(object):
+    """
+    Records which parts of the state have changed since the last time
+    they were reset. Everything is considered changed at first, since
+    we do not know in what state the browser is.
+    """
+
+    def __init__(self):
+        self.dirty = set(ALL)
+
+    def instrument(self, driver):
+        """
+        Instrument a driver so that the commands which change the
+        state are recorded.
+        """
+        original_execute = driver.execute
+
+        def execute(command, params=None):
+            if command in WINDOW_COMMANDS:
+                self.dirty.add(WINDOW)
+            elif command in TAB_COMMANDS:
+                self.dirty.add(TABS)
+            return original_execute(command, params)
+
+        driver.execute = execute
+
+    def mark(self, *parts):
+        """
+        Mark parts of the state as changed. With no arguments, mark all
+        of the state as changed.
+        """
+        self.dirty.update(parts or ALL)
+
+    def needs_reset(self, part):
+        """
+        :param part: A part of the state.
+        :type part: :class:`str`
+        :returns: Whether the part has changed since it was last reset.
+        :rtype: :class:`bool`
+        """
+        return part in self.dirty
+
+    def clear(self):
+        """
+        Record that all of the state has been reset.
+        """
+        self.dirty.clear()
@@ -1,5 +1,10 @@
+import urllib
+
 import wedutil
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from profiling import measured
 
 
 class Trigger(object):
@@ -96,11 +101,159 @@ def get_real_siblings(driver, element):
     return (preceding, following)
 
 
+# How much longer than the deadline in the page the script timeout of
+# wait_in_page is, in seconds.
+SCRIPT_TIMEOUT_MARGIN = 1
+
+
+def set_script_timeout(util, timeout):
+    """
+    Set the script timeout of the driver of a util object, and record
+    it on the util object so that :func:`wait_in_page` knows it without
+    asking the browser.
+
+    :param util: Selenic's util object.
+    :type util: :class:`selenic.util.Util`
+    :param timeout: The timeout, in seconds.
+    :type timeout: :class:`float`
+    """
+    util.driver.set_script_timeout(timeout)
+    util.script_timeout = timeout
+
+
+def wait_in_page(util, condition, *args):
+    """
+    Wait for a condition that is checked in the page itself. Unlike
+    ``util.wait``, this function does not poll the browser: it performs
+    a single ``execute_async_script`` that checks the condition whenever
+    the DOM mutates, the window is resized or scrolled, and at a short
+    interval for changes that produce no event. This saves the latency
+    and traffic of polling from Python.
+
+    :param util: Selenic's util object. Its timeout is used.
+    :type util: :class:`selenic.util.Util`
+    :param condition: The body of a JavaScript function that receives
+                      ``args`` as its arguments, and returns a true
+                      value once the condition is met.
+    :type condition: :class:`str`
+    :returns: The value that the condition returned.
+    :raises selenium.common.exceptions.TimeoutException: If the
+            condition is not met before the timeout.
+    """
+    # The script must time out after the deadline in the page, or the
+    # two would race and the script timeout could hide our message.
+    # before_all sets a script timeout that covers the default timeout,
+    # so only a wait under a longer local timeout has to raise it. We
+    # leave it raised rather than spend another command to restore it.
+    needed = util.timeout + SCRIPT_TIMEOUT_MARGIN
+    if getattr(util, "script_timeout", 0) < needed:
+        set_script_timeout(util, needed)
+
+    with measured(util, "wait"):
+        status, value = _wait_in_page(util, condition, args)
+
+    if status == "timeout":
+        raise TimeoutException("condition not met in page")
+
+    if status == "error":
+        raise WebDriverException("condition failed in page: " + value)
+
+    return value
+
+
+def _wait_in_page(util, condition, args):
+    return util.driver.execute_async_script("""
+    var condition = new Function(arguments[0]);
+    var args = arguments[1];
+    var timeout = arguments[2];
+    var done = arguments[arguments.length - 1];
+    var finished = false;
+    var observer;
+    var timer;
+    var interval;
+
+    function finish(status, value) {
+        if (finished)
+            return;
+        finished = true;
+        if (observer)
+            observer.disconnect();
+        clearTimeout(timer);
+        clearInterval(interval);
+        window.removeEventListener("resize", check, true);
+        window.removeEventListener("scroll", check, true);
+        done([status, value]);
+    }
+
+    function check() {
+        if (finished)
+            return;
+        var value;
+        try {
+            value = condition.apply(null, args);
+        }
+        catch (ex) {
+            finish("error", ex.toString());
+            return;
+        }
+        if (value)
+            finish("ok", value);
+    }
+
+    check();
+    if (finished)
+        return;
+
+    // IE 10 has no MutationObserver. The interval below still catches
+    // the changes there, only later.
+    if (window.MutationObserver) {
+        observer = new MutationObserver(check);
+        observer.observe(document, {childList: true, subtree: true,
+                                    attributes: true, characterData: true});
+    }
+    window.addEventListener("resize", check, true);
+    window.addEventListener("scroll", check, true);
+    interval = setInterval(check, 100);
+    timer = setTimeout(finish.bind(undefined, "timeout", null), timeout);
+    """, condition, list(args), int(util.timeout * 1000))
+
+
+def reset_editor(driver, query):
+    """
+    Reset the editor in place, without reloading the page. This is
+    possible only if the current page is the kitchen sink, and it uses
+    the same mode and schema as ``query``.
+
+    :param driver: The driver.
+    :param query: The parameters that would be passed in the query part
+                  of the URL of the kitchen sink.
+    :type query: :class:`dict`
+    :returns: Whether the editor was reset. If ``False``, the page must
+              be loaded anew.
+    :rtype: :class:`bool`
+    """
+    return driver.execute_async_script("""
+    var query = arguments[0];
+    var done = arguments[1];
+    if (typeof require === "undefined" || !require.defined ||
+        !require.defined("wed/kitchen-sink")) {
+        done(false);
+        return;
+    }
+
+    require(["wed/kitchen-sink", "wed/onerror"], function (ks, onerror) {
+        // A fatal error requires a reload.
+        done(!onerror.is_terminating() && ks.reset(query));
+    });
+    """, query)
+
+
 def wait_for_editor(context, tooltips=False):
     util = context.util
     driver = context.driver
     builder = context.builder
-    wedutil.wait_for_editor(util)
+    with measured(util, "wait_for_editor"):
+        wedutil.wait_for_editor(util)
 
     context.origin_object = driver.execute_script("""
     var tooltips = arguments[0];
@@ -127,3 +280,57 @@ def wait_for_editor(context, tooltips=False):
             .move_to_element_with_offset(body, 1, 1) \
             .click() \
             .perform()
+
+
+def drain_js_log(context):
+    """
+    Move the messages that the page has logged into ``context.js_log``.
+    Steps call this before they leave the page, which would otherwise
+    discard the messages. Nothing is done if the messages are not
+    collected.
+    """
+    if context.js_log:
+        context.js_log.drain(context.driver)
+
+
+def load_editor(context, text=None, options=None, schema=None,
+                force_reload=False):
+    """
+    Load a document in the kitchen sink, without waiting for the
+    editor to be ready. Most steps should use
+    :func:`load_and_wait_for_editor` instead.
+    """
+    driver = context.driver
+    builder = context.builder
+    server = builder.WED_SERVER + "/kitchen-sink.html?"
+
+    query = {
+        "mode": "test",
+        "nodemo": "1"
+    }
+
+    if text is not None:
+        query["file"] = text
+
+    if options is not None:
+        query["options"] = options
+
+    if schema is not None:
+        query["schema"] = schema
+
+    if context.schema_cache:
+        query["schema_cache"] = "1"
+
+    # Loading the page is costly, so we reset the editor in place if
+    # we can.
+    if force_reload or not context.fast_reset or \
+       not reset_editor(driver, query):
+        server += urllib.urlencode(query)
+        drain_js_log(context)
+        driver.get(server)
+
+
+def load_and_wait_for_editor(context, text=None, options=None,
+                             tooltips=False, schema=None, force_reload=False):
+    load_editor(context, text, options, schema, force_reload)
+    wait_for_editor(context, tooltips)
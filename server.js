@@ -118,12 +118,100 @@ function unlinkIfExists(path) {
         fs.unlinkSync(path);
 }
 
-var fail_on_save = false;
-var fail_on_recover = false;
-var precondition_fail_on_save = false;
-var too_old_on_save = false;
-var no_response_on_save = false;
-var no_response_on_recover = false;
+//
+// The state of the server is kept in namespaces, so that parallel test
+// workers can share a server. A request belongs to the namespace named
+// by its ``namespace`` parameter or, failing that, by the
+// ``wed_test_namespace`` cookie. Requests that specify neither belong
+// to the default namespace, whose name is the empty string.
+//
+var NAMESPACE_COOKIE = "wed_test_namespace";
+var NAMESPACE_PARAM = "namespace";
+
+var FLAGS = ["fail_on_save", "fail_on_recover", "precondition_fail_on_save",
+             "too_old_on_save", "no_response_on_save",
+             "no_response_on_recover"];
+
+//
+// Sequence numbers of the save journal keep increasing across resets
+// (and are unique across namespaces) so that a client never confuses
+// an old record with a new one.
+//
+var save_seq = 0;
+
+function Namespace(name) {
+    this.name = name;
+    // The journal of the requests made to the save endpoint. Each
+    // record has a sequence number (``seq``) and the decoded request
+    // (``save``).
+    this.save_journal = [];
+    // The requests waiting for a record to be added to the journal.
+    this.journal_waiters = [];
+    this.reset();
+}
+
+Namespace.prototype.reset = function () {
+    for (var i = 0, flag; (flag = FLAGS[i]); ++i)
+        this[flag] = false;
+    this.save_journal = [];
+};
+
+Namespace.prototype.journalAfter = function (after) {
+    return this.save_journal.filter(function (record) {
+        return record.seq > after;
+    });
+};
+
+Namespace.prototype.writeJournal = function (response, after) {
+    writeResponse(response, 200, JSON.stringify({
+        saves: this.journalAfter(after),
+        last: save_seq
+    }), "application/json");
+};
+
+Namespace.prototype.recordSave = function (decoded) {
+    this.save_journal.push({seq: ++save_seq, save: decoded});
+    var waiters = this.journal_waiters;
+    this.journal_waiters = [];
+    for (var i = 0, waiter; (waiter = waiters[i]); ++i) {
+        clearTimeout(waiter.timeout);
+        this.writeJournal(waiter.response, waiter.after);
+    }
+};
+
+//
+// The path of the file in which the data posted to ``uri`` is dumped.
+//
+Namespace.prototype.dumpPath = function (uri) {
+    var filename = path.join(cwd, uri);
+    if (!this.name)
+        return filename;
+    return path.join(path.dirname(filename),
+                     this.name.replace(/[^\w-]/g, "_") + "." +
+                     path.basename(filename));
+};
+
+var namespaces = Object.create(null);
+
+function getNamespace(request, params) {
+    var name = params && params[NAMESPACE_PARAM];
+    if (!name) {
+        var cookies = (request.headers.cookie || "").split(/;\s*/);
+        for (var i = 0, cookie; (cookie = cookies[i]) !== undefined; ++i) {
+            var eq = cookie.indexOf("=");
+            if (eq >= 0 && cookie.slice(0, eq) === NAMESPACE_COOKIE) {
+                name = decodeURIComponent(cookie.slice(eq + 1));
+                break;
+            }
+        }
+    }
+    name = name || "";
+
+    var ns = namespaces[name];
+    if (!ns)
+        ns = namespaces[name] = new Namespace(name);
+    return ns;
+}
 
 function dumpData(request, options, callback) {
     if (typeof options === "function") {
@@ -136,7 +224,6 @@ function dumpData(request, options, callback) {
     };
 
     var uri = url.parse(request.url).pathname;
-    var filename = path.join(cwd, uri);
     var chunks = [];
     request.on('data', function (chunk) {
         chunks.push(chunk.toString());
@@ -153,8 +240,10 @@ function dumpData(request, options, callback) {
             throw new Error("cannot handle content-type: " +
                             request.get('Content-Type'));
 
+        var ns = getNamespace(request, decoded);
         if (options.dump) {
-            var writable = fs.createWriteStream(filename, {'flags': 'a'});
+            var writable = fs.createWriteStream(ns.dumpPath(uri),
+                                                {'flags': 'a'});
             writable.write("\n***\n", function () {
                 if (verbose)
                     console.log('decoded body', decoded);
@@ -164,7 +253,7 @@ function dumpData(request, options, callback) {
         }
 
         if (callback)
-            callback(decoded);
+            callback(decoded, ns);
     });
 }
 
@@ -178,7 +267,8 @@ app.post(make_paths("/build/ajax/log.txt"), function (request, response) {
 });
 
 app.post(make_paths("/build/ajax/save.txt"), function (request, response) {
-    dumpData(request, function (decoded) {
+    dumpData(request, function (decoded, ns) {
+        ns.recordSave(decoded);
         var headers = undefined;
         function success() {
             messages.push({type: 'save_successful'});
@@ -193,22 +283,22 @@ app.post(make_paths("/build/ajax/save.txt"), function (request, response) {
             break;
         case 'save':
         case 'autosave':
-            if (!no_response_on_save) {
+            if (!ns.no_response_on_save) {
 
-                if (too_old_on_save)
+                if (ns.too_old_on_save)
                     messages.push({type: 'version_too_old_error'});
 
-                if (precondition_fail_on_save)
+                if (ns.precondition_fail_on_save)
                     status = 412;
-                else if (fail_on_save)
+                else if (ns.fail_on_save)
                     status = 400;
                 else
                     success();
             }
             break;
         case 'recover':
-            if (!no_response_on_recover) {
-                if (!fail_on_recover)
+            if (!ns.no_response_on_recover) {
+                if (!ns.fail_on_recover)
                     success();
                 else
                     status = 400;
@@ -224,44 +314,44 @@ app.post(make_paths("/build/ajax/save.txt"), function (request, response) {
     });
 });
 
+//
+// Returns the records of the save journal with a sequence number
+// greater than the ``after`` parameter. If there are none, the
+// response is delayed until a record is added or until ``timeout``
+// seconds have elapsed, whichever comes first.
+//
+app.get(make_paths("/build/ajax/save_journal"), function (request, response) {
+    var query = url.parse(request.url, true).query;
+    var ns = getNamespace(request, query);
+    var after = Number(query.after || 0);
+    var timeout = Number(query.timeout || 0);
+    if (ns.journalAfter(after).length || !timeout) {
+        ns.writeJournal(response, after);
+        return;
+    }
+
+    var waiter = {response: response, after: after};
+    waiter.timeout = setTimeout(function () {
+        ns.journal_waiters.splice(ns.journal_waiters.indexOf(waiter), 1);
+        ns.writeJournal(response, after);
+    }, timeout * 1000);
+    ns.journal_waiters.push(waiter);
+});
+
 app.post(make_paths("/build/ajax/control"), function(request, response) {
-    dumpData(request, function (decoded) {
+    dumpData(request, function (decoded, ns) {
         var status = 200;
-        switch(decoded.command) {
-        case 'reset':
-            unlinkIfExists(path.join(cwd, "/build/ajax/log.txt"));
-            unlinkIfExists(path.join(cwd, "/build/ajax/save.txt"));
-            unlinkIfExists(path.join(cwd, "/build/ajax/control"));
-            fail_on_save = false;
-            fail_on_recover = false;
-            precondition_fail_on_save = false;
-            too_old_on_save = false;
-            no_response_on_save = false;
-            no_response_on_recover = false;
-            break;
-        case 'fail_on_save':
-            fail_on_save = decoded.value;
-            break;
-        case 'precondition_fail_on_save':
-            precondition_fail_on_save = decoded.value;
-            break;
-        case 'too_old_on_save':
-            too_old_on_save = decoded.value;
-            break;
-        case 'fail_on_recover':
-            fail_on_recover = decoded.value;
-            break;
-        case 'no_response_on_save':
-            no_response_on_save = decoded.value;
-            break;
-        case 'no_response_on_recover':
-            no_response_on_recover = decoded.value;
-            break;
-        case 'ping':
-            break;
-        default:
-            status = 400;
+        var command = decoded.command;
+        if (command === "reset") {
+            unlinkIfExists(ns.dumpPath("/build/ajax/log.txt"));
+            unlinkIfExists(ns.dumpPath("/build/ajax/save.txt"));
+            unlinkIfExists(ns.dumpPath("/build/ajax/control"));
+            ns.reset();
         }
+        else if (FLAGS.indexOf(command) !== -1)
+            ns[command] = decoded.value;
+        else if (command !== "ping")
+            status = 400;
         writeResponse(response, status, "{}", "application/json");
     });
 });
@@ -280,15 +370,27 @@ app.get(make_paths("/blank"), function (request, response) {
     response.end();
 });
 
+// The prefix of the line that announces that the server is ready.
+var READY_PREFIX = "Server listening on ";
+
 function runserver() {
+    var server;
     if (!ip) {
-        var server = http.createServer(app).listen();
+        server = http.createServer(app).listen();
         ip = "0.0.0.0";
         port = server.address().port;
         app.set('port', port);
     }
     else
-        app.listen(port, ip);
+        // A port of 0 lets the system pick a free port.
+        server = app.listen(Number(port), ip);
+
+    server.on("listening", function () {
+        port = server.address().port;
+        // Whoever started us may wait for this line to know that we
+        // are accepting connections, and on which port.
+        console.log(READY_PREFIX + ip + ":" + port);
+    });
     var driver, xvfb, wm;
     var failures = [];
     app.on("test-result", function (result) {
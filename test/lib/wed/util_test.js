@@ -196,6 +196,82 @@ three-----four"), "btw:blah-one--two---three----four");
                          "(prefix:name) or (prefix2:name2)");
         });
     });
+
+    describe("seleniumLogAt", function () {
+        // util.js logs to the ``window`` of the browser, which does
+        // not exist in Node.
+        beforeEach(function () {
+            global.window = {};
+        });
+
+        afterEach(function () {
+            delete global.window;
+        });
+
+        it("throws on an invalid level", function () {
+            assert.throws(util.seleniumLogAt.bind(undefined, "trace", "a"),
+                          Error, "invalid level: trace");
+            assert.isUndefined(window.selenium_log);
+        });
+
+        it("records the level, time and message", function () {
+            var before = Date.now();
+            util.seleniumLogAt("warn", "a", 1);
+            var log = window.selenium_log;
+            assert.equal(log.size, util.SELENIUM_LOG_SIZE);
+            assert.equal(log.dropped, 0);
+            assert.equal(log.entries.length, 1);
+            var entry = log.entries[0];
+            assert.equal(entry.level, "warn");
+            assert.deepEqual(entry.message, ["a", 1]);
+            assert.isTrue(entry.time >= before && entry.time <= Date.now());
+        });
+
+        it("accepts every level", function () {
+            util.SELENIUM_LOG_LEVELS.forEach(function (level) {
+                util.seleniumLogAt(level, level);
+            });
+            assert.deepEqual(window.selenium_log.entries.map(
+                function (entry) {
+                    return entry.level;
+                }), util.SELENIUM_LOG_LEVELS);
+        });
+
+        it("bounds the buffer", function () {
+            window.selenium_log = {size: 3, entries: [], dropped: 0};
+            var i;
+            for (i = 0; i < 5; ++i)
+                util.seleniumLogAt("info", i);
+            // The buffer may grow to twice its size before it is
+            // trimmed.
+            assert.equal(window.selenium_log.entries.length, 5);
+            assert.equal(window.selenium_log.dropped, 0);
+            util.seleniumLogAt("info", 5);
+            assert.deepEqual(window.selenium_log.entries.map(
+                function (entry) {
+                    return entry.message[0];
+                }), [3, 4, 5]);
+            assert.equal(window.selenium_log.dropped, 3);
+        });
+    });
+
+    describe("seleniumLog", function () {
+        beforeEach(function () {
+            global.window = {};
+        });
+
+        afterEach(function () {
+            delete global.window;
+        });
+
+        it("logs at the debug level", function () {
+            util.seleniumLog("a", "b");
+            var entries = window.selenium_log.entries;
+            assert.equal(entries.length, 1);
+            assert.equal(entries[0].level, "debug");
+            assert.deepEqual(entries[0].message, ["a", "b"]);
+        });
+    });
 });
 
 //  LocalWords:  requirejs util chai classFromOriginalName namespace
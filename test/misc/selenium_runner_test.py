@@ -0,0 +1,222 @@
+"""
+Tests for the parallel runner of the Selenium suite,
+``misc/selenium_runner.py``.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+from nose.tools import assert_equal  # pylint: disable=E0611
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "misc"))
+
+import selenium_runner  # noqa
+from selenium_runner import assign, RetryBudget, failed_locations, \
+    merge_rerun, record_outcomes, is_feature_path, run_worker  # noqa
+from flakes import FlakeDB, report_key, FLAKY, CHRONIC_THRESHOLD  # noqa
+
+
+class FakeScenario(object):
+
+    def __init__(self, name, tags=()):
+        self.name = name
+        self.effective_tags = list(tags)
+
+
+def make_unit(location, weight):
+    return selenium_runner.Unit(location, [FakeScenario(location)],
+                                lambda _scenario: weight)
+
+
+def locations(shards):
+    return [[unit.location for unit in shard] for shard in shards]
+
+
+def test_assign_heaviest_first():
+    units = [make_unit("a", 1), make_unit("b", 5), make_unit("c", 3),
+             make_unit("d", 2)]
+    assert_equal(locations(assign(units, 2)), [["b", "a"], ["c", "d"]])
+
+
+def test_assign_balances_loads():
+    units = [make_unit(str(number), weight) for (number, weight)
+             in enumerate([7, 5, 4, 3, 3, 2, 2, 1])]
+    shards = assign(units, 3)
+    loads = [sum(unit.weight for unit in shard) for shard in shards]
+    assert_equal(sorted(loads), [9, 9, 9])
+
+
+def test_assign_keeps_every_unit_once():
+    units = [make_unit(str(number), number % 4 + 1)
+             for number in range(20)]
+    shards = assign(units, 3)
+    assert_equal(sorted(unit.location for shard in shards for unit in shard),
+                 sorted(unit.location for unit in units))
+
+
+def test_assign_more_workers_than_units():
+    units = [make_unit("a", 2), make_unit("b", 1)]
+    assert_equal(locations(assign(units, 4)), [["a"], ["b"], [], []])
+
+
+def test_assign_no_units():
+    assert_equal(assign([], 2), [[], []])
+
+
+def test_unit_needs_display():
+    plain = selenium_runner.Unit("a", [FakeScenario("a")],
+                                 selenium_runner.count_estimate)
+    display = selenium_runner.Unit(
+        "b", [FakeScenario("b"), FakeScenario("c", ["display"])],
+        selenium_runner.count_estimate)
+    assert_equal((plain.needs_display, display.needs_display),
+                 (False, True))
+    assert_equal(display.weight, 2)
+
+
+def test_is_feature_path():
+    top_dir = selenium_runner.top_dir
+    assert_equal([is_feature_path(arg) for arg in [
+        "a.feature", "selenium_test/a.feature:12",
+        os.path.join(top_dir, "selenium_test"),
+        os.path.join(top_dir, "selenium_test", "steps"),
+        os.path.join(top_dir, "misc"), os.path.join(top_dir, "test"),
+        "--junit-directory", "no-such-directory"]],
+        [True, True, True, True, False, False, False, False])
+
+
+def test_retry_budget_take():
+    budget = RetryBudget(5)
+    assert_equal([budget.take(3), budget.take(3), budget.take(1)],
+                 [3, 2, 0])
+    assert_equal(budget.remaining, 0)
+
+
+def test_retry_budget_is_shared():
+    budget = RetryBudget(100)
+    granted = []
+
+    def take():
+        for _ in range(50):
+            granted.append(budget.take(1))
+
+    threads = [threading.Thread(target=take) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert_equal(sum(granted), 100)
+    assert_equal(budget.remaining, 0)
+
+
+class BrokenWorker(object):
+
+    number = 0
+    crashed = False
+    features = []
+    error = None
+
+    def wait(self):
+        raise IOError("cannot wait")
+
+
+def test_run_worker_records_error():
+    worker = BrokenWorker()
+    run_worker(worker, 1, RetryBudget(1))
+    assert_equal((worker.features, worker.error.splitlines()[-1]),
+                 ([], "IOError: cannot wait"))
+
+
+def make_element(location, status, **kwargs):
+    element = {"type": "scenario", "location": location,
+               "name": location, "status": status}
+    element.update(kwargs)
+    return element
+
+
+def make_features(*elements):
+    return [{"elements": [{"type": "background", "location": "bg:1",
+                           "status": "failed"}] + list(elements)}]
+
+
+def test_failed_locations():
+    features = make_features(make_element("a.feature:1", "passed"),
+                             make_element("a.feature:5", "failed"),
+                             make_element("a.feature:9", "skipped"))
+    assert_equal(failed_locations(features), ["a.feature:5"])
+
+
+def test_merge_rerun():
+    features = make_features(make_element("a.feature:1", "passed"),
+                             make_element("a.feature:5", "failed"),
+                             make_element("a.feature:9", "failed"))
+    rerun = make_features(make_element("a.feature:5", "passed"),
+                          make_element("a.feature:9", "failed"))
+    merge_rerun(features, rerun, 1)
+    assert_equal([(element["location"], element["status"],
+                   element.get("attempts", 1))
+                  for element in features[0]["elements"][1:]],
+                 [("a.feature:1", "passed", 1),
+                  ("a.feature:5", "passed", 2),
+                  ("a.feature:9", "failed", 2)])
+    assert_equal(failed_locations(features), ["a.feature:9"])
+
+
+class RecordOutcomesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, "flakes.db")
+        self.chronic = make_element("a.feature:1", "failed")
+        self.other = make_element("a.feature:5", "failed")
+        db = FlakeDB(self.db_path)
+        try:
+            for _ in range(CHRONIC_THRESHOLD):
+                db.record(report_key(self.chronic), FLAKY, 2)
+        finally:
+            db.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def statistics(self):
+        db = FlakeDB(self.db_path)
+        try:
+            return db.statistics()
+        finally:
+            db.close()
+
+    def test_quarantine(self):
+        features = make_features(self.chronic, self.other)
+        record_outcomes(features, self.db_path, True)
+        assert_equal((self.chronic.get("quarantined"),
+                      self.other.get("quarantined")), (True, None))
+
+    def test_no_quarantine(self):
+        features = make_features(self.chronic, self.other)
+        record_outcomes(features, self.db_path, False)
+        assert_equal(self.chronic.get("quarantined"), None)
+
+    def test_passing_chronic_flaker_is_not_quarantined(self):
+        passed = make_element("a.feature:1", "passed")
+        record_outcomes(make_features(passed), self.db_path, True)
+        assert_equal(passed.get("quarantined"), None)
+
+    def test_outcomes_are_recorded(self):
+        flaky = make_element("a.feature:9", "passed", attempts=2)
+        skipped = make_element("a.feature:12", "skipped")
+        record_outcomes(make_features(self.chronic, flaky, skipped),
+                        self.db_path, True)
+        assert_equal(self.statistics(),
+                     {report_key(self.chronic): (CHRONIC_THRESHOLD + 1,
+                                                 CHRONIC_THRESHOLD),
+                      report_key(flaky): (1, 1)})
+
+    def test_summarize_excludes_quarantined(self):
+        features = make_features(self.chronic, self.other)
+        record_outcomes(features, self.db_path, True)
+        assert_equal(selenium_runner.summarize(features), ["a.feature:5"])
@@ -0,0 +1,42 @@
+"""
+Tests of the Selenium test harness. Run them with ``nosetests
+test/selenium_test``.
+
+The modules of the harness import one another as top-level modules, so
+this package puts ``selenium_test`` on the path before any of the tests
+is loaded.
+"""
+import os
+import sys
+
+top_dir = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.insert(0, os.path.join(top_dir, "selenium_test"))
+
+
+class FakeTime(object):
+    """
+    Stands in for the ``time`` module. Its clock moves forward on every
+    reading, so that no two records are made at the same time.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+
+def fake_time(test, module):
+    """
+    Make a module see a :class:`FakeTime` instead of the ``time``
+    module, for the duration of a test. Only the module's own name is
+    replaced, so the rest of the process still sees the real clock.
+
+    :param test: The test.
+    :type test: :class:`unittest.TestCase`
+    :param module: The module.
+    """
+    test.addCleanup(setattr, module, "time", module.time)
+    module.time = FakeTime()
@@ -0,0 +1,138 @@
+"""
+Tests for the generator of large documents.
+
+The generated documents are validated with `jing
+<http://www.thaiopensource.com/relaxng/jing.html>`_ if it is installed.
+Otherwise, only the DocBook documents are validated, with ``xmllint``:
+``xmllint`` does not finish loading the TEI schemas, even to validate
+a document of a few hundred bytes, so the TEI documents are validated
+only when jing is available.
+"""
+import os
+import shutil
+import tempfile
+import subprocess
+from StringIO import StringIO
+from xml.dom import minidom
+
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal, assert_raises, \
+    assert_true  # pylint: disable=E0611
+
+from documents import parse_size, Generator, FLAVORS, generate
+
+from . import top_dir
+
+
+def find_program(name):
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def test_parse_size():
+    for (text, expected) in [("100", 100),
+                             ("100B", 100),
+                             ("10KB", 10 * 1024),
+                             ("10kb", 10 * 1024),
+                             (" 5MB ", 5 * 1024 * 1024),
+                             ("10 KB", 10 * 1024),
+                             ("1.5MB", int(1.5 * 1024 * 1024))]:
+        assert_equal(parse_size(text), expected, text)
+
+
+def test_parse_size_bad_input():
+    for text in ["", "KB", "10GB", "10KKB", "ten"]:
+        assert_raises(ValueError, parse_size, text)
+
+
+def test_generator_bad_parameters():
+    assert_raises(ValueError, Generator, FLAVORS["tei"], depth=0)
+    assert_raises(ValueError, Generator, FLAVORS["tei"], inline_density=2)
+
+
+def write(flavor_name, size, **kwargs):
+    out = StringIO()
+    written = Generator(FLAVORS[flavor_name], **kwargs).write(out, size)
+    return out.getvalue(), written
+
+
+def test_generator_is_reproducible():
+    first, _ = write("tei", 4096, seed=3)
+    second, _ = write("tei", 4096, seed=3)
+    third, _ = write("tei", 4096, seed=4)
+    assert_equal(first, second)
+    assert_true(first != third)
+
+
+def test_generator_size():
+    section_size = len(Generator(FLAVORS["docbook"]).section(1, "chapter"))
+    for size in [1, 10 * 1024, 100 * 1024]:
+        text, written = write("docbook", size)
+        assert_equal(len(text), written)
+        assert_true(written >= size)
+        # A generated document exceeds the requested size by at most
+        # one top-level section (and sections do not vary much).
+        assert_true(written < size + 2 * section_size)
+
+
+def section_depth(element, names):
+    children = [child for child in element.childNodes
+                if child.nodeType == child.ELEMENT_NODE and
+                child.tagName in names]
+    return 1 + max(section_depth(child, names) for child in children) \
+        if children else 0
+
+
+def test_generator_structure():
+    for (flavor_name, root, sections) in [
+            ("tei", "body", ("div", )),
+            ("docbook", "book", ("chapter", "section"))]:
+        text, _ = write(flavor_name, 1, depth=3, breadth=2)
+        dom = minidom.parseString(text)
+        top = dom.getElementsByTagName(root)[0]
+        assert_equal(section_depth(top, sections), 3, flavor_name)
+
+
+class TestSchemas(object):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def validate(self, flavor_name):
+        schema = os.path.join(top_dir, FLAVORS[flavor_name].schema)
+        jing = find_program("jing")
+        if jing:
+            command = [jing, schema]
+        elif flavor_name == "docbook" and find_program("xmllint"):
+            command = ["xmllint", "--noout", "--relaxng", schema]
+        else:
+            raise SkipTest("no validator able to handle " + schema)
+
+        path = os.path.join(self.tmpdir, flavor_name + ".xml")
+        # Deep sections and a high density of inline elements exercise
+        # all of the generated markup in a small document.
+        generate(flavor_name, 4 * 1024, path, depth=3, breadth=2,
+                 inline_density=0.5, seed=1)
+        dom = minidom.parse(path)
+        for name in FLAVORS[flavor_name].inlines:
+            assert_true(dom.getElementsByTagName(name), name)
+
+        process = subprocess.Popen(command + [path], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        assert_equal(process.returncode, 0, output)
+
+    def test_tei_valid(self):
+        self.validate("tei")
+
+    def test_tei_math_valid(self):
+        self.validate("tei-math")
+
+    def test_docbook_valid(self):
+        self.validate("docbook")
@@ -0,0 +1,70 @@
+"""
+Tests for the database of flaky scenarios.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from nose.tools import assert_equal  # pylint: disable=E0611
+
+import flakes
+from flakes import FlakeDB, report_key, PASSED, FLAKY, FAILED
+
+from . import fake_time
+
+
+def test_report_key():
+    element = {"location": os.path.abspath("selenium_test/a.feature") +
+               ":12", "name": "a scenario"}
+    assert_equal(report_key(element),
+                 os.path.join("selenium_test", "a.feature") + ":a scenario")
+
+
+class FlakeDBTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = FlakeDB(os.path.join(self.tmpdir, "sub", "flakes.db"))
+        fake_time(self, flakes)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def record(self, key, outcomes):
+        for outcome in outcomes:
+            self.db.record(key, outcome, 1 if outcome == PASSED else 2)
+
+    def test_statistics(self):
+        self.record("a", [PASSED, FLAKY, FAILED, FLAKY])
+        self.record("b", [PASSED, FAILED])
+        # Scenarios that were never flaky are left out.
+        assert_equal(self.db.statistics(), {"a": (4, 2)})
+
+    def test_history_is_trimmed(self):
+        self.record("other", [FLAKY])
+        # The flaky outcomes fall out of the history.
+        self.record("a", [FLAKY] * 3 + [PASSED] * flakes.HISTORY)
+        count, = self.db.connection.execute(
+            "SELECT COUNT(*) FROM outcomes WHERE scenario = ?",
+            ("a", )).fetchone()
+        assert_equal(count, flakes.HISTORY)
+        assert_equal(self.db.statistics(), {"other": (1, 1)})
+
+    def test_chronic_threshold(self):
+        self.record("below", [FLAKY] * (flakes.CHRONIC_THRESHOLD - 1))
+        self.record("at", [FLAKY] * flakes.CHRONIC_THRESHOLD)
+        self.record("never", [FAILED] * 10)
+        assert_equal(self.db.chronic(), set(["at"]))
+        assert_equal(self.db.chronic(flakes.CHRONIC_THRESHOLD - 1),
+                     set(["below", "at"]))
+
+    def test_shared_database(self):
+        self.record("a", [FLAKY])
+        other = FlakeDB(os.path.join(self.tmpdir, "sub", "flakes.db"))
+        try:
+            other.record("a", FLAKY, 2)
+        finally:
+            other.close()
+        assert_equal(self.db.statistics(), {"a": (2, 2)})
@@ -0,0 +1,104 @@
+"""
+Tests for the collection of the messages that wed logs for the test
+suite.
+
+The script that drains the messages of the page is run with Node, and
+the tests that need it are skipped if Node is not installed.
+"""
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from nose.tools import assert_equal  # pylint: disable=E0611
+
+from js_logs import JSLog, parse_level
+
+# Runs a script in a page whose ``window`` is the first line of the
+# input. The rest of the input is the script.
+NODE_RUNNER = """
+var input = require("fs").readFileSync("/dev/stdin", "utf8").split("\\n");
+var window = JSON.parse(input[0]);
+var result = new Function("window", input.slice(1).join("\\n"))(window);
+console.log(JSON.stringify({result: result, window: window}));
+"""
+
+
+class NodeDriver(object):
+    """
+    A driver which runs scripts with Node, in a page whose ``window``
+    is ``window``.
+    """
+
+    def __init__(self, window):
+        self.window = window
+
+    def execute_script(self, script, *args):
+        # The arguments are passed the way ``execute_script`` passes
+        # them, as ``arguments``.
+        body = "arguments = " + json.dumps(args) + ";\n" + script
+        process = subprocess.Popen(["node", "-e", NODE_RUNNER],
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE)
+        out, _ = process.communicate(json.dumps(self.window) + "\n" + body)
+        assert_equal(process.returncode, 0)
+        ret = json.loads(out)
+        self.window = ret["window"]
+        return ret.get("result")
+
+
+def entry(level, message):
+    return {"level": level, "time": 0, "message": [message]}
+
+
+def test_parse_level():
+    assert_equal([parse_level(value) for value in
+                  ["", None, "1", "debug", "WARN", "error"]],
+                 [None, None, "debug", "debug", "warn", "error"])
+
+
+class DrainTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            subprocess.check_output(["node", "-e", ""])
+        except (OSError, subprocess.CalledProcessError):
+            raise unittest.SkipTest("node is not installed")
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_nothing_logged(self):
+        log = JSLog(self.tmpdir, "debug")
+        assert_equal(log.drain(NodeDriver({})), 0)
+        assert_equal((log.entries, log.dropped), ([], 0))
+
+    def test_level_filter(self):
+        driver = NodeDriver({"selenium_log": {
+            "size": 10, "dropped": 0,
+            "entries": [entry(level, level) for level in
+                        ["debug", "info", "warn", "error", "debug"]]}})
+        log = JSLog(self.tmpdir, "warn")
+        assert_equal(log.drain(driver), 2)
+        assert_equal([item["level"] for item in log.entries],
+                     ["warn", "error"])
+        # The buffer of the page is emptied.
+        assert_equal(driver.window["selenium_log"]["entries"], [])
+        assert_equal(log.drain(driver), 0)
+
+    def test_excess_is_dropped(self):
+        # The page trims its buffer only when it is twice its size, so
+        # the drain drops what is over the size.
+        driver = NodeDriver({"selenium_log": {
+            "size": 2, "dropped": 4,
+            "entries": [entry("info", number) for number in range(3)]}})
+        log = JSLog(self.tmpdir, "debug")
+        assert_equal(log.drain(driver), 2)
+        assert_equal([item["message"] for item in log.entries], [[1], [2]])
+        assert_equal(log.dropped, 5)
+        assert_equal(driver.window["selenium_log"]["dropped"], 0)
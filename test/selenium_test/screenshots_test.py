@@ -0,0 +1,203 @@
+"""
+Tests for the screenshot writer, the timeline of captures and the
+pruning of old runs.
+"""
+import os
+import json
+import time
+import zlib
+import struct
+import shutil
+import tempfile
+import unittest
+import threading
+
+from nose.tools import assert_equal, assert_true  # pylint: disable=E0611
+
+import screenshots
+from screenshots import ScreenshotWriter, Timeline, prune_runs, INDEX_NAME
+
+
+def make_png(width, height, pixel, level=6):
+    """
+    Make a grayscale PNG.
+
+    :param pixel: A function which returns the value of the pixel at
+                  a column and row.
+    :param level: The compression level, so that the same image can be
+                  encoded differently.
+    """
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + \
+            struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    rows = "".join("\0" + "".join(chr(pixel(col, row))
+                                  for col in range(width))
+                   for row in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return "\x89PNG\r\n\x1a\n" + chunk("IHDR", header) + \
+        chunk("IDAT", zlib.compress(rows, level)) + \
+        chunk("IEND", "")
+
+
+LEFT = make_png(16, 16, lambda col, row: 255 if col < 8 else 0)
+RIGHT = make_png(16, 16, lambda col, row: 0 if col < 8 else 255)
+
+
+class ScreenshotWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.writer = None
+
+    def tearDown(self):
+        if self.writer is not None:
+            self.writer.close()
+        shutil.rmtree(self.tmpdir)
+
+    def make_writer(self, **kwargs):
+        self.writer = ScreenshotWriter(self.tmpdir, **kwargs)
+        return self.writer
+
+    def index(self):
+        self.writer.close()
+        self.writer = None
+        with open(os.path.join(self.tmpdir, INDEX_NAME)) as index:
+            return [json.loads(line) for line in index]
+
+    def test_identical_captures_are_written_once(self):
+        writer = self.make_writer()
+        first = writer.submit("a", LEFT, step="one")
+        second = writer.submit("b", LEFT)
+        third = writer.submit("c", RIGHT)
+        entries = self.index()
+        assert_equal([(entry["file"], entry.get("duplicate_of"))
+                      for entry in entries],
+                     [("a.png", None), ("b.png", "a.png"), ("c.png", None)])
+        assert_equal(entries[0]["step"], "one")
+        assert_true(os.path.exists(first))
+        assert_true(not os.path.exists(second))
+        assert_true(os.path.exists(third))
+
+    def test_perceptually_identical_captures_are_written_once(self):
+        if screenshots.Image is None:
+            raise unittest.SkipTest("Pillow is not installed")
+        writer = self.make_writer()
+        writer.submit("a", LEFT)
+        writer.submit("b", make_png(16, 16,
+                                    lambda col, row: 255 if col < 8 else 0,
+                                    level=0))
+        assert_equal([entry.get("duplicate_of") for entry in self.index()],
+                     [None, "a.png"])
+
+    def test_unique_names(self):
+        writer = self.make_writer()
+        paths = [writer.submit("a", png) for png in [LEFT, RIGHT, LEFT]]
+        assert_equal([os.path.basename(path) for path in paths],
+                     ["a.png", "a-2.png", "a-3.png"])
+        assert_equal([entry["file"] for entry in self.index()],
+                     ["a.png", "a-2.png", "a-3.png"])
+
+    def test_subdirectories(self):
+        writer = self.make_writer()
+        path = writer.submit(os.path.join("sub", "dir", "a"), LEFT)
+        self.index()
+        assert_equal(path, os.path.join(self.tmpdir, "sub", "dir", "a.png"))
+        assert_true(os.path.exists(path))
+
+    def test_full_queue_drops_captures(self):
+        writer = self.make_writer(queue_size=1)
+        release = threading.Event()
+        original_write = writer._write
+
+        def blocked_write(*args):
+            release.wait()
+            return original_write(*args)
+
+        writer._write = blocked_write
+        assert_true(writer.submit("a", LEFT) is not None)
+        # Wait for the thread to take the first capture, so that the
+        # second one fills the queue.
+        while not writer._queue.empty():
+            time.sleep(0.01)
+        assert_true(writer.submit("b", RIGHT) is not None)
+        assert_equal(writer.submit("c", LEFT), None)
+        assert_equal(writer.dropped, 1)
+        release.set()
+        assert_equal([entry["file"] for entry in self.index()],
+                     ["a.png", "b.png"])
+
+    def test_write_errors_are_recorded(self):
+        writer = self.make_writer()
+        original_write = writer._write
+
+        def failing_write(filename, *args):
+            if filename == "a.png":
+                raise IOError("disk full")
+            return original_write(filename, *args)
+
+        writer._write = failing_write
+        writer.submit("a", LEFT, step="one")
+        writer.submit("b", RIGHT)
+        entries = self.index()
+        assert_equal([(entry["file"], entry.get("error"))
+                      for entry in entries],
+                     [("a.png", "disk full"), ("b.png", None)])
+        assert_equal(entries[0]["step"], "one")
+        assert_equal(writer.failed, 1)
+        assert_true(writer.error is None)
+
+    def test_stopped_writer(self):
+        # The index cannot be created in a directory that does not
+        # exist, which stops the thread.
+        writer = ScreenshotWriter(os.path.join(self.tmpdir, "missing"),
+                                  queue_size=1)
+        writer._thread.join(5)
+        assert_true(isinstance(writer.error, IOError))
+        assert_equal(writer.submit("a", LEFT), None)
+        # Neither a blocking submit nor close may wait on the thread.
+        assert_equal(writer.submit("b", LEFT, block=True), None)
+        writer.close()
+        assert_equal(writer.dropped, 0)
+
+    def test_timeline_flush(self):
+        writer = self.make_writer()
+        timeline = Timeline(2)
+        for (label, png) in [("one", LEFT), ("two", RIGHT), ("three", LEFT)]:
+            timeline.add(label, png)
+        path = timeline.flush(writer, "failure")
+        assert_equal(path, os.path.join(self.tmpdir, "failure"))
+        assert_equal(len(timeline.frames), 0)
+        assert_equal([(entry["file"], entry["label"])
+                      for entry in self.index()],
+                     [(os.path.join("failure", "000.png"), "two"),
+                      (os.path.join("failure", "001.png"), "three")])
+        assert_equal(sorted(os.listdir(path)), ["000.png", "001.png"])
+
+
+class PruneRunsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ["2016-01-01", "2016-01-02", "2016-01-03"]:
+            os.mkdir(os.path.join(self.tmpdir, name))
+        os.symlink("2016-01-01", os.path.join(self.tmpdir, "LATEST"))
+        with open(os.path.join(self.tmpdir, "notes.txt"), 'w'):
+            pass
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_keeps_last_runs(self):
+        prune_runs(self.tmpdir, 2)
+        assert_equal(sorted(os.listdir(self.tmpdir)),
+                     ["2016-01-02", "2016-01-03", "LATEST", "notes.txt"])
+
+    def test_keep_nothing(self):
+        prune_runs(self.tmpdir, 0)
+        assert_equal(sorted(os.listdir(self.tmpdir)),
+                     ["LATEST", "notes.txt"])
+
+    def test_keep_more_than_exist(self):
+        prune_runs(self.tmpdir, 10)
+        assert_equal(len(os.listdir(self.tmpdir)), 5)
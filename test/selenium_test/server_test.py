@@ -0,0 +1,183 @@
+"""
+Tests for the save journal of the test servers: ``State`` in
+``selenium_test/server.py``, and the journal endpoint of both the
+in-process server and ``server.js``.
+
+The tests of ``server.js`` are skipped if Node or the packages that
+``server.js`` needs are not installed.
+"""
+import os
+import time
+import unittest
+import threading
+import subprocess
+
+import requests
+from nose.tools import assert_equal, assert_true  # pylint: disable=E0611
+
+from server import State, Server, start_node_server, SAVE_PATH, \
+    JOURNAL_PATH, NAMESPACE_PARAM
+
+from . import top_dir
+
+
+def later(delay, func, *args):
+    """
+    Call a function in a thread after a delay.
+    """
+    thread = threading.Thread(target=lambda: (time.sleep(delay),
+                                              func(*args)))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+class StateJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state = State()
+
+    def test_timeout(self):
+        start = time.time()
+        saves, last = self.state.wait_for_saves(0, 0.3)
+        assert_true(time.time() - start >= 0.3)
+        assert_equal((saves, last), ([], 0))
+
+    def test_no_wait_when_records_exist(self):
+        self.state.save({"command": "check"})
+        start = time.time()
+        saves, _ = self.state.wait_for_saves(0, 10)
+        assert_true(time.time() - start < 1)
+        assert_equal(saves, [{"seq": 1, "save": {"command": "check"}}])
+
+    def test_wake_up(self):
+        later(0.2, self.state.save, {"command": "save", "data": "x"})
+        start = time.time()
+        saves, last = self.state.wait_for_saves(0, 10)
+        assert_true(time.time() - start < 5)
+        assert_equal((saves, last),
+                     ([{"seq": 1, "save": {"command": "save",
+                                           "data": "x"}}], 1))
+
+    def test_order_and_after(self):
+        for data in ["a", "b", "c"]:
+            self.state.save({"command": "save", "data": data})
+        saves, last = self.state.wait_for_saves(0, 0)
+        assert_equal([(record["seq"], record["save"]["data"])
+                      for record in saves], [(1, "a"), (2, "b"), (3, "c")])
+        assert_equal(last, 3)
+        saves, _ = self.state.wait_for_saves(1, 0)
+        assert_equal([record["seq"] for record in saves], [2, 3])
+
+    def test_seq_survives_reset(self):
+        self.state.save({"command": "check"})
+        self.state.reset()
+        assert_equal(self.state.wait_for_saves(0, 0), ([], 1))
+        self.state.save({"command": "check"})
+        saves, _ = self.state.wait_for_saves(0, 0)
+        assert_equal([record["seq"] for record in saves], [2])
+
+
+class JournalEndpointMixin(object):
+    """
+    Tests of the journal endpoint. Subclasses set ``url`` to the address
+    of a server.
+    """
+
+    namespace = "journal-test"
+
+    def setUp(self):
+        self.session = requests.Session()
+        self.params = {NAMESPACE_PARAM: self.namespace}
+        # The sequence numbers are shared by all namespaces in
+        # server.js, so we start from the last one.
+        _, self.start = self.journal(0, 0)
+        self.journal_reset()
+
+    def tearDown(self):
+        # server.js dumps what it receives in files, which a reset
+        # removes.
+        self.journal_reset()
+        self.session.close()
+
+    def journal_reset(self):
+        resp = self.session.post(self.url + "/build/ajax/control",
+                                 dict(self.params, command="reset"))
+        assert_equal(resp.status_code, 200)
+
+    def save(self, data):
+        resp = self.session.post(self.url + SAVE_PATH,
+                                 dict(self.params, command="save",
+                                      version="1", data=data))
+        assert_equal(resp.status_code, 200)
+
+    def journal(self, after, timeout):
+        resp = self.session.get(self.url + JOURNAL_PATH,
+                                params=dict(self.params, after=after,
+                                            timeout=timeout),
+                                timeout=timeout + 10)
+        journal = resp.json()
+        return journal["saves"], journal["last"]
+
+    def test_timeout(self):
+        start = time.time()
+        saves, _ = self.journal(self.start, 0.5)
+        assert_true(time.time() - start >= 0.5)
+        assert_equal(saves, [])
+
+    def test_wake_up(self):
+        later(0.3, self.save, "woken")
+        start = time.time()
+        saves, _ = self.journal(self.start, 10)
+        assert_true(time.time() - start < 5)
+        assert_equal([record["save"]["data"] for record in saves],
+                     ["woken"])
+
+    def test_order(self):
+        for data in ["a", "b", "c"]:
+            self.save(data)
+        saves, last = self.journal(self.start, 0)
+        seqs = [record["seq"] for record in saves]
+        assert_equal([record["save"]["data"] for record in saves],
+                     ["a", "b", "c"])
+        assert_equal(seqs, sorted(seqs))
+        assert_equal(last, seqs[-1])
+        saves, _ = self.journal(seqs[0], 0)
+        assert_equal([record["seq"] for record in saves], seqs[1:])
+
+
+class PythonServerJournalTest(JournalEndpointMixin, unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server(("localhost", 0), top_dir)
+        cls.server.start()
+        cls.url = "http://localhost:{0}".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+
+class NodeServerJournalTest(JournalEndpointMixin, unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            subprocess.check_output(["node", "-e", "require('express')"],
+                                    cwd=top_dir, stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            raise unittest.SkipTest("server.js cannot run here")
+
+        cls.cwd = os.getcwd()
+        os.chdir(top_dir)
+        try:
+            cls.process, port = start_node_server("localhost", 0)
+        finally:
+            os.chdir(cls.cwd)
+        cls.url = "http://localhost:{0}".format(port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.process.terminate()
+        cls.process.wait()
@@ -0,0 +1,85 @@
+"""
+Tests for the timing database and the estimator that the parallel
+runner uses to balance its workers.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from nose.tools import assert_equal  # pylint: disable=E0611
+
+import timings
+from timings import TimingDB, Estimator, scenario_key
+
+from . import fake_time
+
+
+class FakeScenario(object):
+
+    def __init__(self, filename, name):
+        self.filename = filename
+        self.name = name
+
+
+class TimingDBTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = TimingDB(os.path.join(self.tmpdir, "sub", "timings.db"))
+        fake_time(self, timings)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_scenario_key(self):
+        scenario = FakeScenario(os.path.abspath("selenium_test/a.feature"),
+                                "a scenario")
+        assert_equal(scenario_key(scenario),
+                     os.path.join("selenium_test", "a.feature") +
+                     ":a scenario")
+
+    def test_estimates_are_means(self):
+        scenario = FakeScenario("a.feature", "a")
+        self.db.record(scenario, 1.0)
+        self.db.record(scenario, 3.0)
+        assert_equal(self.db.estimates(), {scenario_key(scenario): 2.0})
+
+    def test_history_is_trimmed(self):
+        scenario = FakeScenario("a.feature", "a")
+        other = FakeScenario("b.feature", "b")
+        self.db.record(other, 50.0)
+        # The first two durations fall out of the history.
+        for duration in [100.0, 100.0] + [1.0] * timings.HISTORY:
+            self.db.record(scenario, duration)
+        count, = self.db.connection.execute(
+            "SELECT COUNT(*) FROM durations WHERE scenario = ?",
+            (scenario_key(scenario), )).fetchone()
+        assert_equal(count, timings.HISTORY)
+        assert_equal(self.db.estimates(), {scenario_key(scenario): 1.0,
+                                           scenario_key(other): 50.0})
+
+    def test_estimator_known(self):
+        scenario = FakeScenario("a.feature", "a")
+        self.db.record(scenario, 4.0)
+        assert_equal(Estimator(self.db)(scenario), 4.0)
+
+    def test_estimator_median_fallback(self):
+        for (name, duration) in [("a", 1.0), ("b", 9.0), ("c", 3.0)]:
+            self.db.record(FakeScenario("a.feature", name), duration)
+        estimator = Estimator(self.db)
+        assert_equal(estimator(FakeScenario("a.feature", "unknown")), 3.0)
+
+    def test_estimator_median_fallback_even(self):
+        # With an even number of durations, the upper median is used.
+        for (name, duration) in [("a", 1.0), ("b", 2.0), ("c", 8.0),
+                                 ("d", 4.0)]:
+            self.db.record(FakeScenario("a.feature", name), duration)
+        estimator = Estimator(self.db)
+        assert_equal(estimator.fallback, 4.0)
+
+    def test_estimator_empty_db(self):
+        estimator = Estimator(self.db)
+        assert_equal(estimator(FakeScenario("a.feature", "a")),
+                     timings.DEFAULT_ESTIMATE)